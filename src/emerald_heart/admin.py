@@ -7,7 +7,7 @@ from django.contrib.gis.admin import GISModelAdmin
 from emerald_heart.models import Location, Request, User
 
 
-class EmeraldUserAdmin(UserAdmin):
+class EmeraldUserAdmin(UserAdmin, GISModelAdmin):
     """Custom admin for users."""
 
     fieldsets = (
@@ -20,8 +20,10 @@ class EmeraldUserAdmin(UserAdmin):
             "Permissions",
             {"fields": ("is_active", "is_staff", "is_superuser", "groups", "user_permissions")},
         ),
+        ("Location", {"fields": ("current_location", "current_longitude", "current_latitude")}),
         ("Important dates", {"fields": ("last_login",)}),
     )
+    readonly_fields = ("current_longitude", "current_latitude")
     list_display = (
         "username",
         "name",
@@ -32,8 +34,8 @@ class EmeraldUserAdmin(UserAdmin):
 
 
 class LocationAdmin(GISModelAdmin):
-    list_display = ("id", "location", "created", "modified")
-    readonly_fields = ("id", "created", "modified")
+    list_display = ("id", "name", "user", "longitude", "latitude", "created", "modified")
+    readonly_fields = ("id", "geohash", "created", "modified")
 
 
 admin.site.register(User, EmeraldUserAdmin)
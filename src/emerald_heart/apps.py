@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+import logging
+
+from django.apps import AppConfig
+
+LOG = logging.getLogger(__name__)
+
+
+class EmeraldHeartConfig(AppConfig):
+    """Application configuration for Emerald Heart."""
+
+    name = "emerald_heart"
+
+    def ready(self) -> None:
+        # Connect signal receivers and register system checks
+        from emerald_heart import checks, signals  # noqa: F401
+        from emerald_heart.utils.navigation import warm_navigation
+
+        warm_navigation()
@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+import logging
+
+from django.core.checks import Error, Tags, register
+
+from emerald_heart.utils.fts import missing_triggers
+
+LOG = logging.getLogger(__name__)
+
+
+@register(Tags.database)
+def check_fts_triggers(app_configs, databases=None, **kwargs) -> list[Error]:
+    """Report databases whose user table lost the triggers keeping the full-text index in sync."""
+    errors = []
+    for alias in databases or ():
+        if missing := missing_triggers(alias):
+            errors.append(
+                Error(
+                    f"The {alias} database is missing the full-text triggers {', '.join(missing)}.",
+                    hint="Run the rebuild_search_index management command to recreate them and reindex members.",
+                    id="emerald_heart.E001",
+                )
+            )
+    return errors
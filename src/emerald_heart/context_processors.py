@@ -4,7 +4,9 @@ import logging
 from datetime import UTC, datetime
 
 from django.conf import settings
-from django.utils.dateparse import parse_datetime
+
+from emerald_heart.utils.movement import get_check, is_due
+from emerald_heart.utils.render import LazyValue
 
 LOG = logging.getLogger(__name__)
 
@@ -19,15 +21,10 @@ def site_info(request) -> dict[str, object]:
         "REQUEST_LOCATION": False,
     }
     if request.user.is_authenticated is True:
-        last_check = request.session.get("last-location-check", None)
         if request.user.current_location:
-            if not last_check:
-                site_context["REQUEST_LOCATION"] = True
-            else:
-                if last_check_parsed := parse_datetime(last_check):
-                    delta = datetime.now(UTC) - last_check_parsed
-                    if delta.total_seconds() > 600:
-                        site_context["REQUEST_LOCATION"] = True
+            # Only pages that ask for the location read the session
+            session = request.session
+            site_context["REQUEST_LOCATION"] = LazyValue(lambda: is_due(get_check(session), datetime.now(UTC)))
         else:
             site_context["REQUEST_LOCATION"] = True
 
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from datetime import datetime
 from typing import BinaryIO, NamedTuple, TextIO, TypeAlias, TypedDict
 
 from boltons.ioutils import SpooledBytesIO
@@ -45,4 +46,19 @@ class Coordinate(NamedTuple):
     latitude: float
 
 
+class HistoryPoint(NamedTuple):
+    """A point of a member's location history; coordinates are (longitude, latitude) as in `Coordinate`."""
+
+    when: datetime
+    longitude: float
+    latitude: float
+
+
+class LocationCheck(TypedDict):
+    """When a member's location was last checked and how long to wait before the next check (in seconds)."""
+
+    checked: str
+    interval: float
+
+
 SiteLayout: TypeAlias = list[SiteTab]
@@ -0,0 +1,19 @@
+from __future__ import annotations
+
+import logging
+
+from django.core.management.base import BaseCommand
+
+from emerald_heart.utils.location_history import compact_history
+
+LOG = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """Apply the location history retention policy."""
+
+    help = "Merge recent location pings, downsample aged location history and delete history past the retention period."
+
+    def handle(self, *args, **options) -> None:
+        merged, downsampled, deleted = compact_history()
+        self.stdout.write(f"Merged {merged}, downsampled {downsampled} and deleted {deleted} location history blocks")
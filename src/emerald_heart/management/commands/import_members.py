@@ -0,0 +1,259 @@
+from __future__ import annotations
+
+import logging
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import ExitStack
+from uuid import UUID, uuid4
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.contrib.gis.geos import Point
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, transaction
+
+from emerald_heart.models import Location, User
+from emerald_heart.utils.cache import bump_version
+from emerald_heart.utils.importer import FORMATS, RecordError, batched, guess_format, parse_point, read_records
+from emerald_heart.utils.rtree import LOCATION_RTREE, USER_RTREE, upsert_points
+from emerald_heart.utils.spatial import geohash_encode
+from emerald_heart.views.search import autocomplete, geo_engine
+from emerald_heart.views.search.nearby import refresh_nearby_many
+from emerald_heart.views.search.search_cache import region_keys
+
+LOG = logging.getLogger(__name__)
+
+TIMEZONES = frozenset(choice for choice, _ in User.TIMEZONE_CHOICES)
+
+
+def _setup_worker() -> None:
+    """Configure Django in a password hashing process (a no-op when the process was forked)."""
+    django.setup()
+
+
+class Command(BaseCommand):
+    """Stream members or saved locations from a file into the database."""
+
+    help = (
+        "Import members or saved locations from CSV, GeoJSON or NDJSON. Rows are written and spatially indexed with "
+        "bulk inserts, committed every --transaction-size rows, and passwords are hashed in a process pool. Rows whose "
+        "username, id or point already exists are rejected, so an interrupted import can be run again."
+    )
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument("path", help="File to import.")
+        parser.add_argument("--model", choices=("user", "location"), default="user", help="Kind of rows to import.")
+        parser.add_argument("--format", choices=FORMATS, help="Input format; guessed from the extension by default.")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows per bulk insert.")
+        parser.add_argument("--transaction-size", type=int, default=10000, help="Rows committed per transaction.")
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count(), help="Password hashing processes; 0 hashes in this process."
+        )
+        parser.add_argument("--group", default="member", help="Group imported members join; empty for none.")
+        parser.add_argument(
+            "--no-index",
+            action="store_true",
+            help="Don't add imported rows to the R*Tree and nearby members tables; run rebuild_spatial_index after.",
+        )
+
+    def handle(self, *args, **options) -> None:
+        path: str = options["path"]
+        self.model: str = options["model"]
+        self.batch_size: int = options["batch_size"]
+        self.workers: int = max(0, options["workers"] or 0)
+        self.index: bool = not options["no_index"]
+        self.group_id: int | None = None
+        if options["group"] and self.model == "user":
+            self.group_id = Group.objects.filter(name=options["group"]).values_list("id", flat=True).first()
+            if self.group_id is None:
+                raise CommandError(f"Group {options['group']} does not exist")
+
+        self.imported = self.rejected = 0
+        self.started = time.perf_counter()
+        with ExitStack() as stack:
+            stream = stack.enter_context(open(path, encoding="utf-8", newline=""))
+            pool = None
+            if self.workers and self.model == "user":
+                pool = stack.enter_context(ProcessPoolExecutor(max_workers=self.workers, initializer=_setup_worker))
+            records = enumerate(read_records(stream, options["format"] or guess_format(path)), start=1)
+            try:
+                self.import_records(records, pool, options["transaction_size"])
+            except RecordError as exc:
+                raise CommandError(f"{path}: {exc}") from exc
+
+        if self.imported:
+            bump_version(geo_engine.VERSION_KEY)
+            bump_version(autocomplete.VERSION_KEY)
+            if not self.index:
+                LOG.warning("Imported rows were not spatially indexed")
+                self.stderr.write(
+                    "Imported rows are missing from the R*Tree and nearby members tables; searches won't find them "
+                    "until rebuild_spatial_index is run."
+                )
+        self.report("Finished")
+
+    def import_records(self, records, pool: Executor | None, transaction_size: int) -> None:
+        """
+        Write the records one transaction at a time.
+
+        Passwords of the next chunk are hashed by the pool while the current chunk is written, so at most two chunks
+        are held in memory.
+        """
+        previous = None
+        for chunk in batched(records, transaction_size):
+            passwords = None
+            if self.model == "user":
+                plain = [record.get("password") for _, record in chunk]
+                if pool is not None:
+                    passwords = pool.map(make_password, plain, chunksize=max(1, len(chunk) // (4 * self.workers)))
+                else:
+                    passwords = map(make_password, plain)
+            if previous is not None:
+                self.write_chunk(*previous)
+            previous = (chunk, passwords)
+        if previous is not None:
+            self.write_chunk(*previous)
+
+    def write_chunk(self, chunk: list[tuple[int, dict]], passwords) -> None:
+        """Insert a chunk of records in one transaction."""
+        hashed = list(passwords) if passwords is not None else [None] * len(chunk)
+        rows = [(line, record, password) for (line, record), password in zip(chunk, hashed, strict=True)]
+        regions: set[str] = set()
+        try:
+            with transaction.atomic():
+                for batch in batched(rows, self.batch_size):
+                    if self.model == "user":
+                        regions |= self.write_users(batch)
+                    else:
+                        self.write_locations(batch)
+                transaction.on_commit(lambda: cache.delete_many(list(regions)))
+        except DatabaseError as exc:
+            raise CommandError(f"Rows {chunk[0][0]} to {chunk[-1][0]} were not imported: {exc}") from exc
+        self.report("Imported")
+
+    def reject(self, line: int, error: Exception) -> None:
+        LOG.warning("Skipping row %s: %s", line, error)
+        self.rejected += 1
+
+    def write_users(self, batch: list[tuple[int, dict, str]]) -> set[str]:
+        """Insert and index members; returns the search cache regions they appear in."""
+        usernames = {record.get("username") for _, record, _ in batch}
+        ids = {str(record["id"]) for _, record, _ in batch if record.get("id")}
+        taken = set(User.objects.filter(username__in=usernames).values_list("username", flat=True))
+        taken_ids = set(User.objects.filter(id__in=self.parse_ids(ids)).values_list("id", flat=True))
+
+        users, regions = [], set()
+        for line, record, password in batch:
+            try:
+                if not (username := record.get("username")):
+                    raise RecordError("missing username")
+                if username in taken:
+                    raise RecordError(f"username {username} already exists")
+                if (timezone := record.get("timezone", "America/Chicago")) not in TIMEZONES:
+                    raise RecordError(f"unknown timezone {timezone}")
+                point = parse_point(record)
+                pk = UUID(str(record["id"])) if record.get("id") else uuid4()
+                if pk in taken_ids:
+                    raise RecordError(f"id {pk} already exists")
+            except (RecordError, ValueError) as exc:
+                self.reject(line, exc)
+                continue
+            taken.add(username)
+            taken_ids.add(pk)
+            user = User(
+                id=pk,
+                username=username,
+                name=record.get("name") or username,
+                email=record.get("email", ""),
+                bio=record.get("bio"),
+                timezone=timezone,
+                password=password,
+                current_location=Point(*point, srid=4326) if point else None,
+            )
+            user.set_location_columns()
+            users.append(user)
+            if user.current_location:
+                regions |= region_keys(user.current_location)
+
+        User.objects.bulk_create(users)
+        if self.group_id is not None:
+            through = User.groups.through
+            through.objects.bulk_create(through(user_id=user.pk, group_id=self.group_id) for user in users)
+        if self.index:
+            located = [user for user in users if user.current_location]
+            points = ((user.pk, user.current_longitude, user.current_latitude) for user in located)
+            upsert_points(USER_RTREE, points, batch_size=self.batch_size)
+            refresh_nearby_many(located)
+        self.imported += len(users)
+        return regions
+
+    def write_locations(self, batch: list[tuple[int, dict, None]]) -> None:
+        """Insert and index saved locations; members are referenced by username."""
+        usernames = {record.get("user") for _, record, _ in batch}
+        user_ids = dict(User.objects.filter(username__in=usernames).values_list("username", "id"))
+        ids = {str(record["id"]) for _, record, _ in batch if record.get("id")}
+        taken_ids = set(Location.objects.filter(id__in=self.parse_ids(ids)).values_list("id", flat=True))
+        parsed = []
+        for line, record, _ in batch:
+            try:
+                parsed.append((line, record, parse_point(record)))
+            except RecordError as exc:
+                self.reject(line, exc)
+        # Location points are unique; equal points share a geohash, so only those cells need checking
+        hashes = {geohash_encode(*point) for _, _, point in parsed if point is not None}
+        taken_points = {
+            point.coords for point in Location.objects.filter(geohash__in=hashes).values_list("location", flat=True)
+        }
+
+        locations = []
+        for line, record, point in parsed:
+            try:
+                if (user_id := user_ids.get(record.get("user"))) is None:
+                    raise RecordError(f"unknown member {record.get('user')}")
+                if point is None:
+                    raise RecordError("missing coordinates")
+                if point in taken_points:
+                    raise RecordError(f"a saved location already exists at ({point.longitude}, {point.latitude})")
+                pk = UUID(str(record["id"])) if record.get("id") else uuid4()
+                if pk in taken_ids:
+                    raise RecordError(f"id {pk} already exists")
+            except (RecordError, ValueError) as exc:
+                self.reject(line, exc)
+                continue
+            taken_points.add(point)
+            taken_ids.add(pk)
+            locations.append(
+                Location(
+                    id=pk,
+                    user_id=user_id,
+                    name=record.get("name") or "Imported",
+                    location=Point(*point, srid=4326),
+                    geohash=geohash_encode(*point),
+                )
+            )
+        Location.objects.bulk_create(locations)
+        if self.index:
+            points = ((location.pk, *location.location.coords) for location in locations)
+            upsert_points(LOCATION_RTREE, points, batch_size=self.batch_size)
+        self.imported += len(locations)
+
+    @staticmethod
+    def parse_ids(values: set[str]) -> list[UUID]:
+        """Return the valid UUIDs among record ids; invalid ones are rejected with their rows."""
+        ids = []
+        for value in values:
+            try:
+                ids.append(UUID(value))
+            except ValueError:
+                continue
+        return ids
+
+    def report(self, label: str) -> None:
+        elapsed = time.perf_counter() - self.started
+        rate = self.imported / elapsed if elapsed else 0.0
+        self.stdout.write(
+            f"{label} {self.imported} rows in {elapsed:.1f}s ({rate:.0f} rows/s); {self.rejected} rejected"
+        )
@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from emerald_heart.utils.fts import rebuild
+
+LOG = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """Rebuild the full-text index of member names and bios."""
+
+    help = (
+        "Rebuild the full-text index of member names and bios after writes that bypassed its triggers, recreating any "
+        "triggers that are missing."
+    )
+
+    def handle(self, *args, **options) -> None:
+        if not rebuild():
+            raise CommandError("The full-text index does not exist in this database")
+        self.stdout.write("Rebuilt the member full-text index")
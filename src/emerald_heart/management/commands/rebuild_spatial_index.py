@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import logging
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from emerald_heart.models import Location, User
+from emerald_heart.utils.rtree import LOCATION_RTREE, USER_RTREE, rebuild
+from emerald_heart.utils.spatial import geohash_encode
+from emerald_heart.views.search.nearby import rebuild_nearby
+
+LOG = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """Recompute the columns derived from stored points and rebuild the R*Tree and nearby members tables."""
+
+    help = "Rebuild the derived location columns, R*Tree tables and nearby members table from the stored points."
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument("--batch-size", type=int, default=1000, help="Number of rows written per batch.")
+
+    def handle(self, *args, **options) -> None:
+        batch_size: int = options["batch_size"]
+
+        with transaction.atomic():
+            users = list(User.objects.exclude(current_location=None).only("id", "current_location"))
+            for user in users:
+                user.set_location_columns()
+            User.objects.bulk_update(users, User.LOCATION_COLUMNS, batch_size=batch_size)
+            count = rebuild(
+                USER_RTREE, ((u.pk, u.current_location.x, u.current_location.y) for u in users), batch_size=batch_size
+            )
+            self.stdout.write(f"Indexed {len(users)} user locations ({count} R*Tree entries)")
+
+            count = rebuild_nearby(batch_size=batch_size)
+            self.stdout.write(f"Stored {count} nearby member rows")
+
+            locations = list(Location.objects.only("id", "location"))
+            for location in locations:
+                location.geohash = geohash_encode(location.location.x, location.location.y)
+            Location.objects.bulk_update(locations, ("geohash",), batch_size=batch_size)
+            count = rebuild(
+                LOCATION_RTREE,
+                ((loc.pk, loc.location.x, loc.location.y) for loc in locations),
+                batch_size=batch_size,
+            )
+            self.stdout.write(f"Indexed {len(locations)} saved locations ({count} R*Tree entries)")
@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+from collections import defaultdict
+from pathlib import Path
+
+from django.contrib.auth.models import Group
+from django.core import serializers
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import F, Model
+from django.db.models.signals import pre_save
+
+from emerald_heart.models import AppliedFixture, Location, User
+from emerald_heart.utils.cache import bump_version
+from emerald_heart.utils.groups import forget_all_user_groups
+from emerald_heart.utils.importer import batched
+from emerald_heart.utils.rtree import LOCATION_RTREE, USER_RTREE, delete_point, upsert_points
+from emerald_heart.views.search import autocomplete, geo_engine
+from emerald_heart.views.search.nearby import refresh_nearby_many
+from emerald_heart.views.search.search_cache import region_keys
+
+LOG = logging.getLogger(__name__)
+
+FIXTURE_DIR = Path(__file__).resolve().parents[2] / "fixtures"
+"""Directory fixture names given without a path are looked up in."""
+
+DEFAULT_FIXTURES: tuple[str, ...] = ("auth.json", "location.json")
+"""Fixtures seeded on every boot by `conf/migrate.sh`."""
+
+DATABASE_MANAGED_FIELDS = frozenset(("version", "search_rowid"))
+"""
+Columns an upsert must not overwrite from the fixture: versions only grow (resetting them could bring back stale cached
+fragments) and full-text keys are assigned by triggers.
+"""
+
+
+def fingerprint(path: Path) -> str:
+    """Return the SHA-256 of a file."""
+    digest = hashlib.sha256()
+    with path.open("rb") as stream:
+        for block in iter(lambda: stream.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_fixture(path: Path, using: str = DEFAULT_DB_ALIAS) -> dict[type[Model], list]:
+    """Deserialize a JSON fixture; returns the deserialized objects by model."""
+    by_model: dict[type[Model], list] = defaultdict(list)
+    with path.open(encoding="utf-8") as stream:
+        for item in serializers.deserialize("json", stream, using=using):
+            by_model[type(item.object)].append(item)
+    return by_model
+
+
+def stored_regions(users: list[User], using: str = DEFAULT_DB_ALIAS) -> set[str]:
+    """Return the search cache regions holding the locations the database has for members, before they are upserted."""
+    regions: set[str] = set()
+    for batch in batched((user.pk for user in users), 500):
+        for point in User.objects.using(using).filter(pk__in=batch).values_list("current_location", flat=True):
+            regions |= region_keys(point)
+    return regions
+
+
+def upsert_fixture(by_model: dict[type[Model], list], using: str = DEFAULT_DB_ALIAS) -> dict[type[Model], list]:
+    """
+    Insert or update every deserialized object with one bulk upsert per model; returns the objects by model.
+
+    Like `loaddata`, pre_save is sent with raw=True so derived columns are filled in and many-to-many relations are
+    replaced with the fixture's. post_save is not sent; callers update whatever depends on it for the returned objects.
+    """
+    for model, items in by_model.items():
+        instances = [item.object for item in items]
+        for instance in instances:
+            pre_save.send(sender=model, instance=instance, raw=True, using=using, update_fields=None)
+        fields = [
+            field.name
+            for field in model._meta.concrete_fields
+            if not field.primary_key and field.name not in DATABASE_MANAGED_FIELDS
+        ]
+        model.objects.using(using).bulk_create(
+            instances,
+            batch_size=500,
+            update_conflicts=bool(fields),
+            ignore_conflicts=not fields,
+            unique_fields=[model._meta.pk.name] if fields else None,
+            update_fields=fields or None,
+        )
+
+        for field in model._meta.many_to_many:
+            rows = [(item.object.pk, item.m2m_data[field.name]) for item in items if field.name in item.m2m_data]
+            if not rows:
+                continue
+            through = field.remote_field.through
+            source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+            pairs = {(pk, other) for pk, others in rows for other in others}
+            stale = through.objects.using(using).filter(**{f"{source}__in": [pk for pk, _ in rows]})
+            if field.remote_field.symmetrical:
+                # Relations to self are stored in both directions
+                pairs |= {(other, pk) for pk, other in pairs}
+                stale |= through.objects.using(using).filter(**{f"{target}__in": [pk for pk, _ in rows]})
+            stale.delete()
+            through.objects.using(using).bulk_create(
+                (through(**{f"{source}_id": pk, f"{target}_id": other}) for pk, other in pairs),
+                batch_size=500,
+                ignore_conflicts=True,
+            )
+
+    connection = connections[using]
+    if sequence_sql := connection.ops.sequence_reset_sql(no_style(), list(by_model)):
+        with connection.cursor() as cursor:
+            for sql in sequence_sql:
+                cursor.execute(sql)
+    return {model: [item.object for item in items] for model, items in by_model.items()}
+
+
+def index_rows(users: list[User], locations: list[Location], using: str = DEFAULT_DB_ALIAS) -> None:
+    """Update the R*Tree and nearby members tables for seeded users and saved locations, leaving other rows alone."""
+    with transaction.atomic(using=using):
+        located = [user for user in users if user.current_location]
+        upsert_points(USER_RTREE, ((user.pk, user.current_longitude, user.current_latitude) for user in located), using)
+        for user in users:
+            if not user.current_location:
+                delete_point(USER_RTREE, user.pk, using=using)
+        refresh_nearby_many(users, using=using)
+        upsert_points(LOCATION_RTREE, ((loc.pk, loc.location.x, loc.location.y) for loc in locations), using)
+
+
+class Command(BaseCommand):
+    """Load fixtures that changed since they were last seeded."""
+
+    help = (
+        "Load fixtures whose contents changed since they were last seeded, using bulk upserts; unchanged fixtures are "
+        "skipped so this is cheap to run on every boot."
+    )
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            "fixtures", nargs="*", default=DEFAULT_FIXTURES, help="Fixture files or names in the fixtures directory."
+        )
+        parser.add_argument("--force", action="store_true", help="Load fixtures even when they are unchanged.")
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS, help="Database to seed.")
+
+    def handle(self, *args, **options) -> None:
+        using: str = options["database"]
+        written: defaultdict[type[Model], dict] = defaultdict(dict)
+        regions: set[str] = set()
+        for name in options["fixtures"]:
+            path = Path(name) if Path(name).is_file() else FIXTURE_DIR / name
+            if not path.is_file():
+                raise CommandError(f"Fixture {name} does not exist")
+            path = path.resolve()
+
+            digest = fingerprint(path)
+            applied = AppliedFixture.objects.using(using).filter(path=str(path), fingerprint=digest).exists()
+            if applied and not options["force"]:
+                self.stdout.write(f"Skipped {path.name} (unchanged)")
+                continue
+
+            with transaction.atomic(using=using):
+                by_model = read_fixture(path, using=using)
+                # Regions members are leaving; the ones they enter are added once every fixture is loaded
+                regions |= stored_regions([item.object for item in by_model.get(User, ())], using=using)
+                for model, objects in upsert_fixture(by_model, using=using).items():
+                    written[model].update((instance.pk, instance) for instance in objects)
+                AppliedFixture.objects.using(using).update_or_create(path=str(path), defaults={"fingerprint": digest})
+            self.stdout.write(f"Loaded {path.name}")
+
+        if written.keys() & {User, Group}:
+            forget_all_user_groups()  # Memberships were replaced without m2m_changed
+        if User in written:
+            User.objects.using(using).update(version=F("version") + 1)  # Profiles may have changed without save()
+            bump_version(geo_engine.VERSION_KEY)
+            bump_version(autocomplete.VERSION_KEY)
+        if written.keys() & {User, Location}:
+            users, locations = list(written[User].values()), list(written[Location].values())
+            index_rows(users, locations, using=using)
+            self.stdout.write(f"Indexed {len(users)} users and {len(locations)} saved locations")
+        if User in written:
+            for user in written[User].values():
+                regions |= region_keys(user.current_location)
+            cache.delete_many(list(regions))
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+from django.db import migrations, models
+
+from emerald_heart.utils.spatial import geohash_encode
+
+
+def populate_geohashes(apps, schema_editor):
+    """Compute geohashes for every existing user and location point."""
+    User = apps.get_model("emerald_heart", "User")
+    Location = apps.get_model("emerald_heart", "Location")
+
+    users = []
+    for user in User.objects.exclude(current_location=None).only("id", "current_location").iterator():
+        user.current_geohash = geohash_encode(user.current_location.x, user.current_location.y)
+        users.append(user)
+    User.objects.bulk_update(users, ("current_geohash",), batch_size=500)
+
+    locations = []
+    for location in Location.objects.only("id", "location").iterator():
+        location.geohash = geohash_encode(location.location.x, location.location.y)
+        locations.append(location)
+    Location.objects.bulk_update(locations, ("geohash",), batch_size=500)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("emerald_heart", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="current_geohash",
+            field=models.CharField(blank=True, default="", editable=False, max_length=12),
+        ),
+        migrations.AddField(
+            model_name="location",
+            name="geohash",
+            field=models.CharField(blank=True, default="", editable=False, max_length=12),
+        ),
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(fields=["current_geohash", "id"], name="user_geohash_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="location",
+            index=models.Index(fields=["geohash", "user"], name="location_geohash_idx"),
+        ),
+        migrations.RunPython(populate_geohashes, migrations.RunPython.noop),
+    ]
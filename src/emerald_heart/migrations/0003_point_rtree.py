@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import logging
+
+from django.db import OperationalError, migrations
+
+LOG = logging.getLogger(__name__)
+
+# Copied from the app as it was when this migration was written so later changes there can't break it
+USER_RTREE = "emerald_heart_user_rtree"
+LOCATION_RTREE = "emerald_heart_location_rtree"
+RTREE_TABLES = (USER_RTREE, LOCATION_RTREE)
+BATCH_SIZE = 1000
+
+
+def _fill(cursor, table: str, points) -> None:
+    """Insert (pk, x, y) points into an empty R*Tree table, keyed by the top 63 bits of the UUID."""
+    sql = f"INSERT OR REPLACE INTO {table} (id, min_x, max_x, min_y, max_y, uuid) VALUES (%s, %s, %s, %s, %s, %s)"
+    batch = []
+    for pk, x, y in points:
+        batch.append((pk.int >> 65, x, x, y, y, pk.hex))
+        if len(batch) >= BATCH_SIZE:
+            cursor.executemany(sql, batch)
+            batch = []
+    if batch:
+        cursor.executemany(sql, batch)
+
+
+def create_rtrees(apps, schema_editor):
+    """Create and populate the R*Tree tables when SQLite was built with the rtree module."""
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return
+
+    try:
+        with connection.cursor() as cursor:
+            for table in RTREE_TABLES:
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING rtree(id, min_x, max_x, min_y, max_y, +uuid)"
+                )
+    except OperationalError:
+        LOG.warning("SQLite rtree module is unavailable; spatial lookups will use geohash cells only")
+        return
+
+    User = apps.get_model("emerald_heart", "User")
+    Location = apps.get_model("emerald_heart", "Location")
+    users = User.objects.exclude(current_location=None).only("id", "current_location").iterator()
+    locations = Location.objects.only("id", "location").iterator()
+    with connection.cursor() as cursor:
+        _fill(cursor, USER_RTREE, ((u.id, u.current_location.x, u.current_location.y) for u in users))
+        _fill(cursor, LOCATION_RTREE, ((loc.id, loc.location.x, loc.location.y) for loc in locations))
+
+
+def drop_rtrees(apps, schema_editor):
+    """Remove the R*Tree tables."""
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for table in RTREE_TABLES:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("emerald_heart", "0002_user_current_geohash_location_geohash"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_rtrees, drop_rtrees),
+    ]
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import logging
+
+from django.db import OperationalError, migrations
+
+LOG = logging.getLogger(__name__)
+
+USER_TABLE = "emerald_heart_user"
+USER_FTS = "emerald_heart_user_fts"
+COLUMNS = "name, bio"
+
+
+def create_fts(apps, schema_editor):
+    """Create and populate the full-text index when SQLite was built with FTS5."""
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return
+
+    # The index as it was first defined; 0012 re-keys it on a dedicated column
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {USER_FTS} USING fts5({COLUMNS}, content='{USER_TABLE}', "
+                "content_rowid='rowid', tokenize='unicode61 remove_diacritics 2')"
+            )
+    except OperationalError:
+        LOG.warning("SQLite FTS5 module is unavailable; keyword searches will use substring matching only")
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {USER_FTS}_insert AFTER INSERT ON {USER_TABLE} BEGIN "
+            f"INSERT INTO {USER_FTS} (rowid, {COLUMNS}) VALUES (new.rowid, new.name, new.bio); END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {USER_FTS}_delete AFTER DELETE ON {USER_TABLE} BEGIN "
+            f"INSERT INTO {USER_FTS} ({USER_FTS}, rowid, {COLUMNS}) VALUES ('delete', old.rowid, old.name, old.bio); END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {USER_FTS}_update AFTER UPDATE OF {COLUMNS} ON {USER_TABLE} BEGIN "
+            f"INSERT INTO {USER_FTS} ({USER_FTS}, rowid, {COLUMNS}) VALUES ('delete', old.rowid, old.name, old.bio); "
+            f"INSERT INTO {USER_FTS} (rowid, {COLUMNS}) VALUES (new.rowid, new.name, new.bio); END"
+        )
+        cursor.execute(f"INSERT INTO {USER_FTS} ({USER_FTS}) VALUES ('rebuild')")
+
+
+def drop_fts(apps, schema_editor):
+    """Remove the full-text index."""
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for trigger in ("insert", "delete", "update"):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {USER_FTS}_{trigger}")
+        cursor.execute(f"DROP TABLE IF EXISTS {USER_FTS}")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("emerald_heart", "0003_point_rtree"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
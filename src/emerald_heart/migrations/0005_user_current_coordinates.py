@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+from django.db import migrations, models
+
+
+def populate_coordinates(apps, schema_editor):
+    """Copy every existing user point into the coordinate columns."""
+    User = apps.get_model("emerald_heart", "User")
+
+    users = []
+    for user in User.objects.exclude(current_location=None).only("id", "current_location").iterator():
+        user.current_longitude = user.current_location.x
+        user.current_latitude = user.current_location.y
+        users.append(user)
+    User.objects.bulk_update(users, ("current_longitude", "current_latitude"), batch_size=500)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("emerald_heart", "0004_user_fts"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="current_longitude",
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="current_latitude",
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(fields=["current_latitude", "current_longitude"], name="user_lat_lon_idx"),
+        ),
+        migrations.RunPython(populate_coordinates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import logging
+import math
+
+import django.contrib.gis.db.models.fields
+from django.db import NotSupportedError, migrations, models
+
+LOG = logging.getLogger(__name__)
+
+USER_TABLE = "emerald_heart_user"
+USER_COLUMN = "current_location"
+LOCATION_TABLE = "emerald_heart_location"
+LOCATION_COLUMN = "location"
+
+# Copied from the app as it was when this migration was written so later changes there can't break it
+LOCATION_RTREE = "emerald_heart_location_rtree"
+EARTH_RADIUS = 6_371_008.8
+MERCATOR_RADIUS = 6_378_137.0
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9
+
+
+def _mercator_to_degrees(x: float, y: float) -> tuple[float, float]:
+    return (math.degrees(x / MERCATOR_RADIUS), math.degrees(2 * math.atan(math.exp(y / MERCATOR_RADIUS)) - math.pi / 2))
+
+
+def _degrees_to_mercator(longitude: float, latitude: float) -> tuple[float, float]:
+    return (
+        MERCATOR_RADIUS * math.radians(longitude),
+        MERCATOR_RADIUS * math.log(math.tan(math.pi / 4 + math.radians(latitude) / 2)),
+    )
+
+
+def _to_ecef(longitude: float, latitude: float) -> tuple[float, float, float]:
+    lon, lat = math.radians(longitude), math.radians(latitude)
+    radius = EARTH_RADIUS * math.cos(lat)
+    return (radius * math.cos(lon), radius * math.sin(lon), EARTH_RADIUS * math.sin(lat))
+
+
+def _geohash_encode(longitude: float, latitude: float) -> str:
+    lon_range, lat_range = [-180.0, 180.0], [-90.0, 90.0]
+    longitude = (longitude + 180.0) % 360.0 - 180.0 if not -180.0 <= longitude <= 180.0 else longitude
+    latitude = min(max(latitude, -90.0), 90.0)
+    chars: list[str] = []
+    bit = value = 0
+    even = True
+    while len(chars) < GEOHASH_PRECISION:
+        bounds, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (bounds[0] + bounds[1]) / 2
+        if coordinate >= mid:
+            value = (value << 1) | 1
+            bounds[0] = mid
+        else:
+            value <<= 1
+            bounds[1] = mid
+        even = not even
+        bit += 1
+        if bit == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bit = value = 0
+    return "".join(chars)
+
+
+def _rebuild_rtree(connection, table: str, points) -> None:
+    """Replace the contents of an R*Tree table, when SQLite has one, with (pk, x, y) points."""
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [table])
+        if cursor.fetchone() is None:
+            return
+        cursor.execute(f"DELETE FROM {table}")
+        cursor.executemany(
+            f"INSERT OR REPLACE INTO {table} (id, min_x, max_x, min_y, max_y, uuid) VALUES (%s, %s, %s, %s, %s, %s)",
+            [(pk.int >> 65, x, x, y, y, pk.hex) for pk, x, y in points],
+        )
+
+
+def _spatialite_set_srid(cursor, table: str, column: str, srid: int, rows=()) -> None:
+    """
+    Re-register a SpatiaLite point column under a new SRID without copying the table.
+
+    Every stored point is relabelled; `rows` of (pk, x, y) then replace individual points with converted values.
+    """
+    cursor.execute("SELECT DisableSpatialIndex(%s, %s)", [table, column])
+    cursor.execute(f"DROP TABLE IF EXISTS idx_{table}_{column}")
+    cursor.execute("SELECT DiscardGeometryColumn(%s, %s)", [table, column])
+    cursor.execute(f"UPDATE {table} SET {column} = SetSRID({column}, %s)", [srid])
+    for pk, x, y in rows:
+        cursor.execute(f"UPDATE {table} SET {column} = MakePoint(%s, %s, %s) WHERE id = %s", [x, y, srid, pk])
+    cursor.execute("SELECT RecoverGeometryColumn(%s, %s, %s, 'POINT', 'XY')", [table, column, srid])
+    cursor.execute("SELECT CreateSpatialIndex(%s, %s)", [table, column])
+
+
+def _convert(schema_editor, srid: int, convert_location) -> None:
+    """Relabel user points and reproject saved locations (with `convert_location`) to the given SRID."""
+    connection = schema_editor.connection
+    ops = connection.ops
+    if getattr(ops, "spatialite", False):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT id, X({LOCATION_COLUMN}), Y({LOCATION_COLUMN}) FROM {LOCATION_TABLE}")
+            locations = [(pk, *convert_location(x, y)) for pk, x, y in cursor.fetchall()]
+            _spatialite_set_srid(cursor, USER_TABLE, USER_COLUMN, srid)
+            _spatialite_set_srid(cursor, LOCATION_TABLE, LOCATION_COLUMN, srid, locations)
+    elif getattr(ops, "postgis", False):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"ALTER TABLE {USER_TABLE} ALTER COLUMN {USER_COLUMN} TYPE geometry(Point, {srid}) "
+                f"USING ST_SetSRID({USER_COLUMN}, {srid})"
+            )
+            cursor.execute(
+                f"ALTER TABLE {LOCATION_TABLE} ALTER COLUMN {LOCATION_COLUMN} TYPE geometry(Point, {srid}) "
+                f"USING ST_Transform({LOCATION_COLUMN}, {srid})"
+            )
+    else:
+        # Without a known way to reproject, saved locations would stay in meters under a 4326 label and every geohash
+        # and R*Tree entry derived from them would be wrong; stop rather than continue with mislabelled data
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {LOCATION_TABLE}")
+            (count,) = cursor.fetchone()
+        if count:
+            raise NotSupportedError(
+                f"Database {connection.alias} ({connection.vendor}) can't reproject the {count} saved locations to "
+                f"SRID {srid}; migrate with the SpatiaLite or PostGIS backend"
+            )
+        LOG.warning("Database %s keeps no SRID metadata; there were no saved locations to reproject", connection.alias)
+
+
+def _refresh_derived(apps, schema_editor) -> None:
+    """Recompute the ECEF columns of users and the geohashes and R*Tree entries of saved locations."""
+    User = apps.get_model("emerald_heart", "User")
+    Location = apps.get_model("emerald_heart", "Location")
+
+    users = list(User.objects.exclude(current_location=None).only("id", "current_longitude", "current_latitude"))
+    for user in users:
+        user.current_ecef_x, user.current_ecef_y, user.current_ecef_z = _to_ecef(
+            user.current_longitude, user.current_latitude
+        )
+    User.objects.bulk_update(users, ("current_ecef_x", "current_ecef_y", "current_ecef_z"), batch_size=500)
+
+    locations = list(Location.objects.only("id", "location"))
+    for location in locations:
+        location.geohash = _geohash_encode(location.location.x, location.location.y)
+    Location.objects.bulk_update(locations, ("geohash",), batch_size=500)
+    points = ((loc.id, loc.location.x, loc.location.y) for loc in locations)
+    _rebuild_rtree(schema_editor.connection, LOCATION_RTREE, points)
+
+
+def to_wgs84(apps, schema_editor):
+    """Store points as WGS84 degrees; user points already held degrees while saved locations held Mercator meters."""
+    _convert(schema_editor, 4326, _mercator_to_degrees)
+    _refresh_derived(apps, schema_editor)
+
+
+def to_mercator(apps, schema_editor):
+    """Undo `to_wgs84`."""
+    _convert(schema_editor, 3857, _degrees_to_mercator)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("emerald_heart", "0005_user_current_coordinates"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="current_ecef_x",
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="current_ecef_y",
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="current_ecef_z",
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.SeparateDatabaseAndState(
+            # Changing the SRID through AlterField would copy the whole table and reproject every point; user points
+            # were degrees labelled as Mercator so they only need relabelling
+            state_operations=[
+                migrations.AlterField(
+                    model_name="user",
+                    name="current_location",
+                    field=django.contrib.gis.db.models.fields.PointField(null=True, srid=4326),
+                ),
+                migrations.AlterField(
+                    model_name="location",
+                    name="location",
+                    field=django.contrib.gis.db.models.fields.PointField(srid=4326, unique=True),
+                ),
+            ],
+            database_operations=[],
+        ),
+        migrations.RunPython(to_wgs84, to_mercator),
+    ]
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import math
+from bisect import bisect_left
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+import emerald_heart.models.mixins
+
+# Copied from the app as it was when this migration was written so later changes there can't break it
+BANDS = (5, 10, 20)
+LIMITS = tuple(miles * 1609.344 for miles in BANDS)
+EARTH_RADIUS = 6_371_008.8
+METERS_PER_DEGREE = 110_574.0
+
+
+def _haversine(lon1: float, lat1: float, lon2: float, lat2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (
+        math.sin((phi2 - phi1) / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _box(users, longitude: float, latitude: float):
+    """Narrow users to a box holding everything within the widest band of a point."""
+    lat_delta = LIMITS[-1] / METERS_PER_DEGREE
+    users = users.filter(current_latitude__gte=latitude - lat_delta, current_latitude__lte=latitude + lat_delta)
+    widest = min(abs(latitude) + lat_delta, 89.9)
+    lon_delta = LIMITS[-1] / (METERS_PER_DEGREE * math.cos(math.radians(widest)))
+    if -180.0 <= longitude - lon_delta and longitude + lon_delta <= 180.0:
+        users = users.filter(current_longitude__gte=longitude - lon_delta, current_longitude__lte=longitude + lon_delta)
+    return users  # Boxes crossing the antimeridian only filter by latitude
+
+
+def populate_nearby(apps, schema_editor):
+    """Store the nearby members of everyone who has a location."""
+    using = schema_editor.connection.alias
+    User = apps.get_model("emerald_heart", "User")
+    NearbyMember = apps.get_model("emerald_heart", "NearbyMember")
+    members = User.objects.using(using).exclude(username="admin").exclude(current_location=None)
+    batch = []
+    for pk, longitude, latitude in list(members.values_list("id", "current_longitude", "current_latitude")):
+        others = _box(members.exclude(id=pk), longitude, latitude)
+        for member_pk, lon, lat in others.values_list("id", "current_longitude", "current_latitude"):
+            meters = _haversine(longitude, latitude, lon, lat)
+            if (band := bisect_left(LIMITS, meters)) < len(LIMITS):
+                batch.append(NearbyMember(user_id=pk, member_id=member_pk, band=BANDS[band], distance=meters))
+        if len(batch) >= 1000:
+            NearbyMember.objects.using(using).bulk_create(batch)
+            batch = []
+    NearbyMember.objects.using(using).bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("emerald_heart", "0006_wgs84_points"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NearbyMember",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("band", models.PositiveSmallIntegerField()),
+                ("distance", models.FloatField()),
+                (
+                    "member",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="nearby_set",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["user", "band"], name="nearby_user_band_idx"),
+                    models.Index(fields=["user", "distance", "member"], name="nearby_user_distance_idx"),
+                ],
+                "constraints": [
+                    models.UniqueConstraint(fields=("user", "member"), name="nearby_user_member_unique"),
+                ],
+            },
+            bases=(emerald_heart.models.mixins.BaseMixin, models.Model),
+        ),
+        migrations.RunPython(populate_nearby, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import logging
+
+from django.db import OperationalError, migrations
+
+LOG = logging.getLogger(__name__)
+
+# Copied from the app as it was when this migration was written so later changes there can't break it
+USER_FTS = "emerald_heart_user_fts"
+USER_FTS_VOCAB = "emerald_heart_user_fts_vocab"
+
+
+def create_vocab(apps, schema_editor):
+    """Expose the term counts of the full-text index so keyword searches can be planned."""
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [USER_FTS])
+            if cursor.fetchone() is None:
+                return
+            cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {USER_FTS_VOCAB} USING fts5vocab({USER_FTS}, 'row')")
+    except OperationalError:
+        LOG.warning("SQLite fts5vocab is unavailable; keyword searches will always search the area first")
+
+
+def drop_vocab(apps, schema_editor):
+    """Remove the term counts table."""
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {USER_FTS_VOCAB}")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("emerald_heart", "0007_nearbymember"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_vocab, drop_vocab),
+    ]
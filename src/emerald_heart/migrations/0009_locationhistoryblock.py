@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+import emerald_heart.models.mixins
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("emerald_heart", "0008_user_fts_vocab"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LocationHistoryBlock",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("started", models.DateTimeField()),
+                ("ended", models.DateTimeField()),
+                ("count", models.PositiveIntegerField(default=0)),
+                ("resolution", models.PositiveIntegerField(default=0)),
+                ("data", models.BinaryField()),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="location_history",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["user", "started"], name="history_user_started_idx"),
+                    models.Index(fields=["ended"], name="history_ended_idx"),
+                ],
+            },
+            bases=(emerald_heart.models.mixins.BaseMixin, models.Model),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+from django.db import migrations, models
+
+import emerald_heart.models.mixins
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("emerald_heart", "0009_locationhistoryblock"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AppliedFixture",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("name", models.CharField(max_length=255, unique=True)),
+                ("fingerprint", models.CharField(max_length=64)),
+                ("applied", models.DateTimeField(auto_now=True)),
+            ],
+            bases=(emerald_heart.models.mixins.BaseMixin, models.Model),
+        ),
+    ]
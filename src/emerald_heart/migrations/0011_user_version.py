@@ -0,0 +1,17 @@
+from __future__ import annotations
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("emerald_heart", "0010_appliedfixture"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="version",
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import logging
+
+from django.db import migrations, models
+
+LOG = logging.getLogger(__name__)
+
+USER_TABLE = "emerald_heart_user"
+USER_FTS = "emerald_heart_user_fts"
+USER_FTS_VOCAB = "emerald_heart_user_fts_vocab"
+KEY = "search_rowid"
+COLUMNS = "name, bio"
+TRIGGERS = ("insert", "delete", "update", "keep_key")
+
+
+def _table_exists(cursor, name: str) -> bool:
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = %s", [name])
+    return cursor.fetchone() is not None
+
+
+def _drop(cursor) -> None:
+    for trigger in TRIGGERS:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {USER_FTS}_{trigger}")
+    cursor.execute(f"DROP TABLE IF EXISTS {USER_FTS_VOCAB}")
+    cursor.execute(f"DROP TABLE IF EXISTS {USER_FTS}")
+
+
+def rekey_fts(apps, schema_editor):
+    """
+    Key the full-text index on `search_rowid` instead of the implicit rowid, which a `VACUUM` may renumber.
+
+    Rebuilding the user table (as 0011 did) also renumbers rowids and drops the triggers, so the index is recreated and
+    repopulated from scratch.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"UPDATE {USER_TABLE} SET {KEY} = rowid WHERE {KEY} IS NULL")
+        if not _table_exists(cursor, USER_FTS):
+            return  # SQLite lacks FTS5; searches use substring matching
+        vocab = _table_exists(cursor, USER_FTS_VOCAB)
+        _drop(cursor)
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE {USER_FTS} USING fts5({COLUMNS}, content='{USER_TABLE}', "
+            f"content_rowid='{KEY}', tokenize='unicode61 remove_diacritics 2')"
+        )
+        if vocab:
+            cursor.execute(f"CREATE VIRTUAL TABLE {USER_FTS_VOCAB} USING fts5vocab({USER_FTS}, 'row')")
+        cursor.execute(
+            f"CREATE TRIGGER {USER_FTS}_insert AFTER INSERT ON {USER_TABLE} BEGIN "
+            f"UPDATE {USER_TABLE} SET {KEY} = (SELECT coalesce(max({KEY}), 0) + 1 FROM {USER_TABLE}) "
+            f"WHERE rowid = new.rowid AND new.{KEY} IS NULL; "
+            f"INSERT INTO {USER_FTS} (rowid, {COLUMNS}) SELECT {KEY}, {COLUMNS} FROM {USER_TABLE} "
+            "WHERE rowid = new.rowid; END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER {USER_FTS}_delete AFTER DELETE ON {USER_TABLE} BEGIN "
+            f"INSERT INTO {USER_FTS} ({USER_FTS}, rowid, {COLUMNS}) VALUES ('delete', old.{KEY}, old.name, old.bio); END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER {USER_FTS}_update AFTER UPDATE OF {COLUMNS} ON {USER_TABLE} BEGIN "
+            f"INSERT INTO {USER_FTS} ({USER_FTS}, rowid, {COLUMNS}) VALUES ('delete', old.{KEY}, old.name, old.bio); "
+            f"INSERT INTO {USER_FTS} (rowid, {COLUMNS}) VALUES (coalesce(new.{KEY}, old.{KEY}), new.name, new.bio); END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER {USER_FTS}_keep_key AFTER UPDATE OF {KEY} ON {USER_TABLE} "
+            f"WHEN new.{KEY} IS NULL BEGIN UPDATE {USER_TABLE} SET {KEY} = old.{KEY} WHERE rowid = new.rowid; END"
+        )
+        cursor.execute(f"INSERT INTO {USER_FTS} ({USER_FTS}) VALUES ('rebuild')")
+
+
+def rowid_fts(apps, schema_editor):
+    """Key the index on the implicit rowid again, as 0004 defined it."""
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        if not _table_exists(cursor, USER_FTS):
+            return
+        vocab = _table_exists(cursor, USER_FTS_VOCAB)
+        _drop(cursor)
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE {USER_FTS} USING fts5({COLUMNS}, content='{USER_TABLE}', "
+            "content_rowid='rowid', tokenize='unicode61 remove_diacritics 2')"
+        )
+        if vocab:
+            cursor.execute(f"CREATE VIRTUAL TABLE {USER_FTS_VOCAB} USING fts5vocab({USER_FTS}, 'row')")
+        cursor.execute(
+            f"CREATE TRIGGER {USER_FTS}_insert AFTER INSERT ON {USER_TABLE} BEGIN "
+            f"INSERT INTO {USER_FTS} (rowid, {COLUMNS}) VALUES (new.rowid, new.name, new.bio); END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER {USER_FTS}_delete AFTER DELETE ON {USER_TABLE} BEGIN "
+            f"INSERT INTO {USER_FTS} ({USER_FTS}, rowid, {COLUMNS}) VALUES ('delete', old.rowid, old.name, old.bio); END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER {USER_FTS}_update AFTER UPDATE OF {COLUMNS} ON {USER_TABLE} BEGIN "
+            f"INSERT INTO {USER_FTS} ({USER_FTS}, rowid, {COLUMNS}) VALUES ('delete', old.rowid, old.name, old.bio); "
+            f"INSERT INTO {USER_FTS} (rowid, {COLUMNS}) VALUES (new.rowid, new.name, new.bio); END"
+        )
+        cursor.execute(f"INSERT INTO {USER_FTS} ({USER_FTS}) VALUES ('rebuild')")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("emerald_heart", "0011_user_version"),
+    ]
+
+    operations = [
+        # Nullable and only indexed (not unique) so SQLite adds the column in place instead of copying the table
+        migrations.AddField(
+            model_name="user",
+            name="search_rowid",
+            field=models.BigIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.RunPython(rekey_fts, rowid_fts),
+    ]
@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from django.db import migrations, models
+
+
+def forget_names(apps, schema_editor):
+    """Drop fixtures recorded by file name; `seed` loads them once more and records them by path."""
+    AppliedFixture = apps.get_model("emerald_heart", "AppliedFixture")
+    AppliedFixture.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("emerald_heart", "0012_user_search_rowid"),
+    ]
+
+    operations = [
+        migrations.RunPython(forget_names, migrations.RunPython.noop),
+        migrations.RenameField(model_name="appliedfixture", old_name="name", new_name="path"),
+        migrations.AlterField(
+            model_name="appliedfixture",
+            name="path",
+            field=models.CharField(max_length=1024, unique=True),
+        ),
+    ]
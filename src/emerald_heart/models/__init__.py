@@ -1,8 +1,11 @@
 from __future__ import annotations
 
+from .applied_fixture import AppliedFixture
+from .history import LocationHistoryBlock
 from .invite_key import InviteKey
 from .location import Location
+from .nearby import NearbyMember
 from .request import Request
 from .user import User
 
-__all__ = ("Location", "User", "InviteKey", "Request")
+__all__ = ("AppliedFixture", "Location", "User", "InviteKey", "LocationHistoryBlock", "NearbyMember", "Request")
@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import logging
+
+from django.db import models
+
+from .mixins import BaseMixin
+
+LOG = logging.getLogger(__name__)
+
+
+class AppliedFixture(BaseMixin, models.Model):
+    """The fingerprint of a fixture file the last time it was seeded; see the `seed` management command."""
+
+    path = models.CharField(max_length=1024, unique=True)
+    """Resolved path of the fixture file, so fixtures of the same name in different directories are tracked apart."""
+    fingerprint = models.CharField(max_length=64)
+    """SHA-256 of the fixture file."""
+    applied = models.DateTimeField(auto_now=True)
+
+    @property
+    def display_name(self) -> str:
+        return f"{self.path} ({self.fingerprint[:12]})"
+
+    class Meta:
+        """Meta information about the model."""
+
+        app_label = "emerald_heart"
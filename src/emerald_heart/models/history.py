@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import logging
+
+from django.db import models
+
+from emerald_heart.hints import HistoryPoint
+from emerald_heart.utils.history import decode_points
+
+from .mixins import BaseMixin
+
+LOG = logging.getLogger(__name__)
+
+
+class LocationHistoryBlock(BaseMixin, models.Model):
+    """
+    A run of a member's past locations packed into one row.
+
+    History is append-only and lives apart from `User` so recording it never touches the user table or its indexes.
+    Points are delta encoded (see `emerald_heart.utils.history`) and blocks are downsampled then dropped as they age;
+    see `emerald_heart.utils.location_history`.
+    """
+
+    user = models.ForeignKey(
+        "emerald_heart.User",
+        blank=False,
+        null=False,
+        on_delete=models.CASCADE,
+        related_name="location_history",
+    )
+    started = models.DateTimeField()
+    """Time of the first point; point times are stored as offsets from it."""
+    ended = models.DateTimeField()
+    """Time of the last point."""
+    count = models.PositiveIntegerField(default=0)
+    resolution = models.PositiveIntegerField(default=0)
+    """Seconds between kept points once downsampled; 0 for raw pings."""
+    data = models.BinaryField()
+
+    @property
+    def display_name(self) -> str:
+        return f"{self.user_id} {self.started:%Y-%m-%d %H:%M} ({self.count} points)"
+
+    @property
+    def points(self) -> list[HistoryPoint]:
+        """Return the decoded points of the block."""
+        return decode_points(self.started, bytes(self.data))
+
+    class Meta:
+        """Meta information about the model."""
+
+        app_label = "emerald_heart"
+        indexes = (
+            models.Index(fields=("user", "started"), name="history_user_started_idx"),
+            models.Index(fields=("ended",), name="history_ended_idx"),
+        )
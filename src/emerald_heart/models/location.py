@@ -19,7 +19,9 @@ class Location(models.Model, BaseMixin):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False, db_index=True)
     name = models.CharField(blank=False, null=False)
     created = models.DateTimeField(auto_now_add=True)
-    location = gis_models.PointField(unique=True, geography=False, srid=3857)
+    location = gis_models.PointField(unique=True, geography=False, srid=4326)
+    geohash = models.CharField(max_length=12, blank=True, default="", editable=False)
+    """Geohash of `location`; maintained by a pre_save signal."""
     modified = models.DateTimeField(auto_now=True)
     user = models.ForeignKey(
         "emerald_heart.User",
@@ -64,3 +66,4 @@ class Location(models.Model, BaseMixin):
 
         ordering = ("-created",)
         app_label = "emerald_heart"
+        indexes = (models.Index(fields=("geohash", "user"), name="location_geohash_idx"),)
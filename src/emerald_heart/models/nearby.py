@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import logging
+
+from django.db import models
+
+from .mixins import BaseMixin
+
+LOG = logging.getLogger(__name__)
+
+
+class NearbyMember(BaseMixin, models.Model):
+    """
+    A member within the largest small-radius search band of a user's current location.
+
+    Every close pair is stored in both directions so the neighbours of a user are one indexed range. Rows are replaced
+    for the affected neighbourhood whenever a user's location changes; see `emerald_heart.views.search.nearby`.
+    """
+
+    user = models.ForeignKey(
+        "emerald_heart.User",
+        blank=False,
+        null=False,
+        on_delete=models.CASCADE,
+        related_name="nearby_set",
+    )
+    member = models.ForeignKey(
+        "emerald_heart.User",
+        blank=False,
+        null=False,
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    band = models.PositiveSmallIntegerField()
+    """Smallest search distance (in miles) that includes the member."""
+    distance = models.FloatField()
+    """Great-circle distance between the pair in meters."""
+
+    @property
+    def display_name(self) -> str:
+        return f"{self.user_id} --> {self.member_id} ({self.band} mi)"
+
+    class Meta:
+        """Meta information about the model."""
+
+        app_label = "emerald_heart"
+        constraints = (models.UniqueConstraint(fields=("user", "member"), name="nearby_user_member_unique"),)
+        indexes = (
+            models.Index(fields=("user", "band"), name="nearby_user_band_idx"),
+            models.Index(fields=("user", "distance", "member"), name="nearby_user_distance_idx"),
+        )
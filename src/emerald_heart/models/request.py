@@ -12,6 +12,16 @@ from .mixins import BaseMixin
 LOG = logging.getLogger(__name__)
 
 
+class RequestQuerySet(models.QuerySet):
+    """Queries for connection requests."""
+
+    def with_versions(self) -> RequestQuerySet:
+        """Annotate both users versions so cached rows can be used without loading the users."""
+        return self.annotate(
+            source_version=models.F("source_user__version"), dest_version=models.F("dest_user__version")
+        )
+
+
 class Request(BaseMixin, models.Model):
     """A request for one user to connect to another."""
 
@@ -32,6 +42,17 @@ class Request(BaseMixin, models.Model):
     )
     created = models.DateTimeField(auto_now_add=True)
 
+    objects = RequestQuerySet.as_manager()
+
+    @property
+    def fragment_key(self) -> tuple[object, ...]:
+        """Identify the cached HTML of this request; it changes with either users profile."""
+        if (source_version := getattr(self, "source_version", None)) is None:
+            source_version = self.source_user.version
+        if (dest_version := getattr(self, "dest_version", None)) is None:
+            dest_version = self.dest_user.version
+        return (self.pk.hex, source_version, dest_version)
+
     @property
     def display_name(self) -> str:
         return f"{self.source_user.display_name} --> {self.dest_user.display_name}"
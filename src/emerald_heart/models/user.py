@@ -9,10 +9,13 @@ from functools import cached_property
 from django.contrib.auth.models import AbstractUser
 from django.contrib.gis.db import models as gis_models
 from django.db import models
+from django.db.models import DEFERRED, F
 
 from emerald_heart.hints import Coordinate
 from emerald_heart.models.mixins import BaseMixin
 from emerald_heart.utils.calendar import get_server_tz, is_naive
+from emerald_heart.utils.groups import get_user_groups
+from emerald_heart.utils.spatial import as_wgs84, geohash_encode, to_ecef
 
 LOG = logging.getLogger(__name__)
 
@@ -643,8 +646,100 @@ class User(AbstractUser, BaseMixin):
         max_length=64,
         default="America/Chicago",
     )
-    current_location = gis_models.PointField(null=True, geography=False, srid=3857)
+    current_location = gis_models.PointField(null=True, geography=False, srid=4326)
+    current_geohash = models.CharField(max_length=12, blank=True, default="", editable=False)
+    """Geohash of `current_location`; maintained by a pre_save signal and used to narrow radius searches."""
+    current_longitude = models.FloatField(null=True, blank=True, editable=False)
+    """Longitude of `current_location` as a plain column so SQL can compute distances; kept by a pre_save signal."""
+    current_latitude = models.FloatField(null=True, blank=True, editable=False)
+    """Latitude of `current_location` as a plain column so SQL can compute distances; kept by a pre_save signal."""
+    current_ecef_x = models.FloatField(null=True, blank=True, editable=False)
+    """Earth-centred X of `current_location` in meters; with Y and Z it allows radius tests using only arithmetic."""
+    current_ecef_y = models.FloatField(null=True, blank=True, editable=False)
+    """Earth-centred Y of `current_location` in meters."""
+    current_ecef_z = models.FloatField(null=True, blank=True, editable=False)
+    """Earth-centred Z of `current_location` in meters."""
     connections = models.ManyToManyField("self", blank=True)
+    version = models.PositiveIntegerField(default=1, editable=False)
+    """Incremented whenever a profile field changes; keys the cached HTML of member cards and request rows."""
+    search_rowid = models.BigIntegerField(null=True, blank=True, editable=False, db_index=True)
+    """Key of the member in the full-text index; assigned and kept by database triggers (see `utils.fts`)."""
+
+    LOCATION_COLUMNS: tuple[str, ...] = (
+        "current_geohash",
+        "current_longitude",
+        "current_latitude",
+        "current_ecef_x",
+        "current_ecef_y",
+        "current_ecef_z",
+    )
+    """Columns derived from `current_location` by `set_location_columns`."""
+
+    PROFILE_FIELDS: frozenset[str] = frozenset(("username", "name", "first_name", "last_name", "bio"))
+    """Fields shown in cached fragments; saving any of them bumps `version`."""
+
+    def save(self, *args, **kwargs) -> None:
+        update_fields = kwargs.get("update_fields")
+        # Columns derived from the current location must be written whenever the location itself is written
+        if update_fields is not None and "current_location" in update_fields:
+            kwargs["update_fields"] = update_fields = {*update_fields, *self.LOCATION_COLUMNS}
+        # Location pings and logins leave the version alone so cached fragments survive them
+        if update_fields is None or self.PROFILE_FIELDS.intersection(update_fields):
+            # Bumped in the UPDATE itself so concurrent saves can't both write the same version; Django reads the new
+            # value back with RETURNING (or defers it where the backend can't)
+            if not self._state.adding:
+                self.version = F("version") + 1
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "version"}
+        super().save(*args, **kwargs)
+        self._remember_location()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_location()
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs) -> None:
+        super().refresh_from_db(*args, **kwargs)
+        self._remember_location()
+
+    def _remember_location(self) -> None:
+        """Note the location the database holds; DEFERRED when it wasn't loaded."""
+        point = self.__dict__.get("current_location", DEFERRED)
+        self._stored_location = point.coords if point is not None and point is not DEFERRED else point
+
+    @property
+    def location_changed(self) -> bool:
+        """
+        Determine if `current_location` differs from the stored one; True when the stored one isn't known.
+
+        Save signals run before the new location is noted, so receivers can use this to skip saves that didn't move the
+        member (profile edits and logins save every field).
+        """
+        stored = self.__dict__.get("_stored_location", DEFERRED)
+        if stored is DEFERRED:
+            return True
+        point = self.current_location
+        return (point.coords if point is not None else None) != stored
+
+    @property
+    def fragment_key(self) -> tuple[object, ...]:
+        """Identify the cached HTML of this member; see `emerald_heart.utils.render.render_fragments`."""
+        return (self.pk.hex, self.version)
+
+    def set_location_columns(self) -> None:
+        """Recompute the geohash, coordinate and ECEF columns from `current_location`, converting it to WGS84."""
+        if point := as_wgs84(self.current_location):
+            self.current_location = point
+            self.current_geohash = geohash_encode(point.x, point.y)
+            self.current_longitude = point.x
+            self.current_latitude = point.y
+            self.current_ecef_x, self.current_ecef_y, self.current_ecef_z = to_ecef(point.x, point.y)
+        else:
+            self.current_geohash = ""
+            self.current_longitude = self.current_latitude = None
+            self.current_ecef_x = self.current_ecef_y = self.current_ecef_z = None
 
     @cached_property
     def server_tzinfo(self) -> zoneinfo.ZoneInfo:
@@ -696,14 +791,17 @@ class User(AbstractUser, BaseMixin):
         """
         return Coordinate(self.current_location.x, self.current_location.y)
 
+    @cached_property
+    def group_names(self) -> tuple[str, ...]:
+        """Return the names of the users groups; cached on the instance and in the shared cache."""
+        if self._state.adding:
+            return ()
+        return get_user_groups(self.pk)
+
     @property
     def group_list(self) -> list[str]:
         """Return an array of group names."""
-        groups: list[str] = []
-        if self_groups := getattr(self, "groups", None):
-            groups = self_groups.values_list("name", flat=True)
-
-        return groups
+        return list(self.group_names)
 
     @property
     def is_admin(self) -> bool:
@@ -739,3 +837,7 @@ class User(AbstractUser, BaseMixin):
 
         ordering = ("username",)
         app_label = "emerald_heart"
+        indexes = (
+            models.Index(fields=("current_geohash", "id"), name="user_geohash_idx"),
+            models.Index(fields=("current_latitude", "current_longitude"), name="user_lat_lon_idx"),
+        )
@@ -16,6 +16,60 @@ THUMBNAIL_SIZE = 256
 PAGINATION_THRESHOLD = 10
 """Number if items to show before beginning to paginate the view."""
 
+MEMBER_SEARCH_PAGE_SIZE = 25
+"""Number of member cards returned per page of search results."""
+
+MEMBER_SEARCH_ENGINE = "database"
+"""Where radius and nearest searches are answered: "database", or "numpy" for an in-memory snapshot per process."""
+
+MEMBER_NAME_INDEX_CHECK_INTERVAL = 2.0
+"""Seconds between checks that another process changed member names; bounds how stale autocomplete can be."""
+
+MEMBER_SEARCH_CACHE_TIMEOUT = 900
+"""Seconds a cached list of search candidates lives; bounds staleness from location writes outside the location view."""
+
+MEMBER_LOCATION_FLUSH_INTERVAL = 5.0
+"""
+Seconds location pings are buffered before being written together; 0 writes every ping as it arrives.
+
+Buffered pings live in the memory of the process that received them until the next flush (or a clean exit), so a
+worker that is killed outright (SIGKILL, the OOM killer) loses up to this many seconds of pings. Only the newest point
+of each member is kept and their next ping replaces it, so the loss is a short gap in location history.
+"""
+
+MEMBER_LOCATION_MIN_MOVEMENT = 250.0
+"""Meters a member must move from their stored location before a ping is written."""
+
+MEMBER_LOCATION_MIN_INTERVAL = 600
+"""Seconds between location checks for members who are moving."""
+
+MEMBER_LOCATION_MAX_INTERVAL = 4 * 3600
+"""Longest wait (in seconds) between location checks; stationary members back off towards it."""
+
+MEMBER_LOCATION_HISTORY_BLOCK_SIZE = 256
+"""Most points stored in one location history block."""
+
+MEMBER_LOCATION_HISTORY_BLOCK_SPAN = 86400
+"""Longest time (in seconds) one location history block covers; keeps blocks aligned with the retention policy."""
+
+MEMBER_LOCATION_HISTORY_RAW_DAYS = 30
+"""Days location history is kept at full resolution before being downsampled."""
+
+MEMBER_LOCATION_HISTORY_RESOLUTION = 3600
+"""Seconds between the points kept once location history is downsampled."""
+
+MEMBER_LOCATION_HISTORY_RETENTION_DAYS = 365
+"""Days location history is kept at all."""
+
+MEMBER_SEARCH_STATS_TIMEOUT = 3600
+"""Seconds the statistics used to plan keyword and radius searches (member density, term counts) are cached."""
+
+FRAGMENT_CACHE_TIMEOUT = 7 * 86400
+"""Seconds rendered member cards and request rows are cached; they are keyed by version so this only bounds size."""
+
+USER_GROUPS_CACHE_TIMEOUT = 3600
+"""Seconds a users cached group names are kept; they are checked against version stamps so this is only a backstop."""
+
 
 LOGIN_TAB: SiteLayout = [
     {
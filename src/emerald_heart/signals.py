@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import logging
+
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_save
+from django.dispatch import receiver
+
+from emerald_heart.models import Location, Request, User
+from emerald_heart.utils.fts import restore_triggers
+from emerald_heart.utils.groups import forget_all_user_groups, forget_user_groups
+from emerald_heart.utils.query import register_sql_functions
+from emerald_heart.utils.rtree import LOCATION_RTREE, USER_RTREE, delete_point, upsert_point
+from emerald_heart.utils.spatial import as_wgs84, geohash_encode
+from emerald_heart.views.search.autocomplete import NAME_INDEX
+from emerald_heart.views.search.geo_engine import get_engine
+from emerald_heart.views.search.nearby import refresh_nearby
+from emerald_heart.views.search.sent_requests import forget_sent_requests
+
+LOG = logging.getLogger(__name__)
+
+
+@receiver(connection_created, dispatch_uid="emerald-sql-functions")
+def add_sql_functions(sender, connection, **kwargs) -> None:
+    """Register the SQL functions searches rely on with every new SQLite connection."""
+    if connection.vendor == "sqlite":
+        register_sql_functions(connection.connection)
+
+
+@receiver(post_migrate, dispatch_uid="emerald-fts-triggers")
+def restore_fts_triggers(sender, using: str, **kwargs) -> None:
+    """Recreate the full-text triggers a migration dropped by copying the user table into a new one."""
+    if sender.name == "emerald_heart":
+        restore_triggers(using)
+
+
+@receiver(pre_save, sender=User, dispatch_uid="emerald-user-geohash")
+def set_user_geohash(sender, instance: User, **kwargs) -> None:
+    """Keep the columns derived from the users location in step with it (this also runs for fixture loads)."""
+    instance.set_location_columns()
+
+
+@receiver(pre_save, sender=Location, dispatch_uid="emerald-location-geohash")
+def set_location_geohash(sender, instance: Location, **kwargs) -> None:
+    """Keep the geohash column in step with the location point, storing it in WGS84 whatever SRID it was given in."""
+    if point := as_wgs84(instance.location):
+        instance.location = point
+        instance.geohash = geohash_encode(point.x, point.y)
+    else:
+        instance.geohash = ""
+
+
+@receiver(post_save, sender=User, dispatch_uid="emerald-user-rtree-save")
+def sync_user_rtree(sender, instance: User, using: str, update_fields=None, **kwargs) -> None:
+    """Mirror the users current location into the R*Tree."""
+    if update_fields is not None and "current_location" not in update_fields:
+        return  # Location wasn't written
+    if point := instance.current_location:
+        upsert_point(USER_RTREE, instance.pk, point.x, point.y, using=using)
+    else:
+        delete_point(USER_RTREE, instance.pk, using=using)
+
+
+@receiver(post_save, sender=User, dispatch_uid="emerald-user-nearby-save")
+def sync_user_nearby(sender, instance: User, using: str, update_fields=None, **kwargs) -> None:
+    """Replace the nearby members rows around a user whose location changed."""
+    if update_fields is not None and "current_location" not in update_fields:
+        return
+    if not instance.location_changed:
+        return  # Rewriting thousands of rows for a profile edit would hold the write lock for nothing
+    refresh_nearby(instance, using=using)
+
+
+@receiver(post_delete, sender=User, dispatch_uid="emerald-user-rtree-delete")
+def remove_user_rtree(sender, instance: User, using: str, **kwargs) -> None:
+    """Drop a deleted user from the R*Tree."""
+    delete_point(USER_RTREE, instance.pk, using=using)
+
+
+@receiver(post_save, sender=Location, dispatch_uid="emerald-location-rtree-save")
+def sync_location_rtree(sender, instance: Location, using: str, **kwargs) -> None:
+    """Mirror a location point into the R*Tree."""
+    if point := instance.location:
+        upsert_point(LOCATION_RTREE, instance.pk, point.x, point.y, using=using)
+
+
+@receiver(post_delete, sender=Location, dispatch_uid="emerald-location-rtree-delete")
+def remove_location_rtree(sender, instance: Location, using: str, **kwargs) -> None:
+    """Drop a deleted location from the R*Tree."""
+    delete_point(LOCATION_RTREE, instance.pk, using=using)
+
+
+@receiver(post_save, sender=Request, dispatch_uid="emerald-request-sent-save")
+@receiver(post_delete, sender=Request, dispatch_uid="emerald-request-sent-delete")
+def reset_sent_requests(sender, instance: Request, **kwargs) -> None:
+    """Drop the cached ids of members the requests source user has sent requests to."""
+    forget_sent_requests(instance.source_user_id)
+
+
+@receiver(post_save, sender=User, dispatch_uid="emerald-user-name-index-save")
+def update_name_index(sender, instance: User, using: str, update_fields=None, **kwargs) -> None:
+    """Keep the member name index current; other processes see the change once it commits."""
+    if update_fields is not None and not {"name", "username"} & set(update_fields):
+        return
+    pk, username, name = instance.pk, instance.username, instance.name
+    transaction.on_commit(lambda: NAME_INDEX.update(pk, username, name), using=using)
+
+
+@receiver(post_delete, sender=User, dispatch_uid="emerald-user-name-index-delete")
+def remove_name_index(sender, instance: User, using: str, **kwargs) -> None:
+    """Drop a deleted member from the name index."""
+    pk = instance.pk
+    transaction.on_commit(lambda: NAME_INDEX.remove(pk), using=using)
+
+
+@receiver(post_save, sender=User, dispatch_uid="emerald-user-geo-engine-save")
+def update_geo_engine(sender, instance: User, using: str, update_fields=None, **kwargs) -> None:
+    """Publish location changes to the in-memory search engines (when enabled) once committed."""
+    if (engine := get_engine()) is None:
+        return
+    if (update_fields is not None and "current_location" not in update_fields) or not instance.location_changed:
+        return
+    point = (instance.current_location.x, instance.current_location.y) if instance.current_location else None
+    pk, username = instance.pk, instance.username
+    transaction.on_commit(lambda: engine.record(pk, username, point), using=using)
+
+
+@receiver(post_delete, sender=User, dispatch_uid="emerald-user-geo-engine-delete")
+def remove_geo_engine(sender, instance: User, using: str, **kwargs) -> None:
+    """Drop deleted members from the in-memory search engines (when enabled)."""
+    if (engine := get_engine()) is None:
+        return
+    pk, username = instance.pk, instance.username
+    transaction.on_commit(lambda: engine.record(pk, username, None), using=using)
+
+
+@receiver(m2m_changed, sender=User.groups.through, dispatch_uid="emerald-user-groups-changed")
+def reset_user_groups(sender, instance, action: str, reverse: bool, pk_set, using: str, **kwargs) -> None:
+    """Drop the cached group names of users whose memberships changed."""
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        instance.__dict__.pop("group_names", None)
+        user_ids = [instance.pk]
+    elif pk_set is None:  # A group's members were cleared
+        transaction.on_commit(forget_all_user_groups, using=using)
+        return
+    else:
+        user_ids = list(pk_set)
+    forget_user_groups(user_ids)
+    transaction.on_commit(lambda: forget_user_groups(user_ids), using=using)
+
+
+@receiver(post_save, sender=Group, dispatch_uid="emerald-group-save")
+@receiver(post_delete, sender=Group, dispatch_uid="emerald-group-delete")
+def reset_group_names(sender, instance: Group, using: str, created: bool = False, **kwargs) -> None:
+    """Invalidate every cached group snapshot when a group is renamed or deleted."""
+    if not created:
+        transaction.on_commit(forget_all_user_groups, using=using)
@@ -6,6 +6,8 @@ from django import template
 from django.conf import settings
 from django.utils.safestring import SafeString, SafeText, mark_safe
 
+from emerald_heart.utils.render import render_fragments
+
 LOG = logging.getLogger(__name__)
 
 register = template.Library()
@@ -67,3 +69,9 @@ def default_if_unset(value: object, arg: object) -> object:
     if not value or value is None or value == "" or value == invalid_string:
         return arg
     return value
+
+
+@register.filter(name="with_fragments")
+def with_fragments(items, template_name: str) -> list[tuple[object, SafeString]]:
+    """Pair each item with its cached HTML from a fragment template; see `render_fragments`."""
+    return render_fragments(template_name, items)
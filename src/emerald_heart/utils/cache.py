@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+import logging
+
+from django.core.cache import cache
+
+LOG = logging.getLogger(__name__)
+
+
+def get_version(key: str) -> int:
+    """
+    Return the shared version stamp stored under a cache key, creating it when missing.
+
+    Version stamps let every worker process notice that data they hold in memory was changed by another process.
+    """
+    if (version := cache.get(key)) is None:
+        cache.add(key, 1, timeout=None)
+        version = cache.get(key, 1)
+    return version
+
+
+def bump_version(key: str) -> int:
+    """Atomically increment the version stamp stored under a cache key and return the new value."""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Missing (never created or evicted); another process may create it first, either way increment it
+        cache.add(key, 1, timeout=None)
+        return cache.incr(key)
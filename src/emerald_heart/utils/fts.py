@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import logging
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+
+from emerald_heart.utils.query import normalize_query
+from emerald_heart.utils.rtree import table_available
+
+LOG = logging.getLogger(__name__)
+
+USER_TABLE = "emerald_heart_user"
+"""Table holding the indexed user rows."""
+
+USER_FTS = "emerald_heart_user_fts"
+"""FTS5 table indexing `User.name` and `User.bio`; it stores no text of its own (external content)."""
+
+USER_FTS_ROWID = "search_rowid"
+"""User column the index refers to rows by; unlike the implicit rowid a `VACUUM` never renumbers it."""
+
+USER_FTS_VOCAB = "emerald_heart_user_fts_vocab"
+"""fts5vocab table listing each indexed term with the number of users whose name or bio holds it."""
+
+USER_FTS_COLUMNS: tuple[str, ...] = ("name", "bio")
+"""User columns in the full-text index, in index order."""
+
+USER_FTS_WEIGHTS: tuple[float, ...] = (10.0, 1.0)
+"""BM25 weights of the indexed columns; a name match counts for far more than a bio match."""
+
+USER_FTS_TRIGGERS: tuple[str, ...] = tuple(f"{USER_FTS}_{name}" for name in ("insert", "delete", "update", "keep_key"))
+"""Triggers on the user table that keep the full-text index in sync with it."""
+
+
+def create_fts_table(cursor) -> None:
+    """
+    Create the full-text index over user names and bios along with the triggers that keep it in sync.
+
+    The index reads its text from the user table by `USER_FTS_ROWID` and the triggers live in the database, so every
+    write path (the ORM, fixtures, bulk updates or raw SQL) keeps it current.
+    """
+    columns = ", ".join(USER_FTS_COLUMNS)
+    cursor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {USER_FTS} USING fts5({columns}, content='{USER_TABLE}', "
+        f"content_rowid='{USER_FTS_ROWID}', tokenize='unicode61 remove_diacritics 2')"
+    )
+    create_vocab_table(cursor)
+    create_fts_triggers(cursor)
+
+
+def create_fts_triggers(cursor) -> None:
+    """
+    Create whichever of `USER_FTS_TRIGGERS` are missing.
+
+    Inserted users are given the next free key, and writes setting the key back to NULL (as saves of freshly created
+    instances do) keep the old one.
+    """
+    columns = ", ".join(USER_FTS_COLUMNS)
+    new = ", ".join(f"new.{column}" for column in USER_FTS_COLUMNS)
+    old = ", ".join(f"old.{column}" for column in USER_FTS_COLUMNS)
+    key = USER_FTS_ROWID
+    cursor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {USER_FTS}_insert AFTER INSERT ON {USER_TABLE} BEGIN "
+        f"UPDATE {USER_TABLE} SET {key} = (SELECT coalesce(max({key}), 0) + 1 FROM {USER_TABLE}) "
+        f"WHERE rowid = new.rowid AND new.{key} IS NULL; "
+        f"INSERT INTO {USER_FTS} (rowid, {columns}) SELECT {key}, {columns} FROM {USER_TABLE} WHERE rowid = new.rowid; "
+        "END"
+    )
+    cursor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {USER_FTS}_delete AFTER DELETE ON {USER_TABLE} BEGIN "
+        f"INSERT INTO {USER_FTS} ({USER_FTS}, rowid, {columns}) VALUES ('delete', old.{key}, {old}); END"
+    )
+    cursor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {USER_FTS}_update AFTER UPDATE OF {columns} ON {USER_TABLE} BEGIN "
+        f"INSERT INTO {USER_FTS} ({USER_FTS}, rowid, {columns}) VALUES ('delete', old.{key}, {old}); "
+        f"INSERT INTO {USER_FTS} (rowid, {columns}) VALUES (coalesce(new.{key}, old.{key}), {new}); END"
+    )
+    cursor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {USER_FTS}_keep_key AFTER UPDATE OF {key} ON {USER_TABLE} "
+        f"WHEN new.{key} IS NULL BEGIN UPDATE {USER_TABLE} SET {key} = old.{key} WHERE rowid = new.rowid; END"
+    )
+
+
+def create_vocab_table(cursor) -> None:
+    """Create the table exposing per-term document counts of the full-text index; it holds no data of its own."""
+    cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {USER_FTS_VOCAB} USING fts5vocab({USER_FTS}, 'row')")
+
+
+def drop_fts_table(cursor) -> None:
+    """Remove the full-text index and its triggers."""
+    for trigger in USER_FTS_TRIGGERS:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    cursor.execute(f"DROP TABLE IF EXISTS {USER_FTS_VOCAB}")
+    cursor.execute(f"DROP TABLE IF EXISTS {USER_FTS}")
+
+
+def rebuild(using: str = DEFAULT_DB_ALIAS) -> bool:
+    """
+    Rebuild the full-text index from the user table; returns False when the index doesn't exist.
+
+    The triggers keep the index current, so this is only needed after writes that bypassed them. Missing triggers are
+    recreated first so later writes don't bypass it again.
+    """
+    if not fts_available(using):
+        LOG.warning("Full-text table %s is not available; skipping rebuild", USER_FTS)
+        return False
+    with connections[using].cursor() as cursor:
+        create_fts_triggers(cursor)
+        cursor.execute(f"INSERT INTO {USER_FTS} ({USER_FTS}) VALUES ('rebuild')")
+    return True
+
+
+def missing_triggers(using: str = DEFAULT_DB_ALIAS) -> list[str]:
+    """Return the names of `USER_FTS_TRIGGERS` absent from the database; empty when the index doesn't exist."""
+    if not fts_available(using):
+        return []
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s", [USER_TABLE])
+        found = {name for (name,) in cursor.fetchall()}
+    return [trigger for trigger in USER_FTS_TRIGGERS if trigger not in found]
+
+
+def restore_triggers(using: str = DEFAULT_DB_ALIAS) -> list[str]:
+    """
+    Recreate triggers dropped with the user table and rebuild the index; returns the names of the recreated triggers.
+
+    SQLite migrations that alter the user table copy it into a new one, which silently drops its triggers; writes after
+    that would bypass the index, so it is rebuilt from the table once they are back.
+    """
+    if missing := missing_triggers(using):
+        LOG.warning("Recreating full-text triggers %s", ", ".join(missing))
+        rebuild(using)
+    return missing
+
+
+def fts_available(using: str = DEFAULT_DB_ALIAS) -> bool:
+    """Determine if the full-text index exists in the database."""
+    return table_available(USER_FTS, using)
+
+
+def count_prefix_documents(prefix: str, using: str = DEFAULT_DB_ALIAS) -> int | None:
+    """
+    Return how many users hold a term starting with a prefix; None when the vocabulary table doesn't exist.
+
+    Users holding several matching terms are counted once per term, so this is an upper bound on the matches.
+    """
+    if not table_available(USER_FTS_VOCAB, using):
+        return None
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"SELECT coalesce(sum(doc), 0) FROM {USER_FTS_VOCAB} WHERE term >= %s AND term < %s",
+            [prefix, f"{prefix}\U0010ffff"],
+        )
+        return cursor.fetchone()[0]
+
+
+def build_match(*, q_str: str, columns: tuple[str, ...] = USER_FTS_COLUMNS) -> str:
+    """
+    Return an FTS5 match expression for a search string.
+
+    Terms are split with `normalize_query` so quoted text stays a phrase. Every term (or phrase) must match and the last
+    word of each matches as a prefix, which keeps partially typed names matching as they did with `icontains`.
+    """
+    terms = []
+    for term in normalize_query(q_str):
+        # Terms made only of punctuation hold no tokens and would make the whole expression match nothing
+        if any(char.isalnum() for char in term):
+            escaped = term.replace('"', '""')
+            terms.append(f'"{escaped}"*')
+    if not terms:
+        raise ValueError("No match expression assembled")
+    return f"{{{' '.join(columns)}}} : ({' AND '.join(terms)})"
+
+
+def build_fts_qobj(*, q_str: str, field: str = "pk", columns: tuple[str, ...] = USER_FTS_COLUMNS) -> Q:
+    """Return a query restricting a user reference (the primary key by default) to users matching a search string."""
+    sql = (
+        f"SELECT {USER_TABLE}.id FROM {USER_FTS} JOIN {USER_TABLE} ON {USER_TABLE}.{USER_FTS_ROWID} = {USER_FTS}.rowid "
+        f"WHERE {USER_FTS} MATCH %s"
+    )
+    return Q(**{f"{field}__in": RawSQL(sql, [build_match(q_str=q_str, columns=columns)])})
+
+
+def build_fts_rank(*, q_str: str, column: str, columns: tuple[str, ...] = USER_FTS_COLUMNS) -> RawSQL:
+    """
+    Return the BM25 rank of the user referenced by a SQL column (lower is a better match) for ordering results.
+
+    The column is quoted SQL such as `"emerald_heart_request"."source_user_id"`; users that don't match rank as NULL.
+    """
+    weights = ", ".join(str(weight) for weight in USER_FTS_WEIGHTS)
+    sql = (
+        f"SELECT bm25({USER_FTS}, {weights}) FROM {USER_FTS} WHERE {USER_FTS} MATCH %s "
+        f"AND {USER_FTS}.rowid = (SELECT fts_user.{USER_FTS_ROWID} FROM {USER_TABLE} AS fts_user "
+        f"WHERE fts_user.id = {column})"
+    )
+    return RawSQL(sql, [build_match(q_str=q_str, columns=columns)])
+
+
+def build_fts_exists(*, q_str: str, column: str, columns: tuple[str, ...] = USER_FTS_COLUMNS) -> RawSQL:
+    """
+    Return a per-row test that the user referenced by a SQL column matches a search string.
+
+    Unlike `build_fts_qobj` the full match set is never built: the index is probed once for each row that reaches the
+    test, which suits rows already narrowed down by another index. The column may belong to the user table itself.
+    """
+    sql = (
+        f"EXISTS (SELECT 1 FROM {USER_FTS} WHERE {USER_FTS} MATCH %s "
+        f"AND {USER_FTS}.rowid = (SELECT fts_user.{USER_FTS_ROWID} FROM {USER_TABLE} AS fts_user "
+        f"WHERE fts_user.id = {column}))"
+    )
+    return RawSQL(sql, [build_match(q_str=q_str, columns=columns)], output_field=BooleanField())
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import logging
+from collections.abc import Iterable
+from uuid import UUID
+
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+
+from emerald_heart.utils.cache import bump_version, get_version
+
+LOG = logging.getLogger(__name__)
+
+CACHE_PREFIX = "user-groups"
+"""Prefix of the cache keys holding the group names of each user."""
+
+VERSION_KEY = "user-groups:version"
+"""Cache key of the version stamp bumped when any group is renamed or deleted, invalidating every cached snapshot."""
+
+
+def cache_key(user_id: UUID) -> str:
+    """Return the key of the group names for a user."""
+    return f"{CACHE_PREFIX}:{user_id.hex}"
+
+
+def version_key(user_id: UUID) -> str:
+    """Return the key of the version stamp bumped whenever a users memberships change."""
+    return f"{VERSION_KEY}:{user_id.hex}"
+
+
+def get_user_groups(user_id: UUID) -> tuple[str, ...]:
+    """
+    Return the names of the groups a user is in, from the shared cache when the snapshot is current.
+
+    Snapshots are stored with the global and per-user versions read before the groups were queried. A membership change
+    that lands between the query and the write bumps the users version, so the stale snapshot is never used.
+    """
+    keys = (VERSION_KEY, version_key(user_id), cache_key(user_id))
+    found = cache.get_many(keys)
+    versions = tuple(found[key] if key in found else get_version(key) for key in keys[:2])
+    if (cached := found.get(keys[2])) is not None and cached[0] == versions:
+        return cached[1]
+    names = tuple(Group.objects.filter(user=user_id).order_by("name").values_list("name", flat=True))
+    cache.set(keys[2], (versions, names), timeout=settings.USER_GROUPS_CACHE_TIMEOUT)
+    return names
+
+
+def forget_user_groups(user_ids: Iterable[UUID]) -> None:
+    """Invalidate the cached group names of some users; they are reloaded on next use."""
+    for pk in user_ids:
+        bump_version(version_key(pk))
+
+
+def forget_all_user_groups() -> None:
+    """Invalidate the cached group names of every user."""
+    bump_version(VERSION_KEY)
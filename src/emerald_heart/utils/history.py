@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import logging
+import sys
+import zlib
+from array import array
+from collections.abc import Iterable, Sequence
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+from emerald_heart.hints import HistoryPoint
+
+LOG = logging.getLogger(__name__)
+
+COORDINATE_SCALE = 1_000_000
+"""Coordinates are stored as integer microdegrees (about 11cm); a delta between any two points fits in an int32."""
+
+
+def _pack(values: array) -> bytes:
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values.tobytes()
+
+
+def _unpack(data: bytes) -> array:
+    values = array("i")
+    values.frombytes(data)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+def _deltas(values: Sequence[int]) -> list[int]:
+    return [value - previous for previous, value in zip((0, *values), values, strict=False)]
+
+
+def encode_points(started: datetime, points: Sequence[HistoryPoint]) -> bytes:
+    """
+    Encode points as three delta-encoded int32 arrays (seconds after `started`, longitude, latitude).
+
+    Consecutive pings are close in time and space so the deltas are small numbers which deflate well; the arrays are
+    stored one after the other, little-endian, and compressed together.
+    """
+    seconds = [round((point.when - started).total_seconds()) for point in points]
+    longitudes = [round(point.longitude * COORDINATE_SCALE) for point in points]
+    latitudes = [round(point.latitude * COORDINATE_SCALE) for point in points]
+    values = array("i", [*_deltas(seconds), *_deltas(longitudes), *_deltas(latitudes)])
+    return zlib.compress(_pack(values))
+
+
+def decode_points(started: datetime, data: bytes) -> list[HistoryPoint]:
+    """Decode points written by `encode_points`."""
+    values = _unpack(zlib.decompress(data))
+    count = len(values) // 3
+    seconds = accumulate(values[:count])
+    longitudes = accumulate(values[count : count * 2])
+    latitudes = accumulate(values[count * 2 :])
+    return [
+        HistoryPoint(started + timedelta(seconds=offset), lon / COORDINATE_SCALE, lat / COORDINATE_SCALE)
+        for offset, lon, lat in zip(seconds, longitudes, latitudes, strict=True)
+    ]
+
+
+def downsample(points: Iterable[HistoryPoint], resolution: int) -> list[HistoryPoint]:
+    """Keep the first point of every `resolution` seconds; points must be in time order."""
+    kept: list[HistoryPoint] = []
+    bucket = None
+    for point in points:
+        if (current := int(point.when.timestamp()) // resolution) != bucket:
+            kept.append(point)
+            bucket = current
+    return kept
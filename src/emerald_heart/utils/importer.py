@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import csv
+import json
+import logging
+import math
+import re
+from collections.abc import Iterable, Iterator
+from functools import partial
+from itertools import islice
+from pathlib import Path
+from typing import TextIO
+
+from emerald_heart.hints import Coordinate
+
+LOG = logging.getLogger(__name__)
+
+FORMATS: tuple[str, ...] = ("csv", "geojson", "ndjson")
+"""Input formats understood by `read_records`."""
+
+CHUNK_SIZE = 1 << 16
+"""Characters read at a time when streaming GeoJSON."""
+
+FEATURES_RE = re.compile(r'"features"\s*:\s*\[')
+
+
+class RecordError(ValueError):
+    """An input record that can't be imported."""
+
+
+def guess_format(path: str | Path) -> str:
+    """Return the input format implied by a file extension."""
+    suffix = Path(path).suffix.lower().lstrip(".")
+    if suffix in ("json", "geojson"):
+        return "geojson"
+    if suffix in ("jsonl", "ndjson"):
+        return "ndjson"
+    return "csv"
+
+
+def _flatten_feature(feature: dict) -> dict:
+    """Merge a GeoJSON feature's properties with the coordinates of its point geometry."""
+    if feature.get("type") != "Feature":
+        return feature  # Already a flat record
+    record = dict(feature.get("properties") or {})
+    if (geometry := feature.get("geometry")) is not None:
+        record["geometry"] = geometry.get("type")
+        if geometry.get("type") == "Point":
+            record["longitude"], record["latitude"] = geometry["coordinates"][:2]
+    if "id" in feature and "id" not in record:
+        record["id"] = feature["id"]
+    return record
+
+
+def read_csv(stream: TextIO) -> Iterator[dict]:
+    """Yield CSV rows as dicts keyed by the header row; empty cells are dropped."""
+    for row in csv.DictReader(stream):
+        yield {key: value for key, value in row.items() if value not in ("", None)}
+
+
+def read_ndjson(stream: TextIO) -> Iterator[dict]:
+    """Yield one record per non-blank line; lines may be flat objects or GeoJSON features."""
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield _flatten_feature(json.loads(line))
+        except json.JSONDecodeError as exc:
+            raise RecordError(f"line {number}: {exc}") from None
+
+
+def read_geojson(stream: TextIO) -> Iterator[dict]:
+    """
+    Yield the features of a GeoJSON FeatureCollection one at a time.
+
+    Only the current feature and one read chunk are held in memory, so collections larger than memory can be imported.
+    The first "features" key in the document must be the collection's.
+    """
+    decoder = json.JSONDecoder()
+    chunks = iter(partial(stream.read, CHUNK_SIZE), "")
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        if (match := FEATURES_RE.search(buffer)) is not None:
+            buffer = buffer[match.end() :]
+            break
+    else:
+        raise RecordError("no features array found")
+
+    while True:
+        buffer = buffer.lstrip().removeprefix(",").lstrip()
+        if buffer.startswith("]"):
+            return
+        try:
+            feature, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if (chunk := next(chunks, "")) == "":
+                raise RecordError("unexpected end of the features array") from None
+            buffer += chunk
+            continue
+        yield _flatten_feature(feature)
+        buffer = buffer[end:]
+
+
+def read_records(stream: TextIO, format: str) -> Iterator[dict]:
+    """Stream the records of an input file in one of `FORMATS`."""
+    readers = {"csv": read_csv, "geojson": read_geojson, "ndjson": read_ndjson}
+    return readers[format](stream)
+
+
+def parse_point(record: dict) -> Coordinate | None:
+    """Return the validated (longitude, latitude) of a record; None when it has no location."""
+    if record.get("geometry") not in (None, "Point"):
+        raise RecordError(f"unsupported geometry {record['geometry']}")
+    longitude, latitude = record.get("longitude"), record.get("latitude")
+    if longitude is None and latitude is None:
+        return None
+    try:
+        point = Coordinate(float(longitude), float(latitude))  # type: ignore[arg-type]
+    except TypeError, ValueError:
+        raise RecordError(f"invalid coordinates ({longitude}, {latitude})") from None
+    if not (math.isfinite(point.longitude) and math.isfinite(point.latitude)):
+        raise RecordError(f"invalid coordinates ({longitude}, {latitude})")
+    if not (-180 <= point.longitude <= 180 and -90 <= point.latitude <= 90):
+        raise RecordError(f"coordinates out of range ({longitude}, {latitude})")
+    return point
+
+
+def batched(records: Iterable, size: int) -> Iterator[list]:
+    """Yield lists of up to `size` items."""
+    iterator = iter(records)
+    while batch := list(islice(iterator, size)):
+        yield batch
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from uuid import UUID
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+
+from emerald_heart.hints import HistoryPoint
+from emerald_heart.models import LocationHistoryBlock, User
+from emerald_heart.utils.history import downsample, encode_points
+
+LOG = logging.getLogger(__name__)
+
+
+def _new_block(user_id: UUID, points: list[HistoryPoint], resolution: int = 0) -> LocationHistoryBlock:
+    started = points[0].when.replace(microsecond=0)
+    return LocationHistoryBlock(
+        user_id=user_id,
+        started=started,
+        ended=points[-1].when,
+        count=len(points),
+        resolution=resolution,
+        data=encode_points(started, points),
+    )
+
+
+def _chunk(points: list[HistoryPoint], span: timedelta | None = None) -> list[list[HistoryPoint]]:
+    """Split time ordered points into blocks of at most `MEMBER_LOCATION_HISTORY_BLOCK_SIZE` points spanning `span`."""
+    size = settings.MEMBER_LOCATION_HISTORY_BLOCK_SIZE
+    chunks: list[list[HistoryPoint]] = []
+    for point in points:
+        if not chunks or len(chunks[-1]) >= size or (span is not None and point.when - chunks[-1][0].when >= span):
+            chunks.append([])
+        chunks[-1].append(point)
+    return chunks
+
+
+def append_history(
+    points: dict[UUID, tuple[float, float]], when: datetime | None = None, using: str = DEFAULT_DB_ALIAS
+) -> int:
+    """
+    Append a point to the location history of each member; returns the number of blocks written.
+
+    Each point is written as a block of its own without reading or rewriting earlier blocks, so a ping costs one small
+    insert however much history the member has. `compact_history` later merges these into full blocks.
+    """
+    if not points:
+        return 0
+    when = when or timezone.now()
+    blocks = [_new_block(user_id, [HistoryPoint(when, lon, lat)]) for user_id, (lon, lat) in points.items()]
+    LocationHistoryBlock.objects.using(using).bulk_create(blocks, batch_size=500)
+    return len(blocks)
+
+
+def get_history(
+    user: User, start: datetime, end: datetime, resolution: int = 0, using: str = DEFAULT_DB_ALIAS
+) -> list[HistoryPoint]:
+    """Return the points of a member's history between two times in time order, optionally downsampled."""
+    blocks = LocationHistoryBlock.objects.using(using).filter(user=user, started__lte=end, ended__gte=start)
+    points = sorted(
+        (point for block in blocks for point in block.points if start <= point.when <= end), key=lambda p: p.when
+    )
+    return downsample(points, resolution) if resolution else points
+
+
+def merge_history(using: str = DEFAULT_DB_ALIAS) -> int:
+    """
+    Merge each member's partly filled raw blocks into full ones; returns the number of blocks replaced.
+
+    Blocks hold up to `MEMBER_LOCATION_HISTORY_BLOCK_SIZE` points spanning at most `MEMBER_LOCATION_HISTORY_BLOCK_SPAN`
+    seconds. Only blocks with room left are read, so each point is rewritten a bounded number of times.
+    """
+    partial = LocationHistoryBlock.objects.using(using).filter(
+        resolution=0, count__lt=settings.MEMBER_LOCATION_HISTORY_BLOCK_SIZE
+    )
+    by_user: dict[UUID, list[int]] = defaultdict(list)
+    for user_id, pk in partial.values_list("user_id", "id"):
+        by_user[user_id].append(pk)
+
+    span = timedelta(seconds=settings.MEMBER_LOCATION_HISTORY_BLOCK_SPAN)
+    merged = 0
+    for user_id, pks in by_user.items():
+        if len(pks) < 2:
+            continue
+        with transaction.atomic(using=using):
+            blocks = LocationHistoryBlock.objects.using(using).filter(id__in=pks)
+            points = sorted((point for block in blocks for point in block.points), key=lambda p: p.when)
+            blocks.delete()
+            LocationHistoryBlock.objects.using(using).bulk_create(
+                _new_block(user_id, chunk) for chunk in _chunk(points, span)
+            )
+        merged += len(pks)
+    return merged
+
+
+def compact_history(now: datetime | None = None, using: str = DEFAULT_DB_ALIAS) -> tuple[int, int, int]:
+    """
+    Apply the retention policy; returns the number of (merged, downsampled, deleted) blocks.
+
+    Blocks older than `MEMBER_LOCATION_HISTORY_RETENTION_DAYS` are deleted and the pings appended since the last run
+    are merged into full blocks. Raw blocks older than `MEMBER_LOCATION_HISTORY_RAW_DAYS` are then replaced, one member
+    at a time, by blocks keeping a point every `MEMBER_LOCATION_HISTORY_RESOLUTION` seconds.
+    """
+    now = now or timezone.now()
+    expired = now - timedelta(days=settings.MEMBER_LOCATION_HISTORY_RETENTION_DAYS)
+    deleted, _ = LocationHistoryBlock.objects.using(using).filter(ended__lt=expired).delete()
+    merged = merge_history(using=using)
+
+    resolution = settings.MEMBER_LOCATION_HISTORY_RESOLUTION
+    aged = LocationHistoryBlock.objects.using(using).filter(
+        resolution=0, ended__lt=now - timedelta(days=settings.MEMBER_LOCATION_HISTORY_RAW_DAYS)
+    )
+    by_user: dict[UUID, list[int]] = defaultdict(list)
+    for user_id, pk in aged.values_list("user_id", "id"):
+        by_user[user_id].append(pk)
+
+    downsampled = 0
+    for user_id, pks in by_user.items():
+        with transaction.atomic(using=using):
+            blocks = LocationHistoryBlock.objects.using(using).filter(id__in=pks)
+            points = sorted((point for block in blocks for point in block.points), key=lambda p: p.when)
+            blocks.delete()
+            LocationHistoryBlock.objects.using(using).bulk_create(
+                _new_block(user_id, chunk, resolution) for chunk in _chunk(downsample(points, resolution))
+            )
+        downsampled += len(pks)
+    LOG.debug("Merged %s, downsampled %s and deleted %s location history blocks", merged, downsampled, deleted)
+    return merged, downsampled, deleted
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import logging
+from datetime import datetime
+
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+
+from emerald_heart.hints import LocationCheck
+from emerald_heart.utils.spatial import haversine
+
+LOG = logging.getLogger(__name__)
+
+SESSION_KEY = "location-check"
+"""Session key holding the members `LocationCheck`."""
+
+
+def get_check(session) -> LocationCheck | None:
+    """Return the location check stored in a session, if any."""
+    check = session.get(SESSION_KEY)
+    if not isinstance(check, dict) or "checked" not in check or "interval" not in check:
+        return None
+    return check
+
+
+def is_due(check: LocationCheck | None, now: datetime) -> bool:
+    """Determine if a member's location should be requested again."""
+    if check is None or (checked := parse_datetime(check["checked"])) is None:
+        return True
+    return (now - checked).total_seconds() >= check["interval"]
+
+
+def has_moved(previous, point) -> bool:
+    """Determine if a ping is far enough from the stored location to be worth writing."""
+    if previous is None:
+        return True
+    return haversine(previous.x, previous.y, point.x, point.y) >= settings.MEMBER_LOCATION_MIN_MOVEMENT
+
+
+def next_check(check: LocationCheck | None, moved: bool, now: datetime) -> LocationCheck:
+    """
+    Return the location check after a ping.
+
+    Movement resets the wait to `MEMBER_LOCATION_MIN_INTERVAL`; every ping that finds the member where they were doubles
+    it, up to `MEMBER_LOCATION_MAX_INTERVAL`.
+    """
+    interval = float(settings.MEMBER_LOCATION_MIN_INTERVAL)
+    if check is not None and not moved:
+        interval = min(max(check["interval"], interval) * 2, float(settings.MEMBER_LOCATION_MAX_INTERVAL))
+    return {"checked": now.isoformat(), "interval": interval}
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import logging
+from collections.abc import Mapping
+from functools import cache
+from types import MappingProxyType
+from typing import Any, NamedTuple
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+LOG = logging.getLogger(__name__)
+
+STAFF_GROUPS = frozenset(("admin", "developer"))
+"""Groups that see every tab and action."""
+
+COMMON_GROUP_SETS: tuple[frozenset[str], ...] = (frozenset(("anonymous",)), frozenset(("member",)))
+"""Group sets nearly every request has; their navigation is built at startup."""
+
+
+class Navigation(NamedTuple):
+    """The tabs and actions visible to one set of groups."""
+
+    tabs: tuple[Mapping[str, Any], ...]
+    tab_ids: tuple[str, ...]
+    actions: Mapping[str, tuple[Mapping[str, Any], ...]]
+    """Visible actions keyed by tab id."""
+
+
+def freeze(value: Any) -> Any:
+    """Return a read-only copy of nested dicts and lists so cached navigation can be shared between requests."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list | tuple):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def is_visible(visible: list[str], groups: frozenset[str]) -> bool:
+    """Determine if an item limited to `visible` groups (everyone when empty) is shown to a set of groups."""
+    return not visible or bool(groups & (STAFF_GROUPS | set(visible)))
+
+
+@cache
+def get_navigation(groups: frozenset[str]) -> Navigation:
+    """
+    Return the navigation for a set of groups, built once per distinct set.
+
+    Tabs are listed in reverse `SITE_DATA` order (templates reverse them again) and only their visible actions are
+    kept. The result is shared by every request with the same groups so it is read-only.
+    """
+    tabs = []
+    for tab in settings.SITE_DATA[::-1]:
+        if is_visible(tab["visible"], groups):
+            actions = [action for action in tab["actions"] if is_visible(action["visible"], groups)]
+            tabs.append(freeze({**tab, "actions": actions}))
+    LOG.debug("Built navigation for groups %s", ", ".join(sorted(groups)))
+    return Navigation(
+        tabs=tuple(tabs),
+        tab_ids=tuple(tab["id"] for tab in tabs),
+        actions=MappingProxyType({tab["id"]: tab["actions"] for tab in tabs}),
+    )
+
+
+def warm_navigation() -> None:
+    """Build the navigation of `COMMON_GROUP_SETS` ahead of the first request."""
+    for groups in COMMON_GROUP_SETS:
+        get_navigation(groups)
+
+
+@receiver(setting_changed, dispatch_uid="emerald-navigation-setting")
+def reset_navigation(setting: str, **kwargs) -> None:
+    """Drop cached navigation when `SITE_DATA` is overridden (in tests)."""
+    if setting == "SITE_DATA":
+        get_navigation.cache_clear()
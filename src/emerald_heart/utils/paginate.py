@@ -3,10 +3,13 @@ from __future__ import annotations
 import logging
 
 from django.conf import settings
+from django.core import signing
 from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
 from django.db.models import QuerySet
 
 LOG = logging.getLogger(__name__)
+CURSOR_SALT = "emerald-heart.cursor"
+"""Salt used when signing keyset pagination cursors."""
 
 
 class CustomPaginate(Paginator):
@@ -63,3 +66,23 @@ def paginate(*, queryset: QuerySet, request, **kwargs) -> CustomPaginate | Query
     item_list.prev_pages = sorted(prev_pages)  # type: ignore
 
     return item_list
+
+
+def encode_cursor(*values: object) -> str:
+    """
+    Return an opaque cursor for keyset pagination.
+
+    The cursor holds the sort key of the last item on a page; it is signed so clients can't forge positions.
+    """
+    return signing.dumps(values, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(cursor: str) -> tuple[object, ...]:
+    """Return the values held by a cursor; raises ValueError when the cursor is malformed or tampered with."""
+    try:
+        values = signing.loads(cursor, salt=CURSOR_SALT)
+    except signing.BadSignature as bs:
+        raise ValueError(f"Invalid cursor: {cursor}") from bs
+    if not isinstance(values, list):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return tuple(values)
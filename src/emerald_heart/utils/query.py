@@ -1,14 +1,31 @@
 from __future__ import annotations
 
 import logging
+import math
 import re
 
-from django.db.models import Q
+from django.db.models import ExpressionWrapper, F, FloatField, Func, Q, Value
+from django.db.models.functions import Least
+from django.db.models.lookups import LessThanOrEqual
+
+from emerald_heart.utils.spatial import (
+    EARTH_RADIUS,
+    bounding_box,
+    chord_length,
+    geohash_cover,
+    geohash_range,
+    haversine,
+    split_antimeridian,
+    to_ecef,
+)
 
 LOG = logging.getLogger(__name__)
 FIND_TERMS = re.compile(r'"([^"]+)"|(\S+)').findall
 NORMALIZE_SPACING = re.compile(r"\s{2,}").sub
 
+HAVERSINE_FUNCTION = "emerald_haversine"
+"""Name of the SQL function computing great-circle distances in meters."""
+
 
 def normalize_query(q_str: str) -> list:
     """
@@ -48,3 +65,80 @@ def build_search_qobj(*, q_str: str, fields: tuple[str, ...], op: str = "icontai
     if q_obj is None:
         raise ValueError("No Q object built")
     return q_obj
+
+
+def build_geohash_qobj(*, field: str, longitude: float, latitude: float, distance: float) -> Q:
+    """
+    Return a query restricting a geohash column to the cells covering a search radius (in meters).
+
+    Each covering cell becomes an indexed range comparison rather than a `LIKE` so SQLite can walk the index. When the
+    area is too large to cover with a handful of cells an empty Q object is returned (matching everything).
+    """
+    q_obj = Q()
+    for prefix in geohash_cover(longitude, latitude, distance):
+        start, end = geohash_range(prefix)
+        q_obj |= Q(**{f"{field}__gte": start, f"{field}__lt": end})
+    return q_obj
+
+
+def sql_haversine(lon1: float | None, lat1: float | None, lon2: float | None, lat2: float | None) -> float | None:
+    """Haversine as a SQL function; NULL inputs give NULL like any other SQL function."""
+    if lon1 is None or lat1 is None or lon2 is None or lat2 is None:
+        return None
+    return haversine(lon1, lat1, lon2, lat2)
+
+
+def register_sql_functions(dbapi_connection) -> None:
+    """Register the search SQL functions with a sqlite3 connection."""
+    dbapi_connection.create_function(HAVERSINE_FUNCTION, 4, sql_haversine, deterministic=True)
+
+
+class Haversine(Func):
+    """Great-circle distance in meters between a pair of longitude/latitude columns and a fixed point."""
+
+    function = HAVERSINE_FUNCTION
+    output_field = FloatField()
+
+    def __init__(self, longitude_field: str, latitude_field: str, longitude: float, latitude: float, **extra) -> None:
+        super().__init__(
+            F(longitude_field), F(latitude_field), Value(float(longitude)), Value(float(latitude)), **extra
+        )
+
+
+def build_distance_expression(*, longitude_field: str, latitude_field: str, origins) -> Func:
+    """Return the distance in meters from a pair of coordinate columns to the closest of several points."""
+    distances = [Haversine(longitude_field, latitude_field, origin.x, origin.y) for origin in origins]
+    if len(distances) == 1:
+        return distances[0]
+    return Least(*distances)
+
+
+def build_bbox_qobj(
+    *, longitude_field: str, latitude_field: str, longitude: float, latitude: float, distance: float
+) -> Q:
+    """Return a query restricting coordinate columns to the bounding box of a search radius (in meters)."""
+    min_lon, min_lat, max_lon, max_lat = bounding_box(longitude, latitude, distance)
+    lon_q = Q()
+    for span_min, span_max in split_antimeridian(min_lon, max_lon):
+        lon_q |= Q(**{f"{longitude_field}__gte": span_min, f"{longitude_field}__lte": span_max})
+    return Q(**{f"{latitude_field}__gte": min_lat, f"{latitude_field}__lte": max_lat}) & lon_q
+
+
+def build_chord_qobj(*, ecef_fields: tuple[str, str, str], origins, distance: float) -> Q:
+    """
+    Return a query restricting ECEF columns to points within distance (in meters) of any origin.
+
+    The test compares squared straight-line distances through the earth, so it is exact for the mean sphere and needs no
+    trigonometry per row. Rows with NULL columns never match.
+    """
+    if distance >= math.pi * EARTH_RADIUS:
+        return Q(**{f"{ecef_fields[0]}__isnull": False})  # Every point on the globe; skip the rounding at the antipode
+    limit = chord_length(distance) ** 2
+    q_obj = Q()
+    for origin in origins:
+        squares = None
+        for field, value in zip(ecef_fields, to_ecef(origin.x, origin.y), strict=True):
+            delta = F(field) - Value(value)
+            squares = delta * delta if squares is None else squares + delta * delta
+        q_obj |= Q(LessThanOrEqual(ExpressionWrapper(squares, output_field=FloatField()), limit))
+    return q_obj
@@ -1,10 +1,42 @@
 from __future__ import annotations
 
+import hashlib
 import logging
+from collections.abc import Callable, Iterable
+from functools import cache
+from typing import Any
 
+from django.conf import settings
+from django.core.cache import cache as shared_cache
 from django.http.response import HttpResponseRedirectBase
+from django.template.loader import get_template
+from django.utils.safestring import SafeString, mark_safe
 
 LOG = logging.getLogger(__name__)
+UNSET = object()
+
+FRAGMENT_PREFIX = "fragment"
+"""Prefix of the cache keys holding rendered HTML fragments."""
+
+
+class LazyValue:
+    """
+    A template context value computed the first time the template reads it.
+
+    Templates call the callables they resolve, so the value is only produced when a template uses it and is then kept
+    for later reads during the same render.
+    """
+
+    __slots__ = ("func", "value")
+
+    def __init__(self, func: Callable[[], Any]) -> None:
+        self.func = func
+        self.value: Any = UNSET
+
+    def __call__(self) -> Any:
+        if self.value is UNSET:
+            self.value = self.func()
+        return self.value
 
 
 class HttpResponseHXRedirect(HttpResponseRedirectBase):
@@ -16,3 +48,40 @@ class HttpResponseHXRedirect(HttpResponseRedirectBase):
         super().__init__(*args, **kwargs)
         self["HX-Redirect"] = self["Location"]
         del self["Location"]
+
+
+@cache
+def template_digest(template_name: str) -> str:
+    """Return a short digest of a template's source so cached fragments are dropped when the template changes."""
+    source = get_template(template_name).template.source  # type: ignore[attr-defined]
+    return hashlib.sha256(source.encode()).hexdigest()[:12]
+
+
+def fragment_cache_key(template_name: str, key: Iterable[object]) -> str:
+    """Return the cache key of the HTML a template rendered for an object."""
+    return ":".join((FRAGMENT_PREFIX, template_name, template_digest(template_name), *map(str, key)))
+
+
+def render_fragments(template_name: str, items: Iterable[Any]) -> list[tuple[Any, SafeString]]:
+    """
+    Pair each item with the HTML of a template rendered for it (as `item`), reusing cached HTML.
+
+    Items provide `fragment_key`, which must change whenever anything the template shows changes (usually the object id
+    and version). Every key is fetched in one cache read and only the misses are rendered, so a list is mostly a
+    concatenation of cached HTML. Templates must only show the item; anything per viewer belongs outside them.
+    """
+    items = list(items)
+    keys = [fragment_cache_key(template_name, item.fragment_key) for item in items]
+    cached = shared_cache.get_many(keys)
+    rendered: dict[str, str] = {}
+    template = None
+    pairs = []
+    for key, item in zip(keys, items, strict=True):
+        if (html := cached.get(key)) is None:
+            template = template or get_template(template_name)
+            html = rendered[key] = template.render({"item": item})
+        pairs.append((item, mark_safe(html)))
+    if rendered:
+        shared_cache.set_many(rendered, timeout=settings.FRAGMENT_CACHE_TIMEOUT)
+    LOG.debug("Rendered %s of %s %s fragments", len(rendered), len(items), template_name)
+    return pairs
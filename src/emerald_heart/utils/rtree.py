@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import logging
+from collections.abc import Iterable
+from uuid import UUID
+
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from emerald_heart.utils.spatial import bounding_box, split_antimeridian
+
+LOG = logging.getLogger(__name__)
+
+USER_RTREE = "emerald_heart_user_rtree"
+"""R*Tree table mirroring `User.current_location`."""
+
+LOCATION_RTREE = "emerald_heart_location_rtree"
+"""R*Tree table mirroring `Location.location`."""
+
+RTREE_TABLES: tuple[str, ...] = (USER_RTREE, LOCATION_RTREE)
+
+_available: set[tuple[str, str]] = set()
+"""(database alias, table) pairs known to exist; negative results are not stored so new tables are picked up."""
+
+
+def create_rtree_table(cursor, table: str) -> None:
+    """
+    Create an R*Tree table for point data.
+
+    R*Tree ids must be integers so the row's UUID primary key (as stored by Django; 32 hex characters) is kept in an
+    auxiliary column alongside an integer key derived from it.
+    """
+    cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING rtree(id, min_x, max_x, min_y, max_y, +uuid)")
+
+
+def rtree_key(pk: UUID) -> int:
+    """Return the integer R*Tree key for a UUID primary key (the top 63 bits)."""
+    return pk.int >> 65
+
+
+def rtree_available(table: str, using: str = DEFAULT_DB_ALIAS) -> bool:
+    """Determine if the given R*Tree table exists in the database."""
+    return table_available(table, using)
+
+
+def table_available(table: str, using: str = DEFAULT_DB_ALIAS) -> bool:
+    """Determine if the given (usually virtual) SQLite table exists in the database."""
+    if (using, table) in _available:
+        return True
+
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        return False
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [table])
+            found = cursor.fetchone() is not None
+    except OperationalError:
+        LOG.exception("Unable to check for table %s", table)
+        return False
+
+    if found:
+        _available.add((using, table))
+    return found
+
+
+def upsert_point(table: str, pk: UUID, x: float, y: float, using: str = DEFAULT_DB_ALIAS) -> None:
+    """Insert or move the entry for a primary key."""
+    if not rtree_available(table, using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"INSERT OR REPLACE INTO {table} (id, min_x, max_x, min_y, max_y, uuid) VALUES (%s, %s, %s, %s, %s, %s)",
+            [rtree_key(pk), x, x, y, y, pk.hex],
+        )
+
+
+def delete_point(table: str, pk: UUID, using: str = DEFAULT_DB_ALIAS) -> None:
+    """Remove the entry for a primary key."""
+    if not rtree_available(table, using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table} WHERE id = %s", [rtree_key(pk)])
+
+
+def upsert_points(
+    table: str, points: Iterable[tuple[UUID, float, float]], using: str = DEFAULT_DB_ALIAS, batch_size: int = 1000
+) -> int:
+    """Insert or move the entries for many (pk, x, y) points; returns the number written."""
+    if not rtree_available(table, using):
+        return 0
+
+    sql = f"INSERT OR REPLACE INTO {table} (id, min_x, max_x, min_y, max_y, uuid) VALUES (%s, %s, %s, %s, %s, %s)"
+    count = 0
+    batch: list[tuple[int, float, float, float, float, str]] = []
+    with connections[using].cursor() as cursor:
+        for pk, x, y in points:
+            batch.append((rtree_key(pk), x, x, y, y, pk.hex))
+            if len(batch) >= batch_size:
+                cursor.executemany(sql, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(sql, batch)
+            count += len(batch)
+    return count
+
+
+def rebuild(
+    table: str, points: Iterable[tuple[UUID, float, float]], using: str = DEFAULT_DB_ALIAS, batch_size: int = 1000
+) -> int:
+    """Replace the contents of an R*Tree table with the given (pk, x, y) points; returns the number written."""
+    if not rtree_available(table, using):
+        LOG.warning("R*Tree table %s is not available; skipping rebuild", table)
+        return 0
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table}")
+    return upsert_points(table, points, using=using, batch_size=batch_size)
+
+
+def build_rtree_qobj(*, table: str, field: str, longitude: float, latitude: float, distance: float) -> Q:
+    """Return a query restricting a UUID field to entries inside the bounding box of a search radius (in meters)."""
+    return build_rtree_box_qobj(table=table, field=field, box=bounding_box(longitude, latitude, distance))
+
+
+def build_rtree_box_qobj(*, table: str, field: str, box: tuple[float, float, float, float]) -> Q:
+    """
+    Return a query restricting a UUID field to entries inside a (min_lon, min_lat, max_lon, max_lat) box.
+
+    Boxes that cross the antimeridian are split in two so the R*Tree can answer both halves.
+    """
+    min_lon, min_lat, max_lon, max_lat = box
+
+    # Each box is its own SELECT; the R*Tree module can't use its index for OR-ed constraints
+    selects = []
+    params: list[float] = []
+    for box_min_lon, box_max_lon in split_antimeridian(min_lon, max_lon):
+        selects.append(f"SELECT uuid FROM {table} WHERE max_x >= %s AND min_x <= %s AND max_y >= %s AND min_y <= %s")
+        params.extend((box_min_lon, box_max_lon, min_lat, max_lat))
+    return Q(**{f"{field}__in": RawSQL(" UNION ALL ".join(selects), params)})
@@ -5,9 +5,217 @@ import math
 
 LOG = logging.getLogger(__name__)
 
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+"""Base32 alphabet used by geohashes; it is in ascending ASCII order so prefixes sort as ranges."""
+
+GEOHASH_PRECISION = 9
+"""Number of characters stored in geohash columns (cells of roughly 5m x 5m)."""
+
+GEOHASH_RANGE_END = "~"
+"""A character that sorts after every character in the geohash alphabet."""
+
+MAX_COVER_CELLS = 16
+"""Upper bound on the number of geohash cells used to cover a search area."""
+
+EARTH_RADIUS = 6_371_008.8
+"""Mean radius of the earth in meters."""
+
+METERS_PER_DEGREE = 110_574.0
+"""Shortest length of one degree of latitude (at the equator); using it keeps bounding boxes conservative."""
+
+MERCATOR_RADIUS = 6_378_137.0
+"""Radius of the sphere used by Web-Mercator (EPSG:3857) projections."""
+
+WGS84_SRID = 4326
+"""SRID of longitude/latitude degrees; every stored point uses it."""
+
+MERCATOR_SRID = 3857
+"""SRID of Web-Mercator meters, the projection map widgets and older rows use."""
+
 
 def distance_to_degrees(distance: float, latitude: float):
     """Convert distance (in meters) to degrees."""
     lat_radians = latitude * (math.pi / 180)
     # 1 longitudinal degree at the equator equal 111,319.5m equiv to 111.32km
     return distance / (111_319.5 * math.cos(lat_radians))
+
+
+def haversine(lon1: float, lat1: float, lon2: float, lat2: float) -> float:
+    """Return the great-circle distance in meters between two longitude/latitude points."""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+
+
+def to_ecef(longitude: float, latitude: float) -> tuple[float, float, float]:
+    """Return the earth-centred (x, y, z) position in meters of a longitude/latitude point on the mean sphere."""
+    lon = math.radians(longitude)
+    lat = math.radians(latitude)
+    radius = EARTH_RADIUS * math.cos(lat)
+    return (radius * math.cos(lon), radius * math.sin(lon), EARTH_RADIUS * math.sin(lat))
+
+
+def chord_length(distance: float) -> float:
+    """
+    Return the straight-line length through the earth of a great-circle arc (both in meters).
+
+    Chord length grows with arc length, so comparing squared ECEF deltas against a squared chord is an exact radius
+    test that needs only arithmetic.
+    """
+    if distance >= math.pi * EARTH_RADIUS:
+        return 2 * EARTH_RADIUS
+    return 2 * EARTH_RADIUS * math.sin(distance / (2 * EARTH_RADIUS))
+
+
+def mercator_to_degrees(x: float, y: float) -> tuple[float, float]:
+    """Convert Web-Mercator (EPSG:3857) meters to (longitude, latitude) degrees."""
+    return (math.degrees(x / MERCATOR_RADIUS), math.degrees(2 * math.atan(math.exp(y / MERCATOR_RADIUS)) - math.pi / 2))
+
+
+def degrees_to_mercator(longitude: float, latitude: float) -> tuple[float, float]:
+    """Convert (longitude, latitude) degrees to Web-Mercator (EPSG:3857) meters."""
+    return (
+        MERCATOR_RADIUS * math.radians(longitude),
+        MERCATOR_RADIUS * math.log(math.tan(math.pi / 4 + math.radians(latitude) / 2)),
+    )
+
+
+def as_wgs84(point):
+    """
+    Return a GEOS point in WGS84 degrees; points in another SRID are reprojected into a copy.
+
+    Geohashes, R*Tree entries and distances are all computed from degrees, so points must pass through here before
+    their coordinates are used. Web-Mercator is converted without GDAL.
+    """
+    if point is None or point.srid in (None, WGS84_SRID):
+        return point
+    if point.srid == MERCATOR_SRID:
+        point = point.clone()
+        point.x, point.y = mercator_to_degrees(point.x, point.y)
+        point.srid = WGS84_SRID
+        return point
+    return point.transform(WGS84_SRID, clone=True)
+
+
+def normalize_longitude(longitude: float) -> float:
+    """Wrap a longitude value into the -180 to 180 range."""
+    if -180.0 <= longitude <= 180.0:
+        return longitude
+    return ((longitude + 180.0) % 360.0) - 180.0
+
+
+def bounding_box(longitude: float, latitude: float, distance: float) -> tuple[float, float, float, float]:
+    """
+    Return a (min_lon, min_lat, max_lon, max_lat) box containing every point within distance (in meters).
+
+    The longitude span is computed at the latitude furthest from the equator so the box never under-selects. Longitude
+    values are not wrapped; a box crossing the antimeridian will have values outside of the -180 to 180 range.
+    """
+    lat_delta = distance / METERS_PER_DEGREE
+    min_lat = max(latitude - lat_delta, -90.0)
+    max_lat = min(latitude + lat_delta, 90.0)
+    widest = max(abs(min_lat), abs(max_lat))
+    if widest >= 89.9:
+        return (-180.0, min_lat, 180.0, max_lat)  # The area touches a pole; every longitude is in range
+
+    lon_delta = distance / (METERS_PER_DEGREE * math.cos(math.radians(widest)))
+    if lon_delta >= 180.0:
+        return (-180.0, min_lat, 180.0, max_lat)
+    return (longitude - lon_delta, min_lat, longitude + lon_delta, max_lat)
+
+
+def split_antimeridian(min_lon: float, max_lon: float) -> list[tuple[float, float]]:
+    """Split a longitude span that may extend past -180 or 180 into spans inside the -180 to 180 range."""
+    spans = [(max(min_lon, -180.0), min(max_lon, 180.0))]
+    if min_lon < -180.0:
+        spans.append((min_lon + 360.0, 180.0))
+    if max_lon > 180.0:
+        spans.append((-180.0, max_lon - 360.0))
+    return spans
+
+
+def geohash_encode(longitude: float, latitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    """Encode a longitude/latitude pair into a geohash string of the given length."""
+    lon_range = [-180.0, 180.0]
+    lat_range = [-90.0, 90.0]
+    longitude = normalize_longitude(longitude)
+    latitude = min(max(latitude, -90.0), 90.0)
+
+    chars: list[str] = []
+    bit = 0
+    value = 0
+    even = True  # Geohashes interleave bits starting with longitude
+    while len(chars) < precision:
+        if even:
+            mid = (lon_range[0] + lon_range[1]) / 2
+            if longitude >= mid:
+                value = (value << 1) | 1
+                lon_range[0] = mid
+            else:
+                value <<= 1
+                lon_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                value = (value << 1) | 1
+                lat_range[0] = mid
+            else:
+                value <<= 1
+                lat_range[1] = mid
+        even = not even
+        bit += 1
+        if bit == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bit = 0
+            value = 0
+    return "".join(chars)
+
+
+def geohash_cell_size(precision: int) -> tuple[float, float]:
+    """Return the (width, height) in degrees of a geohash cell with the given number of characters."""
+    bits = precision * 5
+    lon_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    return (360.0 / (1 << lon_bits), 180.0 / (1 << lat_bits))
+
+
+def _steps(start: float, stop: float, step: float) -> list[float]:
+    """Return values from start to stop (inclusive) spaced no more than step apart."""
+    values = []
+    current = start
+    while current < stop:
+        values.append(current)
+        current += step
+    values.append(stop)
+    return values
+
+
+def geohash_cover(longitude: float, latitude: float, distance: float) -> tuple[str, ...]:
+    """
+    Return geohash prefixes whose cells, together, contain every point within distance (in meters).
+
+    The finest precision that needs no more than `MAX_COVER_CELLS` cells is used. An empty tuple means the area is so
+    large that it cannot be narrowed down in a useful way and callers should not filter by cell.
+    """
+    min_lon, min_lat, max_lon, max_lat = bounding_box(longitude, latitude, distance)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        width, height = geohash_cell_size(precision)
+        columns = math.ceil((max_lon - min_lon) / width) + 1
+        rows = math.ceil((max_lat - min_lat) / height) + 1
+        if columns * rows > MAX_COVER_CELLS:
+            continue
+
+        cells: set[str] = set()
+        for lat in _steps(min_lat, max_lat, height):
+            for lon in _steps(min_lon, max_lon, width):
+                cells.add(geohash_encode(lon, lat, precision))
+        return tuple(sorted(cells))
+    return ()
+
+
+def geohash_range(prefix: str) -> tuple[str, str]:
+    """Return the (inclusive, exclusive) bounds of every geohash that starts with the given prefix."""
+    return (prefix, f"{prefix}{GEOHASH_RANGE_END}")
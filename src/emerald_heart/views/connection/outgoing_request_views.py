@@ -28,9 +28,11 @@ class ListOutgoingRequests(EmeraldView):
 
         q_obj = Q(source_user=request.user)
         if search:
-            search_q_obj = self.get_search_qobj(search, fields=("dest_user__name",))
+            search_q_obj = self.get_search_qobj(search, fields=("dest_user__name",), model=Request)
             q_obj &= search_q_obj
-        qs = Request.objects.filter(q_obj)
+        qs = Request.objects.with_versions().filter(q_obj)
+        if search and (rank := self.get_search_rank(search, fields=("dest_user__name",), model=Request)) is not None:
+            qs = qs.annotate(search_rank=rank).order_by("search_rank", "-created")
         return self.render(
             {
                 "item_list": paginate(queryset=qs, request=request),
@@ -57,9 +59,11 @@ class ListOutgoingRequestsSelected(EmeraldView):
 
         q_obj = Q(source_user=request.user)
         if search:
-            search_q_obj = self.get_search_qobj(search, fields=("dest_user__name",))
+            search_q_obj = self.get_search_qobj(search, fields=("dest_user__name",), model=Request)
             q_obj &= search_q_obj
-        qs = Request.objects.filter(q_obj)
+        qs = Request.objects.with_versions().filter(q_obj)
+        if search and (rank := self.get_search_rank(search, fields=("dest_user__name",), model=Request)) is not None:
+            qs = qs.annotate(search_rank=rank).order_by("search_rank", "-created")
 
         selected = get_object_or_404(Request, pk=id, source_user=request.user)
         return self.render(
@@ -6,6 +6,7 @@ from django.shortcuts import get_object_or_404
 
 from emerald_heart.models import Request, User
 from emerald_heart.views.core import EmeraldView
+from emerald_heart.views.search.sent_requests import refresh_sent_requests
 
 LOG = logging.getLogger(__name__)
 REQUIRED_GROUPS: tuple[str, ...] = ("admin", "member")
@@ -48,4 +49,5 @@ class CreateRequest(EmeraldView):
 
         instance = Request(source_user=src_user, dest_user=dest_user)
         instance.save()
+        refresh_sent_requests(instance.source_user_id)
         return self.render({})
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
 import logging
+import time
+from collections.abc import Mapping
 from functools import cached_property
 from typing import Any, Sequence, cast
 from urllib.parse import urlparse, urlunparse
@@ -8,17 +10,24 @@ from urllib.parse import urlparse, urlunparse
 from django.conf import settings
 from django.contrib.auth import REDIRECT_FIELD_NAME
 from django.contrib.auth.models import AnonymousUser
-from django.db.models import Q
+from django.db.models import Model, Q
+from django.db.models.expressions import RawSQL
 from django.http import Http404, HttpRequest, HttpResponse, HttpResponseRedirect, QueryDict
+from django.middleware.csrf import get_token
 from django.shortcuts import render as render_template
 from django.shortcuts import resolve_url
+from django.template.loader import render_to_string
 from django.urls import reverse_lazy
+from django.utils.functional import SimpleLazyObject
 from django.views.generic import View
 
+from emerald_heart.context_processors import site_info
 from emerald_heart.hints import ResponseType, UrlType
 from emerald_heart.models import User
+from emerald_heart.utils.fts import USER_FTS_COLUMNS, build_fts_qobj, build_fts_rank, fts_available
+from emerald_heart.utils.navigation import Navigation, get_navigation
 from emerald_heart.utils.query import build_search_qobj
-from emerald_heart.utils.render import HttpResponseHXRedirect
+from emerald_heart.utils.render import HttpResponseHXRedirect, LazyValue
 
 LOG = logging.getLogger(__name__)
 REDIRECT_FIELD = REDIRECT_FIELD_NAME or "next"
@@ -37,10 +46,68 @@ class EmeraldView(View):
     def get_context_data(self, request: HttpRequest, *args, **kwargs) -> dict[str, Any]:
         return {}
 
-    def get_search_qobj(self, search: str, fields: tuple[str, ...] = ()) -> Q:
-        """Return a Q object for the given model & search terms."""
+    def get_search_qobj(self, search: str, fields: tuple[str, ...] = (), model: type[Model] | None = None) -> Q:
+        """
+        Return a Q object for the given model & search terms.
+
+        When every field is a user column in the full-text index (reached from `model`) the index answers the search;
+        otherwise each term becomes an `icontains` lookup.
+        """
+        if target := self.get_fts_target(fields, model):
+            try:
+                return build_fts_qobj(q_str=search, field=target[0], columns=target[1])
+            except ValueError:
+                LOG.debug("No full-text terms in '%s'; falling back to substring search", search)
         return build_search_qobj(q_str=search, fields=fields)
 
+    def get_search_rank(
+        self, search: str, fields: tuple[str, ...] = (), model: type[Model] | None = None
+    ) -> RawSQL | None:
+        """Return a BM25 rank (lower is better) for ordering full-text search results; None if the index isn't used."""
+        if (target := self.get_fts_target(fields, model)) and target[2]:
+            try:
+                return build_fts_rank(q_str=search, column=target[2], columns=target[1])
+            except ValueError:
+                return None
+        return None
+
+    @staticmethod
+    def get_fts_target(fields: tuple[str, ...], model: type[Model] | None) -> tuple[str, tuple[str, ...], str] | None:
+        """
+        Return how to search fields through the full-text index, or None when it can't answer for them.
+
+        The result is the lookup holding the user id, the indexed columns and the quoted SQL column holding the user id
+        (blank when the user is more than one relation away, in which case results can't be ranked).
+        """
+        if model is None or not fields or not fts_available():
+            return None
+
+        paths: set[str] = set()
+        columns = []
+        for field_path in fields:
+            *relations, column = field_path.split("__")
+            if column not in USER_FTS_COLUMNS:
+                return None
+            current = model
+            for name in relations:
+                related = current._meta.get_field(name)
+                if not related.is_relation or related.related_model is None:
+                    return None
+                current = related.related_model  # type: ignore
+            if current is not User:
+                return None
+            paths.add("__".join(relations))
+            columns.append(column)
+        if len(paths) != 1:
+            return None
+
+        path = paths.pop()
+        if not path:
+            return ("pk", tuple(columns), f'"{User._meta.db_table}"."id"')
+        if "__" in path:
+            return (path, tuple(columns), "")
+        return (path, tuple(columns), f'"{model._meta.db_table}"."{model._meta.get_field(path).column}"')  # type: ignore
+
     def get_page(self, request: HttpRequest) -> int | None:
         if page := request.GET.get("page"):
             try:
@@ -106,49 +173,42 @@ class EmeraldView(View):
             LOG.exception("Unable to get user groups")
             return {"anonymous"}
 
+    @cached_property
+    def navigation(self) -> Navigation:
+        """Return the cached tabs & actions for the users groups."""
+        return get_navigation(frozenset(self.user_groups))
+
     @property
-    def tabs(self) -> list[dict[str, Any]]:
+    def tabs(self) -> tuple[Mapping[str, Any], ...]:
         """Determine allowed tabs & actions."""
-        allowed_tabs = []
-        for tab in settings.SITE_DATA[::-1]:
-            tab_groups = {"admin", "developer"} | set(tab["visible"])
-            if self.overlap(self.user_groups, tab_groups) or not tab["visible"]:
-                allowed_actions = []
-                for action in tab["actions"]:
-                    act_groups = {"admin", "developer"} | set(action["visible"])
-                    if self.overlap(act_groups, self.user_groups) or not action["visible"]:
-                        allowed_actions.append(action)
-                tab["actions"] = allowed_actions
-                allowed_tabs.append(tab)
-        return allowed_tabs
+        return self.navigation.tabs
 
     @property
-    def tab_id_list(self) -> list[str]:
+    def tab_id_list(self) -> tuple[str, ...]:
         """Return an iterable of tab ids."""
-        return [x["id"] for x in self.tabs]
+        return self.navigation.tab_ids
 
     @property
     def default_context(self) -> dict[str, Any]:
-        """Default context dictionary provided to templates."""
+        """
+        Default context dictionary provided to templates.
+
+        Navigation needs the users groups so it is only worked out if the template shows it; most htmx partials don't.
+        """
         return {
-            "SITE_TABS": self.tabs,
+            "SITE_TABS": LazyValue(lambda: self.tabs),
             "active_tab": self.tab_id,
             "selected_action": self.action_id,
-            "user_groups": self.user_groups,
+            "user_groups": LazyValue(lambda: self.user_groups),
             "auth_required": self.auth_required,
             "show_search": False,
-            "action_list": self.actions,
+            "action_list": LazyValue(lambda: self.actions),
         }
 
     @property
-    def actions(self) -> list[dict[str, Any]]:
+    def actions(self) -> tuple[Mapping[str, Any], ...]:
         """Return an iterable of all actions for the current tab."""
-        LOG.debug("Processing actions for tab.")
-        for tab in self.tabs:
-            if tab["id"] == self.tab_id:
-                return tab["actions"]
-        else:
-            return []
+        return self.navigation.actions.get(self.tab_id, ())
 
     def redirect(self, url: UrlType) -> HttpResponseRedirect:
         """Return a redirect to the given url."""
@@ -242,13 +302,58 @@ class EmeraldView(View):
 
             return self.render_template("partials/form.html", my_context)
         """
-        default_context = self.default_context
-        context_data = self.get_context_data(self._request, *self._request_args, **self._request_kwargs)
-        default_context.update(context_data)
-        if context is not None:
-            default_context.update(context)
+        return self.render(context, template_name=template_name, content_type=content_type)
+
+    def get_fragment_value(self, name: str) -> Any:
+        """Return a shared context value a fragment asked for by name; see `render_fragment`."""
+        request = self._request
+        match name:
+            case "request":
+                return request
+            case "user":
+                return request.user
+            case "csrf_token":
+                return SimpleLazyObject(lambda: get_token(request))
+        if name in (defaults := self.default_context):
+            return defaults[name]
+        if name in (site := site_info(request)):
+            return site[name]
+        raise ValueError(f"Unknown fragment context value {name}")
+
+    def render_fragment(
+        self,
+        template_name: str,
+        context: dict[str, Any] | None = None,
+        *,
+        needs: Sequence[str] = (),
+        content_type: str | None = None,
+    ) -> HttpResponse:
+        """
+        Render an htmx partial from the given context alone.
 
-        return self.render(default_context, template_name=template_name, content_type=content_type)
+        Full pages need the navigation, `get_context_data` and every context processor, but fragments seldom do; only
+        the shared values named in `needs` (such as "csrf_token", "user" or "SITE_TABS") are added::
+
+            return self.render_fragment("partial/form.html", {"form": form}, needs=("csrf_token",))
+        """
+        started = time.perf_counter()
+        fragment_context = {name: self.get_fragment_value(name) for name in needs}
+        if context is not None:
+            fragment_context.update(context)
+        response = HttpResponse(render_to_string(template_name, fragment_context), content_type=content_type)
+        elapsed = (time.perf_counter() - started) * 1000
+        LOG.debug("Rendered fragment %s for %s in %.2fms", template_name, self.__class__.__name__, elapsed)
+        if settings.DEBUG:
+            response["Server-Timing"] = f"render;dur={elapsed:.2f}"
+        return response
+
+    def get_render_context(self, context: dict[str, Any] | None = None) -> dict[str, Any]:
+        """Assemble the template context once: the defaults, then `get_context_data`, then the given context."""
+        render_context = self.default_context
+        render_context.update(self.get_context_data(self._request, *self._request_args, **self._request_kwargs))
+        if context is not None:
+            render_context.update(context)
+        return render_context
 
     def render(
         self,
@@ -258,14 +363,16 @@ class EmeraldView(View):
         content_type: str | None = None,
     ) -> ResponseType:
         """Render the page, adding given context to default context."""
-        default_context = self.default_context
-        context_data = self.get_context_data(self._request, *self._request_args, **self._request_kwargs)
-        default_context.update(context_data)
-        if context is not None:
-            default_context.update(context)
-        return render_template(
+        started = time.perf_counter()
+        template_name = template_name or self.template_name
+        response = render_template(
             self._request,
-            template_name or self.template_name,
-            default_context,
+            template_name,
+            self.get_render_context(context),
             content_type=content_type,
         )
+        elapsed = (time.perf_counter() - started) * 1000
+        LOG.debug("Rendered %s for %s in %.2fms", template_name, self.__class__.__name__, elapsed)
+        if settings.DEBUG:
+            response["Server-Timing"] = f"render;dur={elapsed:.2f}"
+        return response
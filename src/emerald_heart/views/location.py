@@ -6,7 +6,9 @@ from datetime import UTC, datetime
 from django.contrib.gis.geos import Point
 
 from emerald_heart.hints import ResponseType
+from emerald_heart.utils.movement import SESSION_KEY, get_check, has_moved, next_check
 from emerald_heart.views.core import EmeraldView
+from emerald_heart.views.search.location_buffer import get_current_location, record_location
 
 LOG = logging.getLogger(__name__)
 
@@ -22,7 +24,7 @@ class LocationData(EmeraldView):
             try:
                 lat = float(latitude)
             except Exception:
-                return self.render({})
+                return self.render_fragment(self.template_name)
         else:
             lat = 0.0  # Not really necessary but helps the type checker
 
@@ -32,20 +34,24 @@ class LocationData(EmeraldView):
                 lon = float(longitude)
             except Exception:
                 lon = 0.0
-                return self.render({})
+                return self.render_fragment(self.template_name)
         else:
             lon = 0.0  # Not really necessary but helps the type checker
 
         try:
-            point = Point(lon, lat, srid=3857)
+            point = Point(lon, lat, srid=4326)
         except Exception:
             LOG.exception("Invalid point value from lat %s long %s", lat, lon)
-            return self.render_template("null.html", {})
+            return self.render_fragment(self.template_name)
 
         user = request.user
-        user.current_location = point
-        user.save()
-        request.session["last-location-check"] = datetime.now(UTC).isoformat()
-        LOG.debug("Set %s location to %s", user.display_name, point)
+        moved = has_moved(get_current_location(user), point)
+        if moved:
+            record_location(user, point)
+            LOG.debug("Set %s location to %s", user.display_name, point)
+        else:
+            LOG.debug("Ignored %s location %s; not far enough from the last one", user.display_name, point)
+        # Members who stay put are asked less and less often; moving resets the wait
+        request.session[SESSION_KEY] = next_check(get_check(request.session), moved, datetime.now(UTC))
 
-        return self.render({})
+        return self.render_fragment(self.template_name)
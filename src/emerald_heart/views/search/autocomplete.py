@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from bisect import bisect_left, insort
+from uuid import UUID
+
+from django.conf import settings
+
+from emerald_heart.models import User
+from emerald_heart.utils.cache import bump_version, get_version
+
+LOG = logging.getLogger(__name__)
+
+VERSION_KEY = "member-names:version"
+"""Cache key of the version stamp shared by every process holding a `NameIndex`."""
+
+SEPARATOR = "\x00"
+"""Separates the folded text from the member id in index keys; it sorts before any printable character."""
+
+
+def name_keys(pk: UUID, name: str) -> list[str]:
+    """Return the index keys for a member name: the whole name and the name from each later word onwards."""
+    words = name.casefold().split()
+    return [f"{' '.join(words[index:])}{SEPARATOR}{pk.hex}" for index in range(len(words))]
+
+
+class NameIndex:
+    """
+    An in-process index of member names for prefix lookups.
+
+    Keys are case-folded names (and their word suffixes so any word can start a match) followed by the member id, kept
+    in a sorted list that is searched with bisect. Writes in this process are applied incrementally; a version stamp in
+    the shared cache tells other processes to reload the index from the database. Lookups read the stamp at most every
+    `MEMBER_NAME_INDEX_CHECK_INTERVAL` seconds so keystrokes are answered without touching the shared cache.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.keys: list[str] = []
+        self.names: dict[UUID, str] = {}
+        self.version: int | None = None
+        self.checked = 0.0  # time.monotonic() of the last version check
+
+    def load(self) -> None:
+        """Rebuild the index from the database."""
+        version = get_version(VERSION_KEY)
+        names = dict(User.objects.exclude(username="admin").values_list("id", "name"))
+        keys = sorted(key for pk, name in names.items() for key in name_keys(pk, name))
+        with self.lock:
+            self.keys = keys
+            self.names = names
+            self.version = version
+            self.checked = time.monotonic()
+        LOG.debug("Loaded %s member names (version %s)", len(names), version)
+
+    def ensure_current(self) -> None:
+        """Reload the index if it was never loaded or, when due for a check, another process changed the names."""
+        if self.version is not None:
+            now = time.monotonic()
+            if now - self.checked < settings.MEMBER_NAME_INDEX_CHECK_INTERVAL:
+                return
+            self.checked = now
+            if self.version == get_version(VERSION_KEY):
+                return
+        self.load()
+
+    def _remove(self, pk: UUID) -> None:
+        if (name := self.names.pop(pk, None)) is None:
+            return
+        for key in name_keys(pk, name):
+            index = bisect_left(self.keys, key)
+            if index < len(self.keys) and self.keys[index] == key:
+                del self.keys[index]
+
+    def _apply(self, version: int, pk: UUID, name: str | None) -> None:
+        """Apply a change made in this process; a gap in versions means another process changed names too."""
+        with self.lock:
+            if self.version is None or version != self.version + 1:
+                self.version = None  # Reload on the next lookup
+                return
+            self._remove(pk)
+            if name is not None:
+                self.names[pk] = name
+                for key in name_keys(pk, name):
+                    insort(self.keys, key)
+            self.version = version
+
+    def update(self, pk: UUID, username: str, name: str) -> None:
+        """Record a saved member; call once the save is committed."""
+        indexed_name = None if username == "admin" else name
+        with self.lock:
+            unchanged = self.version is not None and self.names.get(pk) == indexed_name
+        if unchanged and self.version == get_version(VERSION_KEY):
+            return  # Most saves (location updates, logins) don't change the name
+        self._apply(bump_version(VERSION_KEY), pk, indexed_name)
+
+    def remove(self, pk: UUID) -> None:
+        """Record a deleted member; call once the delete is committed."""
+        self._apply(bump_version(VERSION_KEY), pk, None)
+
+    def search(self, prefix: str, limit: int = 10, exclude: UUID | None = None) -> list[tuple[UUID, str]]:
+        """Return up to `limit` (id, name) pairs for members with a name, or a word in it, starting with the prefix."""
+        self.ensure_current()
+        prefix = " ".join(prefix.casefold().split())
+        if not prefix:
+            return []
+
+        results: list[tuple[UUID, str]] = []
+        seen: set[UUID] = set()
+        with self.lock:
+            index = bisect_left(self.keys, prefix)
+            while index < len(self.keys) and len(results) < limit:
+                key = self.keys[index]
+                if not key.startswith(prefix):
+                    break
+                pk = UUID(key.rsplit(SEPARATOR, 1)[1])
+                if pk != exclude and pk not in seen:
+                    seen.add(pk)
+                    results.append((pk, self.names[pk]))
+                index += 1
+        return results
+
+
+NAME_INDEX = NameIndex()
+"""The member name index of this process."""
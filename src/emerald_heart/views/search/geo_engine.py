@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+import logging
+import math
+import threading
+from collections.abc import Sequence
+from typing import TYPE_CHECKING
+from uuid import UUID
+
+from django.conf import settings
+from django.core.cache import cache
+
+from emerald_heart.models import User
+from emerald_heart.utils.cache import bump_version, get_version
+from emerald_heart.utils.spatial import EARTH_RADIUS, bounding_box, split_antimeridian
+
+if TYPE_CHECKING:
+    import numpy as np
+
+LOG = logging.getLogger(__name__)
+
+VERSION_KEY = "member-points:version"
+"""Cache key of the version stamp shared by every process holding a `GeoEngine`."""
+
+CHANGE_PREFIX = "member-points:change"
+"""Prefix of the cache keys holding each versioned location change so other processes can replay it."""
+
+CHANGE_TIMEOUT = 3600
+"""Seconds a location change is kept for replay; processes further behind than this reload."""
+
+MAX_REPLAY = 5000
+"""Processes more than this many changes behind reload their snapshot instead of replaying the changes."""
+
+INITIAL_CAPACITY = 1024
+"""Number of slots allocated for a snapshot before the first grow."""
+
+
+def change_key(version: int) -> str:
+    """Return the cache key of the location change with the given version."""
+    return f"{CHANGE_PREFIX}:{version}"
+
+
+class GeoEngine:
+    """
+    An in-process snapshot of member locations answering radius and nearest searches with vectorised haversine.
+
+    Points are kept (in radians) in contiguous float64 arrays with a parallel list of member ids. Removed members leave
+    a NaN slot which is reused by the next new member, so updates never shift the arrays. Changes made in this process
+    are applied directly; changes made elsewhere are replayed from the shared cache, and a process that falls too far
+    behind reloads from the database.
+
+    NumPy is an optional dependency (the "geo" extra), so it is imported by the methods that use it rather than when
+    this module loads; `get_engine` checks that it is installed.
+    """
+
+    def __init__(self) -> None:
+        import numpy as np
+
+        self.lock = threading.Lock()
+        self.version: int | None = None
+        self.ids: list[UUID | None] = []
+        self.slots: dict[UUID, int] = {}
+        self.free: list[int] = []
+        self.lon: np.ndarray = np.full(0, np.nan)
+        self.lat: np.ndarray = np.full(0, np.nan)
+        self.cos_lat: np.ndarray = np.full(0, np.nan)
+
+    def load(self) -> None:
+        """Rebuild the snapshot from the database."""
+        import numpy as np
+
+        version = get_version(VERSION_KEY)
+        rows = (
+            User.objects.exclude(username="admin").exclude(current_location=None).values_list("id", "current_location")
+        )
+        ids: list[UUID | None] = []
+        lons: list[float] = []
+        lats: list[float] = []
+        for pk, point in rows.iterator(chunk_size=5000):
+            ids.append(pk)
+            lons.append(point.x)
+            lats.append(point.y)
+
+        capacity = max(INITIAL_CAPACITY, len(ids))
+        lon = np.full(capacity, np.nan)
+        lat = np.full(capacity, np.nan)
+        lon[: len(ids)] = np.radians(lons)
+        lat[: len(ids)] = np.radians(lats)
+        with self.lock:
+            self.ids = ids + [None] * (capacity - len(ids))
+            self.slots = {pk: slot for slot, pk in enumerate(ids) if pk is not None}
+            self.free = list(range(capacity - 1, len(ids) - 1, -1))
+            self.lon = lon
+            self.lat = lat
+            self.cos_lat = np.cos(lat)
+            self.version = version
+        LOG.debug("Loaded %s member locations (version %s)", len(self.slots), version)
+
+    def _grow(self) -> None:
+        import numpy as np
+
+        capacity = len(self.ids)
+        extra = max(capacity, INITIAL_CAPACITY)
+        self.lon = np.concatenate((self.lon, np.full(extra, np.nan)))
+        self.lat = np.concatenate((self.lat, np.full(extra, np.nan)))
+        self.cos_lat = np.concatenate((self.cos_lat, np.full(extra, np.nan)))
+        self.ids.extend([None] * extra)
+        self.free.extend(range(capacity + extra - 1, capacity - 1, -1))
+
+    def _set(self, pk: UUID, point: tuple[float, float] | None) -> None:
+        """Move, add or (when point is None) remove a member; the lock must be held."""
+        import numpy as np
+
+        slot = self.slots.get(pk)
+        if point is None:
+            if slot is not None:
+                del self.slots[pk]
+                self.ids[slot] = None
+                self.lon[slot] = self.lat[slot] = self.cos_lat[slot] = np.nan
+                self.free.append(slot)
+            return
+
+        if slot is None:
+            if not self.free:
+                self._grow()
+            slot = self.free.pop()
+            self.slots[pk] = slot
+            self.ids[slot] = pk
+        self.lon[slot] = math.radians(point[0])
+        self.lat[slot] = math.radians(point[1])
+        self.cos_lat[slot] = math.cos(self.lat[slot])
+
+    def ensure_current(self) -> None:
+        """Load the snapshot if needed and replay changes made by other processes."""
+        shared = get_version(VERSION_KEY)
+        if self.version == shared:
+            return
+        if self.version is None or not 0 < shared - self.version <= MAX_REPLAY:
+            self.load()
+            return
+
+        keys = [change_key(version) for version in range(self.version + 1, shared + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            self.load()  # Some changes expired (or are still being written); start over
+            return
+        with self.lock:
+            for key in keys:
+                pk_hex, point = changes[key]
+                self._set(UUID(pk_hex), point)
+            self.version = shared
+
+    def record(self, pk: UUID, username: str, point: tuple[float, float] | None) -> None:
+        """Publish a committed location change (None when the member lost their location or was deleted)."""
+        if username == "admin":
+            point = None
+        version = bump_version(VERSION_KEY)
+        cache.set(change_key(version), (pk.hex, point), timeout=CHANGE_TIMEOUT)
+        with self.lock:
+            if self.version is not None and version == self.version + 1:
+                self._set(pk, point)
+                self.version = version
+
+    def _distances(self, origins: Sequence, slots) -> np.ndarray:
+        """Return the distance in meters from the closest origin for the given slots."""
+        import numpy as np
+
+        lon = self.lon[slots]
+        lat = self.lat[slots]
+        cos_lat = self.cos_lat[slots]
+        best = np.full(len(lon), np.inf)
+        for origin in origins:
+            origin_lat = math.radians(origin.y)
+            a = (
+                np.sin((lat - origin_lat) / 2) ** 2
+                + math.cos(origin_lat) * cos_lat * np.sin((lon - math.radians(origin.x)) / 2) ** 2
+            )
+            best = np.minimum(best, 2 * EARTH_RADIUS * np.arcsin(np.minimum(1.0, np.sqrt(a))))
+        return best
+
+    def within(self, origins: Sequence, distance: float, exclude: UUID | None = None) -> list[tuple[float, UUID]]:
+        """Return (meters, id) pairs for every member within distance (in meters) of the closest origin."""
+        import numpy as np
+
+        self.ensure_current()
+        with self.lock:
+            mask = np.zeros(len(self.ids), dtype=bool)
+            for origin in origins:
+                min_lon, min_lat, max_lon, max_lat = bounding_box(origin.x, origin.y, distance)
+                box = (self.lat >= math.radians(min_lat)) & (self.lat <= math.radians(max_lat))
+                spans = np.zeros(len(self.ids), dtype=bool)
+                for span_min, span_max in split_antimeridian(min_lon, max_lon):
+                    spans |= (self.lon >= math.radians(span_min)) & (self.lon <= math.radians(span_max))
+                mask |= box & spans
+            slots = np.flatnonzero(mask)
+            distances = self._distances(origins, slots)
+            keep = distances <= distance
+            ids = self.ids
+            return [
+                (float(meters), pk)
+                for meters, slot in zip(distances[keep], slots[keep], strict=True)
+                if (pk := ids[slot]) is not None and pk != exclude
+            ]
+
+    def nearest(self, origins: Sequence, limit: int, exclude: UUID | None = None) -> list[tuple[float, UUID]]:
+        """Return up to `limit` (meters, id) pairs for the members closest to any origin, nearest first."""
+        import numpy as np
+
+        self.ensure_current()
+        with self.lock:
+            distances = self._distances(origins, slice(None))
+            distances[np.isnan(distances)] = np.inf
+            if exclude is not None and (slot := self.slots.get(exclude)) is not None:
+                distances[slot] = np.inf
+            count = min(limit, len(distances))
+            if count < 1:
+                return []
+            best = np.argpartition(distances, count - 1)[:count]
+            best = best[np.argsort(distances[best], kind="stable")]
+            ids = self.ids
+            return [
+                (float(distances[slot]), pk)
+                for slot in best
+                if np.isfinite(distances[slot]) and (pk := ids[slot]) is not None
+            ]
+
+
+_engine: GeoEngine | None = None
+_engine_lock = threading.Lock()
+_numpy_missing = False
+
+
+def get_engine() -> GeoEngine | None:
+    """Return this process's engine when `MEMBER_SEARCH_ENGINE` selects it and NumPy is installed; None otherwise."""
+    global _engine, _numpy_missing
+    if settings.MEMBER_SEARCH_ENGINE != "numpy" or _numpy_missing:
+        return None
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None and not _numpy_missing:
+                try:
+                    _engine = GeoEngine()
+                except ImportError:
+                    LOG.warning("MEMBER_SEARCH_ENGINE is 'numpy' but NumPy isn't installed; searching the database")
+                    _numpy_missing = True
+    return _engine
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import atexit
+import logging
+import threading
+import time
+from uuid import UUID
+
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from emerald_heart.models import User
+from emerald_heart.utils.location_history import append_history
+from emerald_heart.utils.rtree import USER_RTREE, upsert_points
+from emerald_heart.views.search.geo_engine import get_engine
+from emerald_heart.views.search.nearby import refresh_nearby_many
+from emerald_heart.views.search.search_cache import invalidate_moved
+
+LOG = logging.getLogger(__name__)
+
+CACHE_PREFIX = "location-pending"
+"""Prefix of the cache keys holding each member's latest unwritten location."""
+
+
+def cache_key(user_id: UUID) -> str:
+    """Return the key of the pending location for a user."""
+    return f"{CACHE_PREFIX}:{user_id.hex}"
+
+
+def get_current_location(user: User) -> Point | None:
+    """Return a member's latest location, including a ping that hasn't been written yet."""
+    if (pending := cache.get(cache_key(user.pk))) is not None:
+        return Point(*pending, srid=4326)
+    return user.current_location
+
+
+def write_locations(points: dict[UUID, tuple[float, float]], using: str = DEFAULT_DB_ALIAS) -> int:
+    """
+    Write many members' locations in one transaction; returns the number of members written.
+
+    Only the location and the columns derived from it are updated, in one batched UPDATE. `bulk_update` skips model
+    signals, so the R*Tree, nearby members table and location history are brought up to date with one batched pass
+    each rather than by replaying every member's save signals inside the transaction. Search caches and engines are
+    told once it commits.
+    """
+    update_fields = ("current_location", *User.LOCATION_COLUMNS)
+    with transaction.atomic(using=using):
+        users = list(User.objects.using(using).filter(id__in=points).only("id", "username", "current_location"))
+        moved = []
+        for user in users:
+            moved.append((user.current_location, Point(*points[user.pk], srid=4326)))
+            user.current_location = moved[-1][1]
+            user.set_location_columns()
+        changed = [user for user in users if user.location_changed]
+        User.objects.using(using).bulk_update(users, update_fields, batch_size=500)
+        located = ((user.pk, user.current_longitude, user.current_latitude) for user in changed)
+        upsert_points(USER_RTREE, located, using=using)
+        refresh_nearby_many(changed, using=using)
+        append_history({user.pk: points[user.pk] for user in users}, using=using)
+
+        engine = get_engine()
+        published = [(user.pk, user.username, points[user.pk]) for user in changed]
+
+        def publish() -> None:
+            for previous, current in moved:
+                invalidate_moved(previous, current)
+            if engine is not None:
+                for pk, username, point in published:
+                    engine.record(pk, username, point)
+
+        transaction.on_commit(publish, using=using)
+    return len(users)
+
+
+class LocationBuffer:
+    """
+    Coalesce location pings per member and write them together.
+
+    Browsers ping every few seconds; only the newest point per member is kept and a background thread writes them in a
+    single transaction every `MEMBER_LOCATION_FLUSH_INTERVAL` seconds, so writers contend for SQLite's lock once per
+    interval rather than once per ping. The newest point is also put in the shared cache so the member's own searches
+    see it straight away, whichever process serves them.
+    """
+
+    def __init__(self, start_thread: bool = True) -> None:
+        self.lock = threading.Lock()
+        self.pending: dict[UUID, tuple[float, float]] = {}
+        self.start_thread = start_thread
+        self.thread: threading.Thread | None = None
+
+    def add(self, user_id: UUID, point: Point) -> None:
+        """Buffer the newest location of a member."""
+        coordinates = (point.x, point.y)
+        timeout = max(60, int(settings.MEMBER_LOCATION_FLUSH_INTERVAL * 10))
+        cache.set(cache_key(user_id), coordinates, timeout=timeout)
+        with self.lock:
+            self.pending[user_id] = coordinates
+            if self.start_thread and self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="location-buffer", daemon=True)
+                self.thread.start()
+                atexit.register(self.flush)
+
+    def flush(self) -> int:
+        """Write every buffered location; returns the number of members written."""
+        with self.lock:
+            points, self.pending = self.pending, {}
+        if not points:
+            return 0
+        try:
+            count = write_locations(points)
+        except Exception:
+            LOG.exception("Unable to write %s buffered locations; keeping them for the next flush", len(points))
+            with self.lock:
+                self.pending = points | self.pending
+            return 0
+        LOG.debug("Wrote %s buffered locations", count)
+        return count
+
+    def run(self) -> None:
+        """Flush the buffer periodically; runs in a daemon thread."""
+        while True:
+            time.sleep(settings.MEMBER_LOCATION_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            finally:
+                connections.close_all()  # Only closes this thread's connections
+
+
+LOCATION_BUFFER = LocationBuffer()
+"""The buffer of this process."""
+
+
+def record_location(user: User, point: Point) -> None:
+    """Store a location ping; buffered when `MEMBER_LOCATION_FLUSH_INTERVAL` is set and written at once otherwise."""
+    if settings.MEMBER_LOCATION_FLUSH_INTERVAL > 0:
+        LOCATION_BUFFER.add(user.pk, point)
+        return
+    previous = user.current_location
+    user.current_location = point
+    user.save(update_fields=["current_location"])
+    append_history({user.pk: (point.x, point.y)})
+    invalidate_moved(previous, point)
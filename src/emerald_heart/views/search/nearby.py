@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import logging
+from bisect import bisect_left
+from collections.abc import Iterable
+from uuid import UUID
+
+from django.contrib.gis.geos import Point
+from django.contrib.gis.measure import Distance
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Q
+from django.db.models.query import QuerySet
+
+from emerald_heart.models import NearbyMember, User
+from emerald_heart.utils.query import build_bbox_qobj, build_chord_qobj
+from emerald_heart.utils.spatial import haversine
+
+LOG = logging.getLogger(__name__)
+
+NEARBY_DISTANCES: tuple[int, ...] = (5, 10, 20)
+"""Search distances (in miles) answered from the nearby members table; larger searches query live."""
+
+NEARBY_LIMITS: tuple[float, ...] = tuple(Distance(mi=miles).m for miles in NEARBY_DISTANCES)
+"""`NEARBY_DISTANCES` in meters."""
+
+
+def find_nearby(users: QuerySet, longitude: float, latitude: float) -> list[tuple[UUID, int, float]]:
+    """
+    Return (id, band, meters) for every user in a queryset within the largest nearby band of a point.
+
+    Callers exclude the user at the point (and anyone else who should never be listed) from the queryset. Works with
+    historical models so migrations can use it.
+    """
+    origin = Point(longitude, latitude, srid=4326)
+    widest = NEARBY_LIMITS[-1]
+    qobj = build_bbox_qobj(
+        longitude_field="current_longitude",
+        latitude_field="current_latitude",
+        longitude=longitude,
+        latitude=latitude,
+        distance=widest,
+    ) & build_chord_qobj(
+        ecef_fields=("current_ecef_x", "current_ecef_y", "current_ecef_z"), origins=[origin], distance=widest
+    )
+
+    found = []
+    for pk, lon, lat in users.filter(qobj).values_list("id", "current_longitude", "current_latitude"):
+        meters = haversine(longitude, latitude, lon, lat)
+        band = bisect_left(NEARBY_LIMITS, meters)
+        if band < len(NEARBY_LIMITS):
+            found.append((pk, NEARBY_DISTANCES[band], meters))
+    return found
+
+
+def refresh_nearby(user: User, using: str = DEFAULT_DB_ALIAS) -> int:
+    """
+    Replace the nearby rows of a user who moved, in both directions; returns the number of neighbours.
+
+    Only the user's own neighbourhood is touched: the pairs the user was in are dropped and the pairs at the new
+    location are added. The neighbours are read in the same transaction as the write so concurrent moves serialise.
+    """
+    return refresh_nearby_many([user], using=using)
+
+
+def refresh_nearby_many(users: Iterable[User], using: str = DEFAULT_DB_ALIAS) -> int:
+    """
+    Replace the nearby rows of several users who moved or were just created; returns the number of pairs written.
+
+    Like `refresh_nearby`, but pairs between two of the users are found once, so a batch costs one neighbourhood query
+    per user rather than a rebuild of the whole table.
+    """
+    users = list(users)
+    pairs: dict[tuple[UUID, UUID], tuple[int, float]] = {}
+    with transaction.atomic(using=using):
+        ids = [user.pk for user in users]
+        NearbyMember.objects.using(using).filter(Q(user_id__in=ids) | Q(member_id__in=ids)).delete()
+        others = User.objects.using(using).exclude(username="admin")
+        for user in users:
+            if (point := user.current_location) is None or user.username == "admin":
+                continue
+            for pk, band, meters in find_nearby(others.exclude(id=user.pk), point.x, point.y):
+                pairs[(user.pk, pk) if user.pk < pk else (pk, user.pk)] = (band, meters)
+        rows = []
+        for (first, second), (band, meters) in pairs.items():
+            rows.append(NearbyMember(user_id=first, member_id=second, band=band, distance=meters))
+            rows.append(NearbyMember(user_id=second, member_id=first, band=band, distance=meters))
+        NearbyMember.objects.using(using).bulk_create(rows, batch_size=500)
+    return len(pairs)
+
+
+def rebuild_nearby(
+    using: str = DEFAULT_DB_ALIAS, user_model=User, nearby_model=NearbyMember, batch_size: int = 1000
+) -> int:
+    """
+    Replace the whole nearby members table; returns the number of rows written.
+
+    Each user stores its own side of every pair so both directions are covered once. The models can be swapped for
+    historical ones when run from a migration.
+    """
+    members = user_model.objects.using(using).exclude(username="admin").exclude(current_location=None)
+    count = 0
+    with transaction.atomic(using=using):
+        nearby_model.objects.using(using).all().delete()
+        batch = []
+        for pk, longitude, latitude in list(members.values_list("id", "current_longitude", "current_latitude")):
+            for member_pk, band, meters in find_nearby(members.exclude(id=pk), longitude, latitude):
+                batch.append(nearby_model(user_id=pk, member_id=member_pk, band=band, distance=meters))
+            if len(batch) >= batch_size:
+                nearby_model.objects.using(using).bulk_create(batch)
+                count += len(batch)
+                batch = []
+        nearby_model.objects.using(using).bulk_create(batch)
+        count += len(batch)
+    return count
+
+
+def uses_nearby(origins, distance: int | None, current_user: User | None) -> bool:
+    """Determine if a search can be answered from the nearby members table."""
+    if current_user is None or distance not in NEARBY_DISTANCES or len(origins) != 1:
+        return False
+    point = current_user.current_location
+    return point is not None and (origins[0].x, origins[0].y) == (point.x, point.y)
+
+
+def get_nearby(current_user: User, distance: int) -> QuerySet[NearbyMember, NearbyMember]:
+    """Return the nearby rows of a user within a distance (in miles)."""
+    return NearbyMember.objects.filter(user=current_user, band__lte=distance)
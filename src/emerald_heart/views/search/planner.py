@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import logging
+import math
+import re
+import unicodedata
+from collections.abc import Sequence
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.db.models.functions import Floor
+
+from emerald_heart.models import User
+from emerald_heart.utils.fts import count_prefix_documents, fts_available
+from emerald_heart.utils.query import normalize_query
+from emerald_heart.utils.spatial import bounding_box, split_antimeridian
+
+LOG = logging.getLogger(__name__)
+FIND_WORDS = re.compile(r"\w+").findall
+
+TEXT_FIRST = "text"
+"""Plan that lists the members matching the text and tests the distance of each."""
+
+AREA_FIRST = "area"
+"""Plan that lists the members in the search area and tests each against the text."""
+
+STATS_PREFIX = "search-stats"
+"""Prefix of the cache keys holding search planning statistics."""
+
+DENSITY_CELL = 1.0
+"""Edge length (in degrees) of the grid cells members are counted in."""
+
+
+def get_density() -> dict[tuple[int, int], int]:
+    """Return the number of members in each non-empty (row, column) grid cell."""
+    key = f"{STATS_PREFIX}:density"
+    if (density := cache.get(key)) is not None:
+        return density
+
+    cells = (
+        User.objects.exclude(current_location=None)
+        .exclude(username="admin")
+        .annotate(row=Floor("current_latitude"), column=Floor("current_longitude"))
+        .values_list("row", "column")
+        .annotate(members=Count("id"))
+    )
+    density = {(int(row), int(column)): members for row, column, members in cells}
+    cache.set(key, density, timeout=settings.MEMBER_SEARCH_STATS_TIMEOUT)
+    return density
+
+
+def estimate_area_members(origins: Sequence, distance: float) -> float:
+    """
+    Estimate how many members are in the bounding boxes of a search radius (in meters) around the origins.
+
+    Members are assumed to be spread evenly within each grid cell. The boxes, rather than the circles, are what the
+    spatial indexes hand over, so they are what an area first search reads.
+    """
+    density = get_density()
+    total = 0.0
+    for origin in origins:
+        min_lon, min_lat, max_lon, max_lat = bounding_box(origin.x, origin.y, distance)
+        for span_min, span_max in split_antimeridian(min_lon, max_lon):
+            for (row, column), members in density.items():
+                height = min(max_lat, row + DENSITY_CELL) - max(min_lat, row)
+                width = min(span_max, column + DENSITY_CELL) - max(span_min, column)
+                if height > 0 and width > 0:
+                    total += members * height * width / (DENSITY_CELL * DENSITY_CELL)
+    return total
+
+
+def normalize_word(word: str) -> str:
+    """Fold a word the way the full-text tokenizer does: lower case without diacritics."""
+    decomposed = unicodedata.normalize("NFKD", word.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def count_word(word: str) -> int | None:
+    """Return (and cache) the number of members holding a term starting with a word."""
+    key = f"{STATS_PREFIX}:term:{word}"
+    if (count := cache.get(key)) is not None:
+        return count
+    if (count := count_prefix_documents(word)) is not None:
+        cache.set(key, count, timeout=settings.MEMBER_SEARCH_STATS_TIMEOUT)
+    return count
+
+
+def estimate_text_matches(q_str: str) -> float | None:
+    """
+    Estimate how many members match a search string; None when it can't be estimated.
+
+    Every term must match, so the rarest word bounds the result.
+    """
+    if not fts_available():
+        return None
+    estimate = math.inf
+    for term in normalize_query(q_str):
+        for word in FIND_WORDS(term):
+            if (count := count_word(normalize_word(word))) is None:
+                return None
+            estimate = min(estimate, count)
+    return None if estimate == math.inf else estimate
+
+
+def choose_plan(q_str: str, origins: Sequence, distance: float) -> str:
+    """Return which index should drive a keyword search within a radius (in meters): `TEXT_FIRST` or `AREA_FIRST`."""
+    if (text := estimate_text_matches(q_str)) is None:
+        return AREA_FIRST
+    area = estimate_area_members(origins, distance)
+    plan = TEXT_FIRST if text < area else AREA_FIRST
+    LOG.debug("Planned '%s' within %sm as %s (text %s, area %.0f)", q_str, distance, plan, text, area)
+    return plan
@@ -6,9 +6,18 @@ from typing import Any
 from django.http import HttpRequest
 
 from emerald_heart.hints import ResponseType
+from emerald_heart.models import User
+from emerald_heart.utils.spatial import as_wgs84
 from emerald_heart.views.core import EmeraldView
-from emerald_heart.views.search.search_forms import SearchForm
-from emerald_heart.views.search.search_service import get_member_by_id, get_members
+from emerald_heart.views.search.autocomplete import NAME_INDEX
+from emerald_heart.views.search.location_buffer import get_current_location
+from emerald_heart.views.search.search_forms import ANY_LOCATION, CURRENT_LOCATION, SEARCH_DISTANCES, SearchForm
+from emerald_heart.views.search.search_service import (
+    get_member_by_id,
+    get_member_page,
+    get_nearest_members,
+    get_radius_counts,
+)
 
 LOG = logging.getLogger(__name__)
 
@@ -23,6 +32,58 @@ class MemberSearch(EmeraldView):
     def get_context_data(self, request: HttpRequest, *args, **kwargs) -> dict[str, Any]:
         return {"submit_text": "Search", "submit_icon": "las la-search"}
 
+    def get_origins(self, form: SearchForm) -> list:
+        """Return the points, in WGS84 degrees, a valid form asks to search around."""
+        choice = form.cleaned_data["location"]
+        if choice == CURRENT_LOCATION:
+            location = get_current_location(self.user)  # type: ignore
+            return [as_wgs84(location)] if location is not None else []
+        locations = self.user.location_set.all()  # type: ignore
+        if choice != ANY_LOCATION:
+            locations = locations.filter(id=choice)
+        return [as_wgs84(location.location) for location in locations]
+
+    def get_member_list(
+        self, form: SearchForm, cursor: str | None = None, origins: list | None = None
+    ) -> tuple[list[User], str | None]:
+        """Run the search described by a valid form; returns the members found and the cursor for the next page."""
+        if origins is None:
+            origins = self.get_origins(form)
+        if form.cleaned_data["mode"] == "nearest":
+            members = get_nearest_members(
+                location=None,
+                limit=form.cleaned_data["limit"],
+                current_user=self._request.user,  # type: ignore
+                origins=origins,
+                q=form.cleaned_data["q"],
+            )
+            return (members, None)
+        try:
+            return get_member_page(
+                distance=form.cleaned_data["distance"],
+                current_user=self._request.user,  # type: ignore
+                cursor=cursor,
+                origins=origins,
+                q=form.cleaned_data["q"],
+            )
+        except ValueError:
+            LOG.warning("Ignoring invalid member search cursor: %s", cursor)
+            return ([], None)
+
+    def get_search_context(self, form: SearchForm, cursor: str | None = None) -> dict[str, Any]:
+        """Return the results of a valid form; first pages of radius searches include the count for every distance."""
+        origins = self.get_origins(form)
+        context: dict[str, Any] = {}
+        context["member_list"], context["next_cursor"] = self.get_member_list(form, cursor=cursor, origins=origins)
+        if form.cleaned_data["mode"] == "radius" and not cursor:
+            context["radius_counts"] = get_radius_counts(
+                origins,
+                SEARCH_DISTANCES,
+                current_user=self._request.user,  # type: ignore
+                q=form.cleaned_data["q"],
+            )
+        return context
+
     def get(self, request, *args, **kwargs) -> ResponseType:
         form = SearchForm()
         context = {"member_list": [], "form": form, "initial": True}
@@ -33,11 +94,7 @@ class MemberSearch(EmeraldView):
         form = SearchForm(request.POST)
         context = {"member_list": [], "form": form, "initial": False}
         if form.is_valid():
-            context["member_list"] = get_members(
-                location=self.user.current_location,  # type:ignore
-                distance=form.cleaned_data["distance"],
-                current_user=request.user,
-            )
+            context.update(self.get_search_context(form))
             context.update(form.cleaned_data)
         else:
             LOG.error(form.errors)
@@ -46,20 +103,18 @@ class MemberSearch(EmeraldView):
     def hx_post(self, request, *args, **kwargs) -> ResponseType:
         LOG.error("Got hx-post")
         form = SearchForm(request.POST)
+        cursor = request.POST.get("cursor")
         context = {"member_list": [], "form": form, "initial": False}
         if form.is_valid():
-            context["member_list"] = tuple(
-                get_members(
-                    location=self.user.current_location,  # type: ignore
-                    distance=form.cleaned_data["distance"],
-                    current_user=request.user,
-                )
-            )
+            context.update(self.get_search_context(form, cursor=cursor))
             context.update(form.cleaned_data)
         else:
             LOG.error(form.errors)
         LOG.error("context: %s", context)
-        return self.render_template("partial/member-list.html", context)
+        if cursor:
+            # Later pages replace the "load more" sentinel; they must not repeat the empty results message
+            return self.render_fragment("partial/member-cards.html", context)
+        return self.render_fragment("partial/member-list.html", context)
 
 
 class ViewMember(EmeraldView):
@@ -70,3 +125,15 @@ class ViewMember(EmeraldView):
 
     def get(self, request, id, *args, **kwargs) -> ResponseType:
         return self.render({"member": get_member_by_id(id)})
+
+
+class MemberAutocomplete(EmeraldView):
+    """Suggest members whose name starts with the typed text; served from memory without querying the database."""
+
+    template_name = "partial/member-autocomplete.html"
+    auth_required = True
+    tab_id = "search"
+
+    def hx_get(self, request, *args, **kwargs) -> ResponseType:
+        matches = NAME_INDEX.search(request.GET.get("q", ""), exclude=self._request.user.pk)
+        return self.render_fragment(self.template_name, {"matches": matches})
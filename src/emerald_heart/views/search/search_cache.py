@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import json
+import logging
+import math
+
+from django.conf import settings
+from django.contrib.gis.geos import Polygon
+from django.contrib.gis.measure import Distance
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from emerald_heart.models import User
+from emerald_heart.utils.rtree import USER_RTREE, build_rtree_box_qobj, rtree_available
+from emerald_heart.utils.spatial import METERS_PER_DEGREE, normalize_longitude, split_antimeridian
+
+LOG = logging.getLogger(__name__)
+
+CACHE_PREFIX = "member-search"
+"""Prefix of every cache key holding a list of search candidates."""
+
+CACHED_DISTANCES: tuple[int, ...] = (5, 10, 20, 50, 100, 500)
+"""Search distances (in miles) that are cached; these match the choices offered by the search form."""
+
+MAX_REGION_COLUMNS = 16
+"""Regions needing more columns than this (close to the poles) are not cached."""
+
+
+def cell_size(distance: int) -> float:
+    """Return the edge length (in degrees) of the grid cells used for a search distance (in miles)."""
+    # The largest 360 / 2**n that is no bigger than the radius; grid lines then line up with the antimeridian
+    target = Distance(mi=distance).m / METERS_PER_DEGREE
+    size = 180.0
+    while size > target:
+        size /= 2
+    return size
+
+
+def grid_cell(longitude: float, latitude: float, size: float) -> tuple[int, int]:
+    """Return the (row, column) of the grid cell holding a point."""
+    rows = round(180.0 / size)
+    columns = round(360.0 / size)
+    row = min(max(math.floor((latitude + 90.0) / size), 0), rows - 1)
+    column = math.floor((normalize_longitude(longitude) + 180.0) / size) % columns
+    return (row, column)
+
+
+def row_span(distance: int, size: float) -> int:
+    """Return how many rows a cell's region reaches above and below it."""
+    return math.ceil(Distance(mi=distance).m / METERS_PER_DEGREE / size)
+
+
+def column_span(row: int, distance: int, size: float) -> int | None:
+    """
+    Return how many columns the regions of cells in a row reach to either side; None when they are not cached.
+
+    The span is computed at the latitude furthest from the equator that the region reaches so that it holds every
+    point within the distance of any point in the cell.
+    """
+    rows = row_span(distance, size)
+    south = -90.0 + (row - rows) * size
+    north = -90.0 + (row + rows + 1) * size
+    widest = min(max(abs(south), abs(north)), 90.0)
+    if widest >= 89.9:
+        return None
+    columns = math.ceil(Distance(mi=distance).m / (METERS_PER_DEGREE * math.cos(math.radians(widest))) / size)
+    if 2 * columns + 1 > MAX_REGION_COLUMNS:
+        return None
+    return columns
+
+
+def cache_key(distance: int, row: int, column: int) -> str:
+    """Return the key of the candidate list for a grid cell."""
+    return f"{CACHE_PREFIX}:{distance}:{row}:{column}"
+
+
+def region_box(distance: int, row: int, column: int, size: float, columns: int) -> tuple[float, float, float, float]:
+    """Return the (min_lon, min_lat, max_lon, max_lat) region whose members are cached for a grid cell."""
+    rows = row_span(distance, size)
+    return (
+        -180.0 + (column - columns) * size,
+        max(-90.0 + (row - rows) * size, -90.0),
+        -180.0 + (column + columns + 1) * size,
+        min(-90.0 + (row + rows + 1) * size, 90.0),
+    )
+
+
+def region_keys(point) -> set[str]:
+    """
+    Return the keys of every cached candidate list whose region holds a point.
+
+    A point is in a cell's region when it is within the row span and the cell's column span of it, so walking the
+    spans around the point's own cell finds exactly those cells.
+    """
+    keys: set[str] = set()
+    if point is None:
+        return keys
+
+    for distance in CACHED_DISTANCES:
+        size = cell_size(distance)
+        rows = round(180.0 / size)
+        total_columns = round(360.0 / size)
+        point_row, point_column = grid_cell(point.x, point.y, size)
+        spread = row_span(distance, size)
+        for row in range(max(point_row - spread, 0), min(point_row + spread, rows - 1) + 1):
+            if (columns := column_span(row, distance, size)) is None:
+                continue
+            for column in range(point_column - columns, point_column + columns + 1):
+                keys.add(cache_key(distance, row, column % total_columns))
+    return keys
+
+
+def _region_qobj(box: tuple[float, float, float, float]) -> Q:
+    """Return a query for members whose location is inside a region box."""
+    min_lon, min_lat, max_lon, max_lat = box
+    if rtree_available(USER_RTREE):
+        return build_rtree_box_qobj(table=USER_RTREE, field="id", box=box)
+
+    qobj = Q()
+    for span_min, span_max in split_antimeridian(min_lon, max_lon):
+        polygon = Polygon.from_bbox((span_min, min_lat, span_max, max_lat))
+        polygon.srid = 4326
+        qobj |= Q(current_location__contained=polygon)
+    return qobj
+
+
+def get_candidate_ids(location, distance: int) -> str | None:
+    """
+    Return a JSON list of the ids of members that may be within a distance (in miles) of a location.
+
+    The list is shared by every search from the same grid cell and holds no per-viewer data; callers still need to
+    exclude the searcher and apply an exact distance test. None means the search can't be cached.
+    """
+    if distance not in CACHED_DISTANCES:
+        return None
+    size = cell_size(distance)
+    row, column = grid_cell(location.x, location.y, size)
+    if (columns := column_span(row, distance, size)) is None:
+        return None
+
+    key = cache_key(distance, row, column)
+    if (ids := cache.get(key)) is not None:
+        return ids
+
+    box = region_box(distance, row, column, size, columns)
+    qs = User.objects.filter(_region_qobj(box) & ~Q(username="admin") & ~Q(current_location=None))
+    ids = json.dumps([pk.hex for pk in qs.values_list("id", flat=True)])
+    cache.set(key, ids, timeout=settings.MEMBER_SEARCH_CACHE_TIMEOUT)
+    return ids
+
+
+def get_candidate_qobj(location, distance: int) -> Q | None:
+    """Return a query restricting members to the cached candidates for a search; None when it can't be cached."""
+    if (ids := get_candidate_ids(location, distance)) is None:
+        return None
+    if connection.vendor == "sqlite":
+        # Pass the list as a single parameter; large lists would otherwise exceed SQLite's variable limit
+        return Q(id__in=RawSQL("SELECT value FROM json_each(%s)", [ids]))
+    return Q(id__in=json.loads(ids))
+
+
+def invalidate_moved(previous, current) -> None:
+    """Drop the cached candidate lists of every region a member entered or left by moving between two points."""
+    if keys := region_keys(previous) ^ region_keys(current):
+        cache.delete_many(list(keys))
+        LOG.debug("Invalidated %s cached search regions", len(keys))
@@ -11,6 +11,15 @@ from emerald_heart.views.core_form import FormBase
 
 LOG = logging.getLogger(__name__)
 
+CURRENT_LOCATION = "0"
+"""Location choice for searching around the members current location."""
+
+ANY_LOCATION = "any"
+"""Location choice for searching around every saved location at once."""
+
+SEARCH_DISTANCES: tuple[int, ...] = (5, 10, 20, 50, 100, 500)
+"""Search distances (in miles) a member can pick."""
+
 
 def get_initial_date() -> date:
     """Callable for getting users "today" value."""
@@ -23,25 +32,40 @@ def get_initial_date() -> date:
 class SearchForm(FormBase):
     """Custom search form with distance selector."""
 
-    location = forms.ChoiceField(choices=((0, "Current Location"),))
-    distance = forms.ChoiceField(
+    q = forms.CharField(label="Keywords", max_length=200)
+    location = forms.ChoiceField(choices=((CURRENT_LOCATION, "Current Location"),))
+    mode = forms.ChoiceField(
+        choices=(
+            ("radius", "Everyone Within Distance"),
+            ("nearest", "Nearest Members"),
+        ),
+        initial="radius",
+    )
+    distance = forms.ChoiceField(choices=[(miles, f"{miles} Miles") for miles in SEARCH_DISTANCES])
+    limit = forms.ChoiceField(
+        label="Nearest",
         choices=(
-            (5, "5 Miles"),
-            (10, "10 Miles"),
-            (20, "20 Miles"),
-            (50, "50 Miles"),
-            (100, "100 Miles"),
-            (500, "500 Miles"),
-        )
+            (10, "10 Members"),
+            (25, "25 Members"),
+            (50, "50 Members"),
+        ),
+        initial=10,
     )
 
+    class Meta:
+        """Meta information about the form."""
+
+        not_required = ("q", "mode", "limit")
+
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
         choices = [
-            (0, "Current Location"),
+            (CURRENT_LOCATION, "Current Location"),
         ]
-        for location in self.user.location_set.all():  # type: ignore
-            choices.append((location.id, location.name))
+        locations = [(str(location.id), location.name) for location in self.user.location_set.all()]  # type: ignore
+        if locations:
+            choices.append((ANY_LOCATION, "Near Any Of My Places"))
+        choices.extend(locations)
         self.fields["location"].choices = choices  # type: ignore
 
     def clean(self) -> dict[str, Any]:
@@ -52,4 +76,12 @@ class SearchForm(FormBase):
         except TypeError, ValueError:
             self.add_error("distance", "Invalid distance")
             data.pop("distance", None)
+        try:
+            data["limit"] = int(data.get("limit") or 10)
+        except TypeError, ValueError:
+            self.add_error("limit", "Invalid number of members")
+            data.pop("limit", None)
+        data["mode"] = data.get("mode") or "radius"
+        data["location"] = data.get("location") or CURRENT_LOCATION
+        data["q"] = (data.get("q") or "").strip()
         return data
@@ -1,48 +1,348 @@
 from __future__ import annotations
 
+import heapq
+import itertools
 import logging
+import math
+from bisect import bisect_left
+from collections.abc import Sequence
 from uuid import UUID
 
+from django.conf import settings
 from django.contrib.gis.measure import Distance
-from django.db.models import Exists, OuterRef, Q
-from django.db.models.query import QuerySet
+from django.db.models import Count, Q
 from django.shortcuts import get_object_or_404
 
-from emerald_heart.models import Request, User
-from emerald_heart.utils.spatial import distance_to_degrees
+from emerald_heart.models import NearbyMember, User
+from emerald_heart.utils.fts import USER_TABLE, build_fts_exists, build_fts_qobj, fts_available
+from emerald_heart.utils.paginate import decode_cursor, encode_cursor
+from emerald_heart.utils.query import (
+    build_bbox_qobj,
+    build_chord_qobj,
+    build_distance_expression,
+    build_geohash_qobj,
+    build_search_qobj,
+)
+from emerald_heart.utils.rtree import USER_RTREE, build_rtree_qobj, rtree_available
+from emerald_heart.utils.spatial import EARTH_RADIUS
+from emerald_heart.views.search.geo_engine import get_engine
+from emerald_heart.views.search.nearby import get_nearby, uses_nearby
+from emerald_heart.views.search.planner import TEXT_FIRST, choose_plan
+from emerald_heart.views.search.search_cache import get_candidate_qobj
+from emerald_heart.views.search.sent_requests import MemberQuerySet
 
 LOG = logging.getLogger(__name__)
 
+NEAREST_START_RADIUS: float = Distance(mi=5).m
+"""Radius (in meters) of the first ring searched when looking for the nearest members."""
 
-def get_all_members(current_user: User | None = None) -> QuerySet[User]:
+NEAREST_MAX_RADIUS: float = math.pi * EARTH_RADIUS
+"""Half the earths circumference; every point on the globe is within this distance."""
+
+
+def get_all_members(current_user: User | None = None) -> MemberQuerySet:
     """Return all members without filtering."""
     if current_user is not None:
-        has_sent_request = Exists(Request.objects.filter(source_user=current_user, dest_user=OuterRef("pk")))
-        return User.objects.filter(~Q(id=current_user.id) & ~Q(username="admin")).annotate(
-            has_sent_request=has_sent_request
-        )
+        qs = MemberQuerySet(User).filter(~Q(id=current_user.id) & ~Q(username="admin"))
+        return qs.with_sent_requests(current_user)
     else:
-        return User.objects.none()
+        return MemberQuerySet(User).none()
+
+
+def get_spatial_prefilter(*, location, distance: float) -> Q:
+    """
+    Return a cheap, indexed filter that narrows members down to those near a location (distance in meters).
+
+    The R*Tree is used when it exists and the geohash cells are used otherwise. Either way the result is a superset of
+    the members within the distance; callers still need to apply an exact distance test.
+    """
+    if rtree_available(USER_RTREE):
+        return build_rtree_qobj(
+            table=USER_RTREE, field="id", longitude=location.x, latitude=location.y, distance=distance
+        )
+    return build_geohash_qobj(field="current_geohash", longitude=location.x, latitude=location.y, distance=distance)
+
+
+def get_area_qobj(*, location, distance: float, cached_distance: int | None = None) -> Q:
+    """
+    Return a filter for members inside the bounding box of a search radius (in meters) around a location.
+
+    The indexed prefilter (a cached candidate list when `cached_distance` in miles is given and cacheable) narrows the
+    rows and the coordinate columns trim them to the box; callers refine with `get_radius_qobj`.
+    """
+    prefilter = None
+    if cached_distance is not None:
+        prefilter = get_candidate_qobj(location, cached_distance)
+    if prefilter is None:
+        prefilter = get_spatial_prefilter(location=location, distance=distance)
+    return prefilter & get_bbox_qobj(location=location, distance=distance)
+
+
+def get_bbox_qobj(*, location, distance: float) -> Q:
+    """Return a filter on the coordinate columns for the bounding box of a search radius (in meters)."""
+    return build_bbox_qobj(
+        longitude_field="current_longitude",
+        latitude_field="current_latitude",
+        longitude=location.x,
+        latitude=location.y,
+        distance=distance,
+    )
+
+
+def get_radius_qobj(origins: Sequence, distance: float) -> Q:
+    """Return an exact filter for members within distance (in meters) of any origin, using the ECEF columns."""
+    return build_chord_qobj(
+        ecef_fields=("current_ecef_x", "current_ecef_y", "current_ecef_z"), origins=origins, distance=distance
+    )
 
 
-def get_members(location=None, distance=None, current_user: User | None = None) -> QuerySet[User]:
+def get_text_qobj(q: str, column: str = f'"{USER_TABLE}"."id"', prefix: str = "") -> Q:
+    """
+    Return a per-row filter for members matching a keyword search of names and bios.
+
+    From another table pass the quoted SQL column holding the member id and the lookup prefix reaching the member.
+    """
+    if fts_available():
+        try:
+            return Q(build_fts_exists(q_str=q, column=column))
+        except ValueError:
+            LOG.debug("No full-text terms in '%s'; falling back to substring search", q)
+    try:
+        return build_search_qobj(q_str=q, fields=(f"{prefix}name", f"{prefix}bio"))
+    except ValueError:
+        return Q()
+
+
+def get_search_qobj(origins: Sequence, distance: float, cached_distance: int | None = None, q: str | None = None) -> Q:
+    """
+    Return a filter for members within distance (in meters) of any origin who match an optional keyword search.
+
+    Keyword searches are planned from cached statistics. When the text should match fewer members than the search
+    area holds, the full-text index drives and each match is checked against the bounding boxes and radius; otherwise
+    the spatial index drives and each member in the area is checked against the index by rowid. Either way the other
+    side's full candidate set is never built.
+    """
+    radius = get_radius_qobj(origins, distance)
+    if q and choose_plan(q, origins, distance) == TEXT_FIRST:
+        boxes = Q()
+        for origin in origins:
+            boxes |= get_bbox_qobj(location=origin, distance=distance)
+        try:
+            return build_fts_qobj(q_str=q) & boxes & radius
+        except ValueError:
+            LOG.debug("No full-text terms in '%s'; searching the area first", q)
+
+    area = Q()
+    for origin in origins:
+        area |= get_area_qobj(location=origin, distance=distance, cached_distance=cached_distance)
+    if q:
+        return area & radius & get_text_qobj(q)
+    return area & radius
+
+
+def get_distance_expression(origins: Sequence):
+    """Return a SQL expression for the distance in meters from a member to the closest origin."""
+    return build_distance_expression(
+        longitude_field="current_longitude", latitude_field="current_latitude", origins=origins
+    )
+
+
+def get_members(location=None, distance=None, current_user: User | None = None) -> MemberQuerySet:
     """Query for members based on provided data."""
-    if distance and location:
+    if distance and location and current_user is not None and uses_nearby([location], distance, current_user):
+        member_ids = get_nearby(current_user, distance).values("member_id")
+        return MemberQuerySet(User).filter(id__in=member_ids).with_sent_requests(current_user)
+    elif distance and location:
         distance_meters = Distance(mi=distance).m
-        qobj = Q(current_location__dwithin=(location, distance_to_degrees(distance_meters, location.y))) & ~Q(
-            username="admin"
-        )
+        qobj = get_area_qobj(location=location, distance=distance_meters) & ~Q(username="admin")
         if current_user is not None:
             qobj &= ~Q(id=current_user.id)
-        qs = User.objects.filter(qobj).distinct()
+        qs = MemberQuerySet(User).filter(qobj & get_radius_qobj([location], distance_meters)).distinct()
         if current_user is not None:
-            has_sent_request = Exists(Request.objects.filter(source_user=current_user, dest_user=OuterRef("pk")))
-            qs = qs.annotate(has_sent_request=has_sent_request)
+            qs = qs.with_sent_requests(current_user)
         return qs
     else:
         return get_all_members(current_user=current_user)
 
 
+def get_nearest_members(
+    location, limit: int, current_user: User | None = None, origins: Sequence | None = None, q: str | None = None
+) -> list[User]:
+    """
+    Return up to `limit` members closest to a location, nearest first, each with a `distance` attribute.
+
+    The search starts with a small radius and doubles it until enough members are found (or the whole globe has been
+    searched). Each ring is one query that filters on the ECEF columns and orders by true distance in SQL, returning
+    only ids and distances; full user rows are fetched for the winners alone. When `origins` is given the rings grow
+    around all of them at once and each member's distance is to the closest origin. A keyword search in `q` is planned
+    afresh for every ring.
+    """
+    if origins is None:
+        origins = [location] if location is not None else []
+    if not origins or limit < 1:
+        return []
+
+    if not q and (engine := get_engine()) is not None:
+        exclude = current_user.pk if current_user is not None else None
+        return _load_members(engine.nearest(origins, limit, exclude=exclude), current_user=current_user)
+
+    excluded = ~Q(username="admin") & ~Q(current_location=None)
+    if current_user is not None:
+        excluded &= ~Q(id=current_user.id)
+
+    distance = get_distance_expression(origins)
+    radius = NEAREST_START_RADIUS
+    while True:
+        qs = User.objects.filter(get_search_qobj(origins, radius, q=q) & excluded).annotate(distance_m=distance)
+        nearest = list(qs.order_by("distance_m", "id").values_list("distance_m", "id")[:limit])
+
+        if len(nearest) >= limit or radius >= NEAREST_MAX_RADIUS:
+            break
+        radius = min(radius * 2, NEAREST_MAX_RADIUS)
+
+    return _load_members(nearest, current_user=current_user)
+
+
+def _load_members(
+    keys: list[tuple[float, UUID]], current_user: User | None = None, with_distance: bool = True
+) -> list[User]:
+    """Fetch full user rows for (meters, pk) pairs, preserving their order; members deleted since are skipped."""
+    qs = MemberQuerySet(User).filter(id__in=[pk for _, pk in keys])
+    if current_user is not None:
+        qs = qs.with_sent_requests(current_user)
+    members = qs.in_bulk()
+
+    results = []
+    for meters, pk in keys:
+        # An in-memory engine may not have replayed the deletion of a member yet
+        if (member := members.get(pk)) is None:
+            continue
+        if with_distance:
+            member.distance = Distance(m=meters)  # type: ignore
+        results.append(member)
+    return results
+
+
+def _cursor_position(cursor: str | None) -> tuple[float, str] | None:
+    """Return the (meters, pk hex) sort key held by a cursor; raises ValueError for invalid cursors."""
+    if not cursor:
+        return None
+    values = decode_cursor(cursor)
+    if len(values) != 2 or not isinstance(values[0], int | float) or not isinstance(values[1], str):
+        raise ValueError(f"Invalid member search cursor: {cursor}")
+    return (float(values[0]), values[1])
+
+
+def get_member_page(
+    location=None,
+    distance=None,
+    current_user: User | None = None,
+    cursor: str | None = None,
+    per_page: int = settings.MEMBER_SEARCH_PAGE_SIZE,
+    origins: Sequence | None = None,
+    q: str | None = None,
+) -> tuple[list[User], str | None]:
+    """
+    Return one page of members ordered by (distance, id) along with the cursor for the next page.
+
+    Pages are found by keyset rather than offset: the cursor holds the sort key of the last member shown and the next
+    page starts right after it, so results stay stable while members move and no page costs more than the first. The
+    distance filter, keyset and ordering all run in SQL so only the ids and distances of one page are read; full user
+    rows are fetched for the members on the page alone. Small-radius searches around the searcher's own location read
+    the nearby members table; other candidates come from the shared grid cell cache when possible. The next cursor is
+    None on the last page. Raises ValueError if the cursor is invalid.
+
+    When `origins` is given every one of them is searched in a single query; members near several origins appear once,
+    at the distance to the closest. A keyword search in `q` narrows the members by name and bio.
+    """
+    after = _cursor_position(cursor)
+    if origins is None:
+        origins = [location] if location is not None else []
+    if current_user is None and not (distance and origins):
+        return ([], None)
+
+    excluded = ~Q(username="admin")
+    if current_user is not None:
+        excluded &= ~Q(id=current_user.id)
+
+    keys: list[tuple[float, str, UUID]]
+    if distance and origins:
+        radius = Distance(mi=distance).m
+        if current_user is not None and uses_nearby(origins, distance, current_user):
+            qs = get_nearby(current_user, distance)
+            if q:
+                column = f'"{NearbyMember._meta.db_table}"."member_id"'
+                qs = qs.filter(get_text_qobj(q, column=column, prefix="member__"))
+            if after is not None:
+                qs = qs.filter(Q(distance__gt=after[0]) | Q(distance=after[0], member_id__gt=UUID(after[1])))
+            rows = qs.order_by("distance", "member_id").values_list("distance", "member_id")[: per_page + 1]
+            keys = [(meters, pk.hex, pk) for meters, pk in rows]
+        elif not q and (engine := get_engine()) is not None:
+            exclude = current_user.pk if current_user is not None else None
+            within = []
+            for meters, pk in engine.within(origins, radius, exclude=exclude):
+                if after is None or (meters, pk.hex) > after:
+                    within.append((meters, pk.hex, pk))
+            keys = heapq.nsmallest(per_page + 1, within)
+        else:
+            qs = User.objects.filter(get_search_qobj(origins, radius, cached_distance=distance, q=q) & excluded)
+            qs = qs.annotate(distance_m=get_distance_expression(origins))
+            if after is not None:
+                qs = qs.filter(Q(distance_m__gt=after[0]) | Q(distance_m=after[0], id__gt=UUID(after[1])))
+            rows = qs.order_by("distance_m", "id").values_list("distance_m", "id")[: per_page + 1]
+            keys = [(meters, pk.hex, pk) for meters, pk in rows]
+    else:
+        # Without a search area every member is at the same "distance"; the id alone orders the results
+        qs = User.objects.filter(excluded & get_text_qobj(q) if q else excluded)
+        if after is not None:
+            qs = qs.filter(id__gt=UUID(after[1]))
+        keys = [(0.0, pk.hex, pk) for pk in qs.order_by("id").values_list("id", flat=True)[: per_page + 1]]
+
+    next_cursor = None
+    if len(keys) > per_page:
+        keys = keys[:per_page]
+        next_cursor = encode_cursor(keys[-1][0], keys[-1][1])
+
+    members = _load_members(
+        [(meters, pk) for meters, _, pk in keys], current_user=current_user, with_distance=bool(distance and origins)
+    )
+    return (members, next_cursor)
+
+
+def get_radius_counts(
+    origins: Sequence, distances: Sequence[int], current_user: User | None = None, q: str | None = None
+) -> list[tuple[int, int]]:
+    """
+    Return (miles, members) pairs counting the members within each distance (in miles) of the closest origin.
+
+    Every band is counted in a single pass: one query (or one engine scan) over the largest radius that buckets each
+    member by distance, so people probing bigger radii after an empty search can see the counts up front. Only members
+    matching the keyword search in `q` are counted.
+    """
+    if not origins or not distances:
+        return []
+    bands = sorted(set(distances))
+    widest = Distance(mi=bands[-1]).m
+    exclude = current_user.pk if current_user is not None else None
+
+    if not q and (engine := get_engine()) is not None:
+        limits = [Distance(mi=miles).m for miles in bands]
+        totals = [0] * len(bands)
+        for meters, _ in engine.within(origins, widest, exclude=exclude):
+            totals[bisect_left(limits, meters)] += 1
+        counts = list(itertools.accumulate(totals))
+    else:
+        qobj = get_search_qobj(origins, widest, cached_distance=bands[-1], q=q) & ~Q(username="admin")
+        if exclude is not None:
+            qobj &= ~Q(id=exclude)
+        aggregates = {
+            f"within_{miles}": Count("id", filter=get_radius_qobj(origins, Distance(mi=miles).m)) for miles in bands
+        }
+        row = User.objects.filter(qobj).aggregate(**aggregates)
+        counts = [row[f"within_{miles}"] for miles in bands]
+    return list(zip(bands, counts, strict=True))
+
+
 def get_member_by_id(id: UUID) -> User:
     """Find the member that matches the given user id."""
     return get_object_or_404(User, id=id)
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import logging
+from bisect import bisect_left
+from collections.abc import Iterable
+from uuid import UUID
+
+from django.core.cache import cache
+from django.db.models.query import ModelIterable, QuerySet
+
+from emerald_heart.models import Request, User
+
+LOG = logging.getLogger(__name__)
+
+CACHE_PREFIX = "sent-requests"
+"""Prefix of the cache keys holding the ids of members each user has sent requests to."""
+
+UUID_SIZE = 16
+"""Number of bytes in a packed UUID."""
+
+
+class SentRequests:
+    """The ids of members a user has sent requests to, packed into a sorted array of 16 byte UUIDs."""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: bytes = b"") -> None:
+        self.data = data
+
+    @classmethod
+    def from_ids(cls, ids: Iterable[UUID]) -> SentRequests:
+        """Pack a collection of UUIDs."""
+        return cls(b"".join(sorted({pk.bytes for pk in ids})))
+
+    def __len__(self) -> int:
+        return len(self.data) // UUID_SIZE
+
+    def __getitem__(self, index: int) -> bytes:
+        start = index * UUID_SIZE
+        return self.data[start : start + UUID_SIZE]
+
+    def __contains__(self, pk: UUID) -> bool:
+        key = pk.bytes
+        index = bisect_left(self, key)
+        return index < len(self) and self[index] == key
+
+
+def cache_key(user_id: UUID) -> str:
+    """Return the key of the packed ids for a user."""
+    return f"{CACHE_PREFIX}:{user_id.hex}"
+
+
+def refresh_sent_requests(user_id: UUID) -> SentRequests:
+    """Load the ids of members a user has sent requests to from the database and cache them."""
+    sent = SentRequests.from_ids(Request.objects.filter(source_user_id=user_id).values_list("dest_user_id", flat=True))
+    cache.set(cache_key(user_id), sent.data, timeout=None)
+    return sent
+
+
+def get_sent_requests(user_id: UUID) -> SentRequests:
+    """Return the ids of members a user has sent requests to."""
+    if (data := cache.get(cache_key(user_id))) is not None:
+        return SentRequests(data)
+    return refresh_sent_requests(user_id)
+
+
+def forget_sent_requests(user_id: UUID) -> None:
+    """Drop the cached ids for a user; they are reloaded on next use."""
+    cache.delete(cache_key(user_id))
+
+
+class SentRequestIterable(ModelIterable):
+    """Yield members with `has_sent_request` set from the searchers packed ids rather than a subquery per row."""
+
+    def __iter__(self):
+        sent = self.queryset._sent_requests
+        for member in super().__iter__():
+            member.has_sent_request = member.pk in sent
+            yield member
+
+
+class MemberQuerySet(QuerySet[User, User]):
+    """A user queryset that can mark the members a searcher has already sent requests to."""
+
+    _sent_requests: SentRequests | None = None
+
+    def with_sent_requests(self, current_user: User) -> MemberQuerySet:
+        """Set `has_sent_request` on every member this queryset yields."""
+        clone = self._chain()
+        clone._sent_requests = get_sent_requests(current_user.pk)
+        clone._iterable_class = SentRequestIterable
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._sent_requests = self._sent_requests
+        return clone
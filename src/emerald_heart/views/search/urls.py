@@ -2,9 +2,10 @@ from __future__ import annotations
 
 from django.urls import path
 
-from .search import MemberSearch, ViewMember
+from .search import MemberAutocomplete, MemberSearch, ViewMember
 
 urlpatterns = [
     path("", MemberSearch.as_view(), name="member-search"),
+    path("autocomplete/", MemberAutocomplete.as_view(), name="member-autocomplete"),
     path("view/<uuid:id>/", ViewMember.as_view(), name="member-view"),
 ]
@@ -24,3 +24,9 @@ class TestAdminPage(TestCase):
         """Can render the admin index page."""
         r = self.client.get(reverse_lazy("admin:index"))
         self.assertEqual(r.status_code, 200)
+
+    def test_get_user_change_page(self):
+        """Can render the user change page with its location map."""
+        user = User.objects.exclude(current_location=None).first()
+        r = self.client.get(reverse_lazy("admin:emerald_heart_user_change", args=(user.pk,)))
+        self.assertEqual(r.status_code, 200)
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import io
+
+from django.core.management import call_command
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from emerald_heart.checks import check_fts_triggers
+from emerald_heart.models import Location, Request, User
+from emerald_heart.utils.fts import (
+    USER_FTS_TRIGGERS,
+    build_fts_qobj,
+    build_fts_rank,
+    build_match,
+    fts_available,
+    missing_triggers,
+)
+from emerald_heart.views.core import EmeraldView
+
+
+class TestBuildMatch(SimpleTestCase):
+    """Tests for turning search strings into FTS5 match expressions."""
+
+    def test_terms_are_prefix_matched(self):
+        """Each term must match and matches as a prefix."""
+        self.assertEqual('{name bio} : ("bob"* AND "bra"*)', build_match(q_str="bob  bra"))
+
+    def test_quoted_phrases(self):
+        """Quoted text stays a single phrase."""
+        self.assertEqual('{name bio} : ("far away"*)', build_match(q_str='"far   away"'))
+
+    def test_columns(self):
+        """Matches can be restricted to some columns."""
+        self.assertEqual('{name} : ("bob"*)', build_match(q_str="bob", columns=("name",)))
+
+    def test_punctuation_is_dropped(self):
+        """Terms without letters or digits are ignored."""
+        self.assertEqual('{name bio} : ("o\'neil"*)', build_match(q_str="o'neil --"))
+        with self.assertRaises(ValueError):
+            build_match(q_str="-- !!")
+
+
+class TestUserFts(TestCase):
+    """Tests for the full-text index of member names and bios."""
+
+    fixtures = ["auth.json", "test_member_search.json"]
+
+    def setUp(self):
+        if not fts_available():
+            self.skipTest("SQLite FTS5 module is not available")
+
+    def search(self, q_str: str) -> list[str]:
+        rank = build_fts_rank(q_str=q_str, column='"emerald_heart_user"."id"')
+        qs = User.objects.filter(build_fts_qobj(q_str=q_str)).annotate(rank=rank).order_by("rank", "username")
+        return list(qs.values_list("username", flat=True))
+
+    def test_name_and_bio(self):
+        """Names and bios are searched, with prefixes and phrases."""
+        self.assertEqual(["bob"], self.search("brav"))
+        self.assertEqual(["bob", "carol"], self.search("near kc"))
+        self.assertEqual(["dave", "eve"], self.search('"far away"'))
+
+    def test_name_matches_rank_first(self):
+        """A match in the name outranks a match in the bio."""
+        self.assertEqual("alice", self.search("alice")[0])
+
+    def test_index_follows_saves(self):
+        """Renaming a member updates the index."""
+        bob = User.objects.get(username="bob")
+        bob.name = "Robert Zulu"
+        bob.save()
+        self.assertEqual(["bob"], self.search("zulu"))
+        self.assertEqual([], self.search("bravo"))
+
+    def test_index_survives_renumbered_rowids(self):
+        """The index is keyed on search_rowid, so renumbering rowids (as VACUUM may) leaves matches intact."""
+        frank = User.objects.create(username="frank", name="Frank Foxtrot")
+        frank.bio = "Saved again while search_rowid is unset on the instance"
+        frank.save()
+        self.assertIsNotNone(User.objects.get(pk=frank.pk).search_rowid)
+        with connection.cursor() as cursor:
+            cursor.execute("UPDATE emerald_heart_user SET rowid = rowid + 1000")
+        self.assertEqual(["frank"], self.search("foxtrot"))
+        self.assertEqual(["bob"], self.search("brav"))
+
+    def drop_triggers(self) -> None:
+        """Drop the triggers as SQLite does when a migration copies the user table into a new one."""
+        with connection.cursor() as cursor:
+            for trigger in USER_FTS_TRIGGERS:
+                cursor.execute(f"DROP TRIGGER {trigger}")
+
+    def test_check_reports_missing_triggers(self):
+        """The system check fails while triggers are missing; rebuilding the index restores them and reindexes."""
+        self.assertEqual([], check_fts_triggers(None, databases=["default"]))
+        self.drop_triggers()
+        User.objects.filter(username="bob").update(name="Robert Zulu")
+        self.assertEqual(list(USER_FTS_TRIGGERS), missing_triggers())
+        self.assertEqual(
+            ["emerald_heart.E001"], [error.id for error in check_fts_triggers(None, databases=["default"])]
+        )
+
+        call_command("rebuild_search_index", stdout=io.StringIO())
+        self.assertEqual([], check_fts_triggers(None, databases=["default"]))
+        self.assertEqual(["bob"], self.search("zulu"))
+
+    def test_migrate_restores_triggers(self):
+        """Triggers dropped by a migration are recreated once migrations finish."""
+        self.drop_triggers()
+        emit_post_migrate_signal(verbosity=0, interactive=False, db="default")
+        self.assertEqual([], missing_triggers())
+        User.objects.filter(username="bob").update(name="Robert Zulu")
+        self.assertEqual(["bob"], self.search("zulu"))
+
+    def test_fts_target(self):
+        """The full-text index answers for user name fields reached through relations."""
+        self.assertEqual(
+            ("source_user", ("name",), '"emerald_heart_request"."source_user_id"'),
+            EmeraldView.get_fts_target(("source_user__name",), Request),
+        )
+        self.assertEqual(
+            ("pk", ("name", "bio"), '"emerald_heart_user"."id"'), EmeraldView.get_fts_target(("name", "bio"), User)
+        )
+        self.assertIsNone(EmeraldView.get_fts_target(("name",), Location))
+        self.assertIsNone(EmeraldView.get_fts_target(("source_user__name",), None))
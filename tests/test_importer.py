@@ -0,0 +1,262 @@
+from __future__ import annotations
+
+import io
+import json
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+from django.contrib.gis.geos import Point
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection
+from django.test import SimpleTestCase, TestCase
+
+from emerald_heart.management.commands.seed import FIXTURE_DIR
+from emerald_heart.models import AppliedFixture, Location, User
+from emerald_heart.utils import importer
+from emerald_heart.utils.importer import RecordError, parse_point, read_csv, read_geojson, read_ndjson
+from emerald_heart.utils.rtree import USER_RTREE, rtree_available, rtree_key
+from emerald_heart.views.search.search_cache import get_candidate_ids
+
+
+class TestReaders(SimpleTestCase):
+    """Tests for streaming and validating import records."""
+
+    def test_geojson_is_streamed(self):
+        """Features are read one at a time across chunk boundaries."""
+        features = [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [-94 + i, 39]},
+                "properties": {"username": f"user{i}", "bio": "brackets ] and braces { in text"},
+            }
+            for i in range(20)
+        ]
+        document = json.dumps({"type": "FeatureCollection", "features": features}, indent=2)
+        chunk_size, importer.CHUNK_SIZE = importer.CHUNK_SIZE, 16
+        try:
+            records = list(read_geojson(io.StringIO(document)))
+        finally:
+            importer.CHUNK_SIZE = chunk_size
+        self.assertEqual(20, len(records))
+        self.assertEqual(("user3", -91, 39), (records[3]["username"], records[3]["longitude"], records[3]["latitude"]))
+
+    def test_truncated_geojson(self):
+        """A collection cut off mid-feature is an error rather than a silent partial import."""
+        with self.assertRaises(RecordError):
+            list(read_geojson(io.StringIO('{"features": [{"username": "a"}, {"username": ')))
+
+    def test_csv_and_ndjson(self):
+        """Flat records are read from CSV and NDJSON alike; empty CSV cells are dropped."""
+        self.assertEqual(
+            [{"username": "a", "longitude": "1", "latitude": "2"}, {"username": "b"}],
+            list(read_csv(io.StringIO("username,longitude,latitude\na,1,2\nb,,\n"))),
+        )
+        self.assertEqual(
+            [{"username": "a"}, {"username": "b"}],
+            list(read_ndjson(io.StringIO('{"username": "a"}\n\n{"username": "b"}\n'))),
+        )
+
+    def test_parse_point(self):
+        """Coordinates must be finite numbers within range."""
+        self.assertEqual((-94.6, 39.1), parse_point({"longitude": "-94.6", "latitude": "39.1"}))
+        self.assertIsNone(parse_point({}))
+        for record in ({"longitude": "x", "latitude": 1}, {"longitude": 181, "latitude": 1}, {"longitude": "nan"}):
+            with self.assertRaises(RecordError):
+                parse_point(record)
+
+
+class TestImportCommand(TestCase):
+    """Tests for the import_members management command."""
+
+    fixtures = ["auth.json", "test_member_search.json"]
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name: str, text: str) -> str:
+        path = Path(self.directory.name) / name
+        path.write_text(text, encoding="utf-8")
+        return str(path)
+
+    def test_import_users_and_locations(self):
+        """Members and their saved locations are created in batches; invalid rows are skipped."""
+        users = self.write(
+            "users.csv",
+            "username,name,password,longitude,latitude\n"
+            "frank,Frank,secret,-94.605,39.105\n"
+            "grace,Grace,,,\n"
+            "broken,Broken,,500,39\n"
+            "heidi,Heidi,secret,-94.62,39.12\n",
+        )
+        out = io.StringIO()
+        call_command("import_members", users, "--workers=0", "--batch-size=2", "--transaction-size=2", stdout=out)
+        self.assertIn("Finished 3 rows", out.getvalue())
+        self.assertIn("1 rejected", out.getvalue())
+
+        frank = User.objects.get(username="frank")
+        self.assertTrue(frank.check_password("secret"))
+        self.assertAlmostEqual(39.105, frank.current_latitude)
+        self.assertTrue(frank.groups.filter(name="member").exists())
+        self.assertFalse(User.objects.get(username="grace").has_usable_password())
+        self.assertFalse(User.objects.filter(username="broken").exists())
+        self.assertTrue(frank.nearby_set.filter(member__username="alice").exists())
+
+        locations = self.write(
+            "locations.ndjson",
+            '{"type": "Feature", "geometry": {"type": "Point", "coordinates": [-94.7, 39.2]}, '
+            '"properties": {"user": "frank", "name": "Home"}}\n'
+            '{"user": "nobody", "name": "Home", "longitude": 1, "latitude": 1}\n',
+        )
+        call_command("import_members", locations, "--model=location", stdout=io.StringIO())
+        (location,) = Location.objects.filter(user=frank)
+        self.assertEqual(("Home", (-94.7, 39.2)), (location.name, location.location.coords))
+        self.assertTrue(location.geohash)
+
+    def test_rows_are_indexed_per_chunk(self):
+        """Imported members land in the R*Tree without a full rebuild."""
+        if not rtree_available(USER_RTREE):
+            self.skipTest("SQLite rtree module is not available")
+        users = self.write("users.ndjson", '{"username": "frank", "longitude": -94.605, "latitude": 39.105}\n')
+        call_command("import_members", users, "--workers=0", stdout=io.StringIO())
+        frank = User.objects.get(username="frank")
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT min_x, min_y FROM {USER_RTREE} WHERE id = %s", [rtree_key(frank.pk)])
+            self.assertEqual((-94.605, 39.105), tuple(round(value, 3) for value in cursor.fetchone()))
+
+    def test_existing_rows_are_rejected(self):
+        """Rows that already exist are rejected, so an interrupted import can be run again."""
+        users = self.write(
+            "users.ndjson",
+            '{"username": "alice"}\n{"username": "frank"}\n{"username": "frank"}\n{"username": "grace"}\n',
+        )
+        out = io.StringIO()
+        call_command("import_members", users, "--workers=0", "--batch-size=2", stdout=out)
+        self.assertIn("Finished 2 rows", out.getvalue())
+        self.assertIn("2 rejected", out.getvalue())
+
+        out = io.StringIO()
+        call_command("import_members", users, "--workers=0", stdout=out)
+        self.assertIn("Finished 0 rows", out.getvalue())
+        self.assertIn("4 rejected", out.getvalue())
+        self.assertEqual(1, User.objects.filter(username="frank").count())
+
+        locations = self.write(
+            "locations.ndjson",
+            '{"user": "frank", "longitude": -94.7, "latitude": 39.2}\n'
+            '{"user": "grace", "longitude": -94.7, "latitude": 39.2}\n',
+        )
+        call_command("import_members", locations, "--model=location", stdout=io.StringIO())
+        call_command("import_members", locations, "--model=location", stdout=io.StringIO())
+        self.assertEqual(["frank"], list(Location.objects.values_list("user__username", flat=True)))
+
+    def test_database_errors_abort_the_chunk(self):
+        """A database error reports the rows that were not written."""
+        users = self.write("users.ndjson", '{"username": "frank"}\n')
+        with (
+            patch.object(User.objects, "bulk_create", side_effect=IntegrityError("locked")),
+            self.assertRaisesMessage(CommandError, "Rows 1 to 1 were not imported"),
+        ):
+            call_command("import_members", users, "--workers=0", stdout=io.StringIO())
+
+    def test_skipping_the_index_warns(self):
+        """Importing with --no-index says how to index the new rows."""
+        users = self.write("users.ndjson", '{"username": "frank", "longitude": -94.605, "latitude": 39.105}\n')
+        err = io.StringIO()
+        call_command("import_members", users, "--workers=0", "--no-index", stdout=io.StringIO(), stderr=err)
+        self.assertIn("rebuild_spatial_index", err.getvalue())
+        self.assertFalse(User.objects.get(username="frank").nearby_set.exists())
+
+
+class TestSeedCommand(TestCase):
+    """Tests for seeding fixtures by fingerprint."""
+
+    fixtures = ["auth.json"]
+
+    def setUp(self):
+        cache.clear()
+
+    def seed(self, *args: str) -> str:
+        out = io.StringIO()
+        call_command("seed", *args, stdout=out)
+        return out.getvalue()
+
+    def test_unchanged_fixtures_are_skipped(self):
+        """A fixture is loaded once and skipped until its contents change."""
+        self.assertIn("Loaded test_member_search.json", self.seed("test_member_search.json"))
+        alice = User.objects.get(username="alice")
+        self.assertAlmostEqual(39.1, alice.current_latitude)
+        self.assertTrue(alice.groups.filter(name="member").exists())
+        self.assertTrue(alice.nearby_set.filter(member__username="bob").exists())
+        self.assertEqual(1, AppliedFixture.objects.count())
+
+        self.assertIn("Skipped test_member_search.json", self.seed("test_member_search.json"))
+        self.assertIn("Loaded", self.seed("--force", "test_member_search.json"))
+
+    def test_changed_fixtures_are_upserted(self):
+        """Changed rows are updated in place rather than duplicated."""
+        self.seed("test_member_search.json")
+        count = User.objects.count()
+        data = json.loads((FIXTURE_DIR / "test_member_search.json").read_text(encoding="utf-8"))
+        for item in data:
+            if item["model"] == "emerald_heart.user" and item["fields"]["username"] == "bob":
+                item["fields"]["bio"] = "Moved the bio"
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "test_member_search.json"
+            path.write_text(json.dumps(data), encoding="utf-8")
+            self.assertIn("Loaded", self.seed(str(path)))
+
+        self.assertEqual(count, User.objects.count())
+        bob = User.objects.get(username="bob")
+        self.assertEqual("Moved the bio", bob.bio)
+        self.assertTrue(bob.groups.filter(name="member").exists())
+        # Fixtures with the same name in different directories are tracked apart
+        self.assertEqual(2, AppliedFixture.objects.count())
+
+    def test_moved_members_invalidate_cached_searches(self):
+        """Cached candidate lists of the regions a seeded member leaves and enters are dropped."""
+        self.seed("test_member_search.json")
+        kansas_city, new_york = Point(-94.6, 39.1, srid=4326), Point(-74.0, 40.7, srid=4326)
+        bob = User.objects.get(username="bob")
+
+        def candidates(location):
+            return set(json.loads(get_candidate_ids(location, 5)))
+
+        self.assertIn(bob.pk.hex, candidates(kansas_city))
+        self.assertNotIn(bob.pk.hex, candidates(new_york))
+
+        data = json.loads((FIXTURE_DIR / "test_member_search.json").read_text(encoding="utf-8"))
+        data = [item for item in data if item["fields"].get("username") == "bob"]
+        data[0]["fields"]["current_location"] = "SRID=4326;POINT (-74.0 40.7)"
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "bob.json"
+            path.write_text(json.dumps(data), encoding="utf-8")
+            self.seed(str(path))
+
+        self.assertNotIn(bob.pk.hex, candidates(kansas_city))
+        self.assertIn(bob.pk.hex, candidates(new_york))
+
+    def test_only_seeded_rows_are_indexed(self):
+        """Seeding indexes the rows it wrote rather than rebuilding every index."""
+        self.seed("test_member_search.json")
+        data = json.loads((FIXTURE_DIR / "test_member_search.json").read_text(encoding="utf-8"))
+        data = [item for item in data if item["fields"].get("username") == "bob"]
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "bob.json"
+            path.write_text(json.dumps(data), encoding="utf-8")
+            with (
+                patch("emerald_heart.management.commands.seed.refresh_nearby_many") as refresh,
+                patch("emerald_heart.views.search.nearby.rebuild_nearby") as rebuild,
+            ):
+                self.seed(str(path))
+        rebuild.assert_not_called()
+        self.assertEqual(["bob"], [user.username for user in refresh.call_args.args[0]])
+
+        if rtree_available(USER_RTREE):
+            bob = User.objects.get(username="bob")
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT uuid FROM {USER_RTREE} WHERE id = %s", [rtree_key(bob.pk)])
+                self.assertEqual((bob.pk.hex,), cursor.fetchone())
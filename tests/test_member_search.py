@@ -1,10 +1,45 @@
 from __future__ import annotations
 
+import json
+import math
+from datetime import UTC, datetime, timedelta
+from importlib.util import find_spec
+from unittest import skipIf
+from unittest.mock import patch
+from uuid import uuid4
+
+from django.conf import settings
 from django.contrib.gis.geos import Point
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.template.backends.django import Template
+from django.test import TestCase, override_settings
+from django.urls import reverse
 
-from emerald_heart.models import User
-from emerald_heart.views.search.search_service import get_all_members, get_member_by_id, get_members
+from emerald_heart.models import Location, LocationHistoryBlock, NearbyMember, Request, User
+from emerald_heart.utils.cache import bump_version
+from emerald_heart.utils.fts import count_prefix_documents, fts_available
+from emerald_heart.utils.location_history import append_history, compact_history, get_history
+from emerald_heart.utils.query import Haversine
+from emerald_heart.utils.render import render_fragments
+from emerald_heart.utils.rtree import USER_RTREE, rtree_available, rtree_key
+from emerald_heart.utils.spatial import geohash_encode
+from emerald_heart.views.search import geo_engine
+from emerald_heart.views.search.autocomplete import NAME_INDEX, VERSION_KEY, NameIndex
+from emerald_heart.views.search.location_buffer import LocationBuffer, get_current_location, record_location
+from emerald_heart.views.search.nearby import rebuild_nearby
+from emerald_heart.views.search.planner import AREA_FIRST, TEXT_FIRST, choose_plan, estimate_text_matches
+from emerald_heart.views.search.search_cache import get_candidate_ids, invalidate_moved
+from emerald_heart.views.search.search_forms import ANY_LOCATION
+from emerald_heart.views.search.search_service import (
+    get_all_members,
+    get_member_by_id,
+    get_member_page,
+    get_members,
+    get_nearest_members,
+    get_radius_counts,
+)
+from emerald_heart.views.search.sent_requests import SentRequests, get_sent_requests
 
 
 class TestSearchService(TestCase):
@@ -13,6 +48,7 @@ class TestSearchService(TestCase):
     fixtures = ["auth.json", "test_member_search.json"]
 
     def setUp(self):
+        cache.clear()
         self.alice = User.objects.get(username="alice")
         self.bob = User.objects.get(username="bob")
         self.carol = User.objects.get(username="carol")
@@ -62,7 +98,7 @@ class TestSearchService(TestCase):
 
     def test_get_members_spatial_includes_nearby(self):
         """A 5-mile search around KC should include bob and carol."""
-        location = Point(-94.6, 39.1, srid=3857)
+        location = Point(-94.6, 39.1, srid=4326)
         members = get_members(location=location, distance=5, current_user=self.alice)
         usernames = {m.username for m in members}
         self.assertIn("bob", usernames)
@@ -70,7 +106,7 @@ class TestSearchService(TestCase):
 
     def test_get_members_spatial_excludes_distant(self):
         """A 5-mile search around KC should exclude NY and LA users."""
-        location = Point(-94.6, 39.1, srid=3857)
+        location = Point(-94.6, 39.1, srid=4326)
         members = get_members(location=location, distance=5, current_user=self.alice)
         usernames = {m.username for m in members}
         self.assertNotIn("dave", usernames)
@@ -78,7 +114,7 @@ class TestSearchService(TestCase):
 
     def test_get_members_spatial_excludes_current_user_and_admin(self):
         """Spatial results exclude the searcher and admin regardless of location."""
-        location = Point(-94.6, 39.1, srid=3857)
+        location = Point(-94.6, 39.1, srid=4326)
         members = get_members(location=location, distance=5, current_user=self.alice)
         usernames = {m.username for m in members}
         self.assertNotIn("alice", usernames)
@@ -86,14 +122,14 @@ class TestSearchService(TestCase):
 
     def test_get_members_spatial_annotates_has_sent_request(self):
         """Spatial results should carry has_sent_request."""
-        location = Point(-94.6, 39.1, srid=3857)
+        location = Point(-94.6, 39.1, srid=4326)
         members = get_members(location=location, distance=5, current_user=self.alice)
         for member in members:
             self.assertTrue(hasattr(member, "has_sent_request"))
 
     def test_get_members_spatial_request_sent_values(self):
         """Spatial results have correct has_sent_request values."""
-        location = Point(-94.6, 39.1, srid=3857)
+        location = Point(-94.6, 39.1, srid=4326)
         members = get_members(location=location, distance=5, current_user=self.alice)
         self.assertTrue(members.get(username="bob").has_sent_request)
         self.assertFalse(members.get(username="carol").has_sent_request)
@@ -113,7 +149,7 @@ class TestSearchService(TestCase):
 
     def test_get_members_no_distance_falls_back_to_all(self):
         """When distance is None get_members delegates to get_all_members."""
-        location = Point(-94.6, 39.1, srid=3857)
+        location = Point(-94.6, 39.1, srid=4326)
         members = get_members(location=location, distance=None, current_user=self.alice)
         usernames = {m.username for m in members}
         expected = {"bob", "carol", "dave", "eve"}
@@ -123,7 +159,7 @@ class TestSearchService(TestCase):
 
     def test_get_members_no_current_user_spatial(self):
         """Spatial search without current_user should not exclude or annotate."""
-        location = Point(-94.6, 39.1, srid=3857)
+        location = Point(-94.6, 39.1, srid=4326)
         members = get_members(location=location, distance=5, current_user=None)
         usernames = {m.username for m in members}
 
@@ -133,6 +169,134 @@ class TestSearchService(TestCase):
         self.assertIn("carol", usernames)
         self.assertNotIn("admin", usernames)
 
+    def test_fixture_users_have_geohash(self):
+        """Geohashes are computed for users loaded from fixtures."""
+        self.bob.refresh_from_db()
+        self.assertTrue(self.bob.current_geohash.startswith("9yu"))
+
+    def test_get_members_geohash_updated_on_save(self):
+        """Moving a user recomputes their geohash so radius searches find them in the new spot."""
+        location = Point(-94.6, 39.1, srid=4326)
+        self.dave.current_location = Point(-94.6, 39.1, srid=4326)
+        self.dave.save(update_fields=["current_location"])
+        self.dave.refresh_from_db()
+        self.assertTrue(self.dave.current_geohash.startswith("9yu"))
+        members = get_members(location=location, distance=5, current_user=self.alice)
+        self.assertIn("dave", {m.username for m in members})
+
+    def test_get_nearest_members_orders_by_distance(self):
+        """Nearest results are sorted closest first and carry their distance."""
+        location = Point(-94.6, 39.1, srid=4326)
+        members = get_nearest_members(location=location, limit=3, current_user=self.alice)
+        self.assertEqual(3, len(members))
+        self.assertEqual({"bob", "carol"}, {m.username for m in members[:2]})
+        self.assertEqual("dave", members[2].username)
+        distances = [m.distance.m for m in members]
+        self.assertEqual(sorted(distances), distances)
+        self.assertAlmostEqual(1.4, members[0].distance.km, places=1)
+
+    def test_get_nearest_members_expands_until_limit(self):
+        """The search ring grows past the starting radius to find enough members."""
+        location = Point(-94.6, 39.1, srid=4326)
+        members = get_nearest_members(location=location, limit=4, current_user=self.alice)
+        self.assertEqual(["dave", "eve"], [m.username for m in members[2:]])
+        self.assertNotIn("admin", {m.username for m in members})
+
+    def test_get_nearest_members_annotates_has_sent_request(self):
+        """Nearest results carry has_sent_request."""
+        location = Point(-94.6, 39.1, srid=4326)
+        members = {m.username: m for m in get_nearest_members(location=location, limit=2, current_user=self.alice)}
+        self.assertTrue(members["bob"].has_sent_request)
+        self.assertFalse(members["carol"].has_sent_request)
+
+    def test_get_member_page_orders_by_distance(self):
+        """Pages are ordered nearest first and every member carries a distance."""
+        location = Point(-94.6, 39.1, srid=4326)
+        members, cursor = get_member_page(location=location, distance=5, current_user=self.alice)
+        self.assertEqual(["bob", "carol"], [m.username for m in members])
+        self.assertIsNone(cursor)
+        self.assertTrue(members[0].has_sent_request)
+        self.assertFalse(members[1].has_sent_request)
+
+    def test_get_member_page_follows_cursor(self):
+        """Walking the cursors returns every member exactly once, in order."""
+        location = Point(-94.6, 39.1, srid=4326)
+        seen = []
+        cursor = None
+        while True:
+            members, cursor = get_member_page(
+                location=location, distance=5000, current_user=self.alice, cursor=cursor, per_page=1
+            )
+            seen.extend(m.username for m in members)
+            if cursor is None:
+                break
+        self.assertEqual(["bob", "carol", "dave", "eve"], seen)
+
+    def test_get_member_page_without_location_orders_by_id(self):
+        """Without a search area pages cover every member once, ordered by id."""
+        seen = []
+        cursor = None
+        while True:
+            members, cursor = get_member_page(current_user=self.alice, cursor=cursor, per_page=2)
+            seen.extend(members)
+            if cursor is None:
+                break
+        expected = list(get_all_members(current_user=self.alice).order_by("id"))
+        self.assertEqual(expected, seen)
+
+    def test_get_member_page_rejects_tampered_cursor(self):
+        """A cursor that wasn't issued by the server raises ValueError."""
+        location = Point(-94.6, 39.1, srid=4326)
+        _, cursor = get_member_page(location=location, distance=5000, current_user=self.alice, per_page=1)
+        with self.assertRaises(ValueError):
+            get_member_page(location=location, distance=5000, current_user=self.alice, cursor=f"{cursor}x")
+
+    def test_get_member_page_multiple_origins(self):
+        """Searching several origins returns each member once at the distance to the closest origin."""
+        origins = [Point(-94.6, 39.1, srid=4326), Point(-94.6, 39.1, srid=4326), Point(-118.2, 34.1, srid=4326)]
+        members, _ = get_member_page(distance=5, current_user=self.alice, origins=origins)
+        self.assertEqual(["eve", "bob", "carol"], [m.username for m in members])
+        self.assertAlmostEqual(0, members[0].distance.m, places=3)
+        self.assertAlmostEqual(1407, members[1].distance.m, delta=5)
+
+    def test_get_nearest_members_multiple_origins(self):
+        """Nearest members are measured from the closest origin."""
+        origins = [Point(-74.0, 40.7, srid=4326), Point(-118.2, 34.1, srid=4326)]
+        members = get_nearest_members(location=None, limit=2, current_user=self.alice, origins=origins)
+        self.assertEqual({"dave", "eve"}, {m.username for m in members})
+
+    def test_get_radius_counts(self):
+        """Every distance band is counted, including members beyond the selected distance."""
+        self.dave.current_location = Point(-94.6, 40.0, srid=4326)  # About 62 miles north
+        self.dave.save()
+        location = Point(-94.6, 39.1, srid=4326)
+        counts = get_radius_counts([location], (5, 10, 50, 100, 500), current_user=self.alice)
+        self.assertEqual([(5, 2), (10, 2), (50, 2), (100, 3), (500, 3)], counts)
+
+    def test_fixture_users_have_coordinates(self):
+        """Coordinate and ECEF columns mirror the location point."""
+        self.assertAlmostEqual(-94.61, self.bob.current_longitude)
+        self.assertAlmostEqual(39.11, self.bob.current_latitude)
+        ecef = (self.bob.current_ecef_x, self.bob.current_ecef_y, self.bob.current_ecef_z)
+        self.assertAlmostEqual(6_371_008.8, math.hypot(*ecef), delta=1e-3)
+
+    def test_haversine_sql_function(self):
+        """Distances are computed in SQL, in meters."""
+        members = User.objects.annotate(meters=Haversine("current_longitude", "current_latitude", -94.6, 39.1))
+        self.assertAlmostEqual(1407, members.get(username="bob").meters, delta=5)
+        self.assertIsNone(members.get(username="john").meters)
+
+    def test_get_members_uses_true_distance(self):
+        """Radius searches far from the equator include and exclude members by true distance."""
+        self.bob.current_location = Point(10.142, 60.0, srid=4326)  # About 7.9km east
+        self.bob.save()
+        self.carol.current_location = Point(10.15, 60.0, srid=4326)  # About 8.3km east
+        self.carol.save()
+        members = get_members(location=Point(10.0, 60.0, srid=4326), distance=5, current_user=self.alice)
+        self.assertEqual({"bob"}, {m.username for m in members})
+        page, _ = get_member_page(location=Point(10.0, 60.0, srid=4326), distance=5, current_user=self.alice)
+        self.assertEqual(["bob"], [m.username for m in page])
+
     def test_get_member_by_id_returns_user(self):
         """Should return the matching User instance."""
         member = get_member_by_id(self.bob.id)
@@ -144,3 +308,541 @@ class TestSearchService(TestCase):
 
         with self.assertRaises(Http404):
             get_member_by_id("99999999-9999-4999-9999-999999999999")
+
+
+class TestSavedLocationSearch(TestCase):
+    """Tests for searching around saved locations written in Web-Mercator."""
+
+    fixtures = ["auth.json", "test_member_search.json", "test_saved_locations.json"]
+
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.get(username="alice")
+        self.client.force_login(self.alice)
+
+    def search(self, **data) -> list[str]:
+        response = self.client.post(reverse("member-search"), {"distance": 5, "mode": "radius", **data})
+        self.assertEqual(200, response.status_code)
+        return [member.username for member in response.context["member_list"]]
+
+    def test_mercator_fixture_is_stored_as_degrees(self):
+        """Saved locations loaded in EPSG:3857 are stored, hashed and indexed as degrees."""
+        location = Location.objects.get(name="Beach House")
+        self.assertAlmostEqual(-118.2, location.longitude, places=6)
+        self.assertAlmostEqual(34.1, location.latitude, places=6)
+        self.assertEqual(geohash_encode(-118.2, 34.1), location.geohash)
+
+    def test_search_around_saved_locations(self):
+        """Radius and nearest searches around saved places find the members there."""
+        beach = Location.objects.get(name="Beach House")
+        self.assertEqual(["eve"], self.search(location=str(beach.pk)))
+        self.assertEqual({"dave", "eve"}, set(self.search(location=ANY_LOCATION)))
+        self.assertEqual(["eve"], self.search(location=str(beach.pk), mode="nearest", limit=10)[:1])
+
+
+class TestUserRtree(TestCase):
+    """Tests for the R*Tree mirror of user locations."""
+
+    fixtures = ["auth.json", "test_member_search.json"]
+
+    def setUp(self):
+        if not rtree_available(USER_RTREE):
+            self.skipTest("SQLite rtree module is not available")
+        self.bob = User.objects.get(username="bob")
+
+    def get_entry(self, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT min_x, min_y, uuid FROM {USER_RTREE} WHERE id = %s", [rtree_key(pk)])
+            return cursor.fetchone()
+
+    def test_fixture_users_are_indexed(self):
+        """Users loaded from fixtures are mirrored into the R*Tree."""
+        min_x, min_y, uuid = self.get_entry(self.bob.pk)
+        self.assertAlmostEqual(-94.61, min_x, places=4)
+        self.assertAlmostEqual(39.11, min_y, places=4)
+        self.assertEqual(self.bob.pk.hex, uuid)
+
+    def test_move_updates_entry(self):
+        """Saving a new location moves the R*Tree entry."""
+        self.bob.current_location = Point(-73.9, 40.7, srid=4326)
+        self.bob.save()
+        min_x, min_y, _ = self.get_entry(self.bob.pk)
+        self.assertAlmostEqual(-73.9, min_x, places=4)
+        self.assertAlmostEqual(40.7, min_y, places=4)
+
+    def test_delete_removes_entry(self):
+        """Deleting a user removes the R*Tree entry."""
+        pk = self.bob.pk
+        self.bob.delete()
+        self.assertIsNone(self.get_entry(pk))
+
+
+class TestSearchCache(TestCase):
+    """Tests for the grid cell cache of search candidates."""
+
+    fixtures = ["auth.json", "test_member_search.json"]
+
+    def setUp(self):
+        cache.clear()
+        self.location = Point(-94.6, 39.1, srid=4326)
+        self.bob = User.objects.get(username="bob")
+        self.dave = User.objects.get(username="dave")
+
+    def get_usernames(self, distance):
+        ids = json.loads(get_candidate_ids(self.location, distance))
+        return set(User.objects.filter(id__in=ids).values_list("username", flat=True))
+
+    def test_candidates_cover_nearby_members(self):
+        """Candidate lists hold every nearby member, including the searcher, but not admin or distant members."""
+        usernames = self.get_usernames(5)
+        self.assertTrue({"alice", "bob", "carol"}.issubset(usernames))
+        self.assertNotIn("admin", usernames)
+        self.assertNotIn("dave", usernames)
+
+    def test_uncached_distance(self):
+        """Distances that aren't offered by the search form aren't cached."""
+        self.assertIsNone(get_candidate_ids(self.location, 7))
+
+    def test_candidates_are_reused(self):
+        """A cached list is served until it is invalidated, even if members move."""
+        self.get_usernames(5)
+        self.dave.current_location = Point(-94.6, 39.1, srid=4326)
+        self.dave.save()
+        self.assertNotIn("dave", self.get_usernames(5))
+
+    def test_move_into_region_invalidates(self):
+        """A member moving into a cached region drops its list."""
+        self.get_usernames(5)
+        previous = self.dave.current_location
+        self.dave.current_location = Point(-94.6, 39.1, srid=4326)
+        self.dave.save()
+        invalidate_moved(previous, self.dave.current_location)
+        self.assertIn("dave", self.get_usernames(5))
+
+    def test_move_out_of_region_invalidates(self):
+        """A member leaving a cached region drops its list."""
+        self.get_usernames(5)
+        previous = self.bob.current_location
+        self.bob.current_location = Point(-74.0, 40.7, srid=4326)
+        self.bob.save()
+        invalidate_moved(previous, self.bob.current_location)
+        self.assertNotIn("bob", self.get_usernames(5))
+
+
+class TestSentRequests(TestCase):
+    """Tests for the packed ids of members a user has sent requests to."""
+
+    fixtures = ["auth.json", "test_member_search.json"]
+
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.get(username="alice")
+        self.bob = User.objects.get(username="bob")
+        self.carol = User.objects.get(username="carol")
+        self.dave = User.objects.get(username="dave")
+
+    def test_packed_membership(self):
+        """Packed ids answer membership tests."""
+        ids = [uuid4() for _ in range(50)]
+        sent = SentRequests.from_ids(ids[:25])
+        self.assertEqual(25, len(sent))
+        self.assertTrue(all(pk in sent for pk in ids[:25]))
+        self.assertFalse(any(pk in sent for pk in ids[25:]))
+        self.assertNotIn(uuid4(), SentRequests())
+
+    def test_loaded_from_requests(self):
+        """The ids come from the users outgoing requests."""
+        sent = get_sent_requests(self.alice.pk)
+        self.assertIn(self.bob.pk, sent)
+        self.assertIn(self.dave.pk, sent)
+        self.assertNotIn(self.carol.pk, sent)
+
+    def test_new_request_resets_ids(self):
+        """Creating and deleting requests is reflected in the ids."""
+        get_sent_requests(self.alice.pk)
+        request = Request.objects.create(source_user=self.alice, dest_user=self.carol)
+        self.assertIn(self.carol.pk, get_sent_requests(self.alice.pk))
+        request.delete()
+        self.assertNotIn(self.carol.pk, get_sent_requests(self.alice.pk))
+
+    def test_members_queryset_sets_flag(self):
+        """Members from the search service carry has_sent_request without a subquery."""
+        members = get_all_members(current_user=self.alice)
+        self.assertNotIn("EXISTS", str(members.query))
+        self.assertTrue(members.get(username="bob").has_sent_request)
+        self.assertFalse(members.get(username="carol").has_sent_request)
+
+
+class TestNameIndex(TestCase):
+    """Tests for the in-memory member name index used for autocomplete."""
+
+    fixtures = ["auth.json", "test_member_search.json"]
+
+    def setUp(self):
+        cache.clear()
+        self.index = NameIndex()
+        self.alice = User.objects.get(username="alice")
+        self.bob = User.objects.get(username="bob")
+
+    def names(self, prefix: str, **kwargs) -> list[str]:
+        return [name for _, name in self.index.search(prefix, **kwargs)]
+
+    def test_prefix_of_any_word(self):
+        """Names match on a case-insensitive prefix of any word."""
+        self.assertEqual(["Bob Bravo"], self.names("BRA"))
+        self.assertEqual(["Bob Bravo"], self.names("bob  b"))
+        self.assertEqual([], self.names("   "))
+
+    def test_exclusions(self):
+        """The searcher can be excluded and admin is never indexed."""
+        admin = User.objects.get(username="admin")
+        self.assertEqual([], self.names("alice", exclude=self.alice.pk))
+        self.assertNotIn(admin.pk, {pk for pk, _ in self.index.search(admin.name, limit=100)})
+
+    def test_local_saves_apply_incrementally(self):
+        """Saves in this process update the loaded index without a reload."""
+        self.index.load()
+        version = self.index.version
+        self.index.update(self.bob.pk, self.bob.username, "Robert Zulu")
+        self.assertEqual(version + 1, self.index.version)
+        self.assertEqual(["Robert Zulu"], self.names("zul"))
+        self.assertEqual([], self.names("bravo"))
+        self.index.remove(self.bob.pk)
+        self.assertEqual([], self.names("robert"))
+
+    def test_other_process_changes_reload(self):
+        """A version bump from elsewhere makes the first lookup after the check interval reload from the database."""
+        self.index.load()
+        User.objects.filter(pk=self.bob.pk).update(name="Robert Zulu")
+        self.assertEqual(["Bob Bravo"], self.names("bravo"))
+        bump_version(VERSION_KEY)
+        with patch("emerald_heart.views.search.autocomplete.get_version") as get_version:
+            self.assertEqual(["Bob Bravo"], self.names("bravo"))
+        get_version.assert_not_called()
+        self.index.checked -= settings.MEMBER_NAME_INDEX_CHECK_INTERVAL
+        self.assertEqual(["Robert Zulu"], self.names("zulu"))
+
+    def test_signals_update_shared_index(self):
+        """Saving a member updates the process wide index once committed."""
+        self.bob.name = "Robert Zulu"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bob.save()
+        self.assertEqual(["Robert Zulu"], [name for _, name in NAME_INDEX.search("zulu")])
+
+
+@skipIf(find_spec("numpy") is None, "NumPy is not installed")
+class TestGeoEngine(TestCase):
+    """Tests for the optional in-memory search engine."""
+
+    fixtures = ["auth.json", "test_member_search.json"]
+
+    def setUp(self):
+        cache.clear()
+        geo_engine._engine = None
+        self.engine = geo_engine.GeoEngine()
+        self.location = Point(-94.6, 39.1, srid=4326)
+        self.alice = User.objects.get(username="alice")
+        self.bob = User.objects.get(username="bob")
+
+    def usernames(self, pairs) -> list[str]:
+        names = dict(User.objects.values_list("id", "username"))
+        return [names[pk] for _, pk in pairs]
+
+    def test_within(self):
+        """Radius searches return members inside the distance with their distances."""
+        pairs = sorted(self.engine.within([self.location], 5000, exclude=self.alice.pk))
+        self.assertEqual(["bob", "carol"], self.usernames(pairs))
+        self.assertAlmostEqual(1407, pairs[0][0], delta=5)
+
+    def test_nearest(self):
+        """Nearest searches are ordered by distance and skip the searcher and admin."""
+        pairs = self.engine.nearest([self.location], 10, exclude=self.alice.pk)
+        self.assertEqual(["bob", "carol", "dave", "eve"], self.usernames(pairs))
+
+    def test_changes_are_replayed(self):
+        """Changes recorded by another process are replayed on the next search."""
+        self.engine.load()
+        other = geo_engine.GeoEngine()
+        other.record(self.bob.pk, "bob", (-74.0, 40.7))
+        other.record(self.alice.pk, "alice", None)
+        self.assertEqual(["carol"], self.usernames(self.engine.within([self.location], 5000)))
+
+    @override_settings(MEMBER_SEARCH_ENGINE="numpy")
+    def test_member_page_matches_database(self):
+        """The engine answers member pages the same way the database does."""
+        members, _ = get_member_page(location=self.location, distance=5000, current_user=self.alice)
+        self.assertEqual(["bob", "carol", "dave", "eve"], [m.username for m in members])
+
+    @override_settings(MEMBER_SEARCH_ENGINE="numpy")
+    def test_deleted_members_are_skipped(self):
+        """Members deleted before the engine replays the change are left out instead of failing the search."""
+        geo_engine.get_engine().load()
+        self.bob.delete()  # The engine only hears about it once the delete commits
+        members, _ = get_member_page(location=self.location, distance=5000, current_user=self.alice)
+        self.assertEqual(["carol", "dave", "eve"], [m.username for m in members])
+        nearest = get_nearest_members(location=self.location, limit=2, current_user=self.alice)
+        self.assertEqual(["carol"], [m.username for m in nearest])
+
+    @override_settings(MEMBER_SEARCH_ENGINE="numpy")
+    def test_radius_counts_match_database(self):
+        """The engine buckets members into distance bands."""
+        counts = get_radius_counts([self.location], (5, 1000, 5000), current_user=self.alice)
+        self.assertEqual([(5, 2), (1000, 2), (5000, 4)], counts)
+
+
+class TestNearbyMembers(TestCase):
+    """Tests for the nearby members table."""
+
+    fixtures = ["auth.json", "test_member_search.json"]
+
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.get(username="alice")
+        self.bob = User.objects.get(username="bob")
+        self.dave = User.objects.get(username="dave")
+
+    def nearby(self, user: User) -> dict[str, int]:
+        rows = NearbyMember.objects.filter(user=user).select_related("member")
+        return {row.member.username: row.band for row in rows}
+
+    def test_fixture_pairs(self):
+        """Close pairs are stored in both directions with their band."""
+        self.assertEqual({"bob": 5, "carol": 5}, self.nearby(self.alice))
+        self.assertEqual({"alice": 5, "carol": 5}, self.nearby(self.bob))
+        self.assertEqual({}, self.nearby(self.dave))
+
+    def test_moving_updates_neighbourhood(self):
+        """Moving replaces the pairs of the member who moved, on both sides."""
+        self.bob.current_location = Point(-73.9, 40.7, srid=4326)  # About 5.2 miles from dave
+        self.bob.save(update_fields=["current_location"])
+        self.assertEqual({"carol": 5}, self.nearby(self.alice))
+        self.assertEqual({"dave": 10}, self.nearby(self.bob))
+        self.assertEqual({"bob": 10}, self.nearby(self.dave))
+
+    def test_profile_saves_leave_table_alone(self):
+        """Saves that don't move the member (profile edits, logins) don't rewrite the neighbourhood."""
+        with patch("emerald_heart.signals.refresh_nearby") as refresh:
+            self.bob.bio = "A new bio"
+            self.bob.save()
+            User.objects.get(pk=self.bob.pk).save()
+            refresh.assert_not_called()
+            self.bob.current_location = Point(-73.9, 40.7, srid=4326)
+            self.bob.save()
+            refresh.assert_called_once()
+
+    def test_rebuild_matches_incremental(self):
+        """Rebuilding the table gives the same rows as incremental maintenance."""
+        before = set(NearbyMember.objects.values_list("user_id", "member_id", "band"))
+        rebuild_nearby()
+        self.assertEqual(before, set(NearbyMember.objects.values_list("user_id", "member_id", "band")))
+
+    def test_searches_read_table(self):
+        """Small-radius searches around the searchers location use the table and match the live results."""
+        location = self.alice.current_location
+        NearbyMember.objects.filter(user=self.alice, member=self.bob).delete()
+        self.assertEqual({"carol"}, {m.username for m in get_members(location, 5, current_user=self.alice)})
+        members, _ = get_member_page(location=location, distance=5, current_user=self.alice)
+        self.assertEqual(["carol"], [m.username for m in members])
+        members, _ = get_member_page(location=location, distance=50, current_user=self.alice)
+        self.assertEqual(["bob", "carol"], [m.username for m in members])
+
+
+class TestKeywordSearch(TestCase):
+    """Tests for searches combining keywords with a radius."""
+
+    fixtures = ["auth.json", "test_member_search.json"]
+
+    def setUp(self):
+        if not fts_available():
+            self.skipTest("SQLite FTS5 module is not available")
+        cache.clear()
+        self.alice = User.objects.get(username="alice")
+        self.location = Point(-94.6, 39.1, srid=4326)
+
+    def usernames(self, q: str, distance: int) -> list[str]:
+        members, _ = get_member_page(location=self.location, distance=distance, current_user=self.alice, q=q)
+        return [m.username for m in members]
+
+    def test_term_statistics(self):
+        """Term counts come from the index vocabulary; the rarest word bounds the estimate."""
+        self.assertEqual(2, count_prefix_documents("near"))
+        self.assertEqual(2, estimate_text_matches("alice near"))
+        self.assertIsNone(estimate_text_matches("-- !!"))
+
+    def test_plan_follows_selectivity(self):
+        """Small areas drive from the spatial index and large ones from the text index."""
+        self.assertEqual(AREA_FIRST, choose_plan("far", [self.location], 8000))
+        self.assertEqual(TEXT_FIRST, choose_plan("far", [self.location], 8_000_000))
+
+    def test_both_plans_filter_the_same(self):
+        """Keyword results are the same whichever index drives."""
+        self.assertEqual(["bob", "carol"], self.usernames("alice", 20))  # Answered from the nearby members table
+        self.assertEqual(["bob", "carol"], self.usernames("alice", 50))
+        self.assertEqual(["bob", "carol", "dave", "eve"], self.usernames("alice", 5000))
+        self.assertEqual(["bob", "dave"], self.usernames("has request", 5000))
+        self.assertEqual(["bob"], self.usernames("has", 5))
+
+    def test_counts_and_nearest_use_keywords(self):
+        """Distance counts and nearest searches only include matching members."""
+        counts = get_radius_counts([self.location], (5, 5000), current_user=self.alice, q="has")
+        self.assertEqual([(5, 1), (5000, 2)], counts)
+        members = get_nearest_members(location=self.location, limit=1, current_user=self.alice, q="far")
+        self.assertEqual(["dave"], [m.username for m in members])
+
+
+class TestLocationBuffer(TestCase):
+    """Tests for buffering location pings."""
+
+    fixtures = ["auth.json", "test_member_search.json"]
+
+    def setUp(self):
+        cache.clear()
+        self.buffer = LocationBuffer(start_thread=False)
+        self.alice = User.objects.get(username="alice")
+        self.bob = User.objects.get(username="bob")
+
+    def test_pings_are_coalesced(self):
+        """Only the newest ping is written and the member sees it before it is."""
+        self.buffer.add(self.bob.pk, Point(-80.0, 35.0, srid=4326))
+        self.buffer.add(self.bob.pk, Point(-73.9, 40.7, srid=4326))
+        self.assertEqual((-73.9, 40.7), get_current_location(self.bob).coords)
+        self.assertAlmostEqual(-94.61, User.objects.get(pk=self.bob.pk).current_longitude)
+
+        self.assertEqual(1, self.buffer.flush())
+        self.assertEqual(0, self.buffer.flush())
+        bob = User.objects.get(pk=self.bob.pk)
+        self.assertEqual((-73.9, 40.7), bob.current_location.coords)
+        self.assertAlmostEqual(-73.9, bob.current_longitude)
+
+    def test_flush_updates_indexes(self):
+        """The R*Tree and nearby members follow buffered writes without replaying each member's save signals."""
+        self.buffer.add(self.bob.pk, Point(-73.9, 40.7, srid=4326))
+        with patch("emerald_heart.signals.refresh_nearby") as refresh_nearby:
+            self.buffer.flush()
+        refresh_nearby.assert_not_called()
+        self.assertFalse(NearbyMember.objects.filter(user=self.alice, member=self.bob).exists())
+        members, _ = get_member_page(location=Point(-74.0, 40.7, srid=4326), distance=50, current_user=self.alice)
+        self.assertEqual(["dave", "bob"], [m.username for m in members])
+
+    @override_settings(MEMBER_LOCATION_FLUSH_INTERVAL=0)
+    def test_unbuffered(self):
+        """Without an interval pings are written as they arrive."""
+        record_location(self.bob, Point(-73.9, 40.7, srid=4326))
+        self.assertEqual((-73.9, 40.7), User.objects.get(pk=self.bob.pk).current_location.coords)
+
+
+@override_settings(
+    MEMBER_LOCATION_HISTORY_BLOCK_SIZE=4,
+    MEMBER_LOCATION_HISTORY_RAW_DAYS=30,
+    MEMBER_LOCATION_HISTORY_RESOLUTION=3600,
+    MEMBER_LOCATION_HISTORY_RETENTION_DAYS=365,
+)
+class TestLocationHistory(TestCase):
+    """Tests for the location history store."""
+
+    fixtures = ["auth.json", "test_member_search.json"]
+
+    def setUp(self):
+        self.bob = User.objects.get(username="bob")
+        self.start = datetime(2026, 1, 1, tzinfo=UTC)
+
+    def test_append_and_query(self):
+        """Pings are appended as their own blocks, merged on compaction, and range queries return them in order."""
+        for minute in range(10):
+            when = self.start + timedelta(minutes=minute)
+            append_history({self.bob.pk: (-94.61 + minute / 1000, 39.11)}, when=when)
+        counts = self.bob.location_history.order_by("started").values_list("count", flat=True)
+        self.assertEqual([1] * 10, list(counts))
+        self.assertEqual(10, len(get_history(self.bob, self.start, self.start + timedelta(hours=1))))
+
+        self.assertEqual((10, 0, 0), compact_history(now=self.start + timedelta(days=1)))
+        self.assertEqual([4, 4, 2], list(counts.all()))
+        points = get_history(self.bob, self.start + timedelta(minutes=3), self.start + timedelta(minutes=5))
+        self.assertEqual([3, 4, 5], [int((p.when - self.start).total_seconds() // 60) for p in points])
+        self.assertAlmostEqual(-94.606, points[1].longitude)
+        self.assertEqual(1, len(get_history(self.bob, self.start, self.start + timedelta(hours=1), resolution=3600)))
+
+    def test_compact(self):
+        """Recent pings are merged, aged history is downsampled and expired history deleted."""
+        for hour in range(6):
+            for minute in (0, 30):
+                when = self.start + timedelta(hours=hour, minutes=minute)
+                append_history({self.bob.pk: (-94.61, 39.11)}, when=when)
+
+        self.assertEqual((12, 0, 0), compact_history(now=self.start + timedelta(days=1)))
+        self.assertEqual((0, 3, 0), compact_history(now=self.start + timedelta(days=40)))
+        points = get_history(self.bob, self.start, self.start + timedelta(days=1))
+        self.assertEqual(6, len(points))
+        self.assertEqual({3600}, set(LocationHistoryBlock.objects.values_list("resolution", flat=True)))
+
+        self.assertEqual((0, 0, 2), compact_history(now=self.start + timedelta(days=400)))
+        self.assertFalse(LocationHistoryBlock.objects.exists())
+
+    def test_buffered_pings_are_recorded(self):
+        """Flushing the location buffer appends to the history."""
+        buffer = LocationBuffer(start_thread=False)
+        buffer.add(self.bob.pk, Point(-73.9, 40.7, srid=4326))
+        buffer.flush()
+        (block,) = LocationHistoryBlock.objects.filter(user=self.bob)
+        self.assertEqual([(-73.9, 40.7)], [(p.longitude, p.latitude) for p in block.points])
+
+
+class TestFragmentCache(TestCase):
+    """Tests for cached member cards and request rows."""
+
+    fixtures = ["auth.json", "test_member_search.json"]
+
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.get(username="alice")
+        self.bob = User.objects.get(username="bob")
+
+    def test_version_follows_profile_changes(self):
+        """Profile edits bump the version; location pings and logins don't."""
+        version = self.bob.version
+        self.bob.current_location = Point(-73.9, 40.7, srid=4326)
+        self.bob.save(update_fields=["current_location"])
+        self.bob.last_login = datetime.now(UTC)
+        self.bob.save(update_fields=["last_login"])
+        self.bob.refresh_from_db()
+        self.assertEqual(version, self.bob.version)
+
+        self.bob.bio = "A new bio"
+        self.bob.save(update_fields=["bio"])
+        self.bob.refresh_from_db()
+        self.assertEqual(version + 1, self.bob.version)
+
+    def test_concurrent_edits_bump_twice(self):
+        """Two saves from copies loaded at the same version each bump it, and each copy sees its own new version."""
+        version = self.bob.version
+        other = User.objects.get(pk=self.bob.pk)
+        self.bob.bio = "A new bio"
+        self.bob.save(update_fields=["bio"])
+        other.name = "Robert"
+        other.save(update_fields=["name"])
+        self.assertEqual(version + 1, self.bob.version)
+        self.assertEqual(version + 2, other.version)
+        self.assertEqual(version + 2, User.objects.get(pk=self.bob.pk).version)
+
+    def test_cards_are_reused_until_edited(self):
+        """A second render reads every card from the cache; editing a member replaces only theirs."""
+        members = list(User.objects.filter(username__in=("alice", "bob")).order_by("username"))
+        first = render_fragments("partial/member-card.html", members)
+        self.assertIn(self.alice.name, first[0][1])
+
+        with patch.object(Template, "render", side_effect=AssertionError("rendered a cached card")):
+            self.assertEqual(first, render_fragments("partial/member-card.html", members))
+
+        self.bob.name = "Robert"
+        self.bob.save()
+        members[1] = self.bob
+        second = render_fragments("partial/member-card.html", members)
+        self.assertEqual(first[0], second[0])
+        self.assertIn("Robert", second[1][1])
+
+    def test_request_rows_use_annotated_versions(self):
+        """Request rows are keyed by both members' versions without loading them."""
+        request = Request.objects.with_versions().filter(source_user=self.alice).first()
+        with self.assertNumQueries(0):
+            key = request.fragment_key
+        self.assertEqual((request.pk.hex, self.alice.version, request.dest_version), key)
@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, Group
+from django.core.cache import cache
+from django.db import connection
+from django.template import Context, Template
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from emerald_heart.context_processors import site_info
+from emerald_heart.models import User
+from emerald_heart.utils.groups import get_user_groups
+from emerald_heart.utils.navigation import get_navigation
+from emerald_heart.utils.render import LazyValue
+from emerald_heart.views.core import EmeraldView
+
+SITE_DATA = [
+    {
+        "display_name": "Search",
+        "id": "search",
+        "visible": [],
+        "actions": [],
+    },
+    {
+        "display_name": "Reports",
+        "id": "reports",
+        "visible": ["reporter"],
+        "actions": [
+            {"name": "Summary", "action_id": "summary", "visible": [], "actions": []},
+            {"name": "Audit", "action_id": "audit", "visible": ["auditor"], "actions": []},
+        ],
+    },
+]
+
+
+SITE_INFO_CALLS = []
+"""Requests `counted_site_info` ran for."""
+
+
+def counted_site_info(request) -> dict[str, object]:
+    """Record a call of the site_info context processor."""
+    SITE_INFO_CALLS.append(request.path)
+    return site_info(request)
+
+
+@override_settings(SITE_DATA=SITE_DATA)
+class TestNavigation(SimpleTestCase):
+    """Tests for the navigation cached per set of groups."""
+
+    def test_visibility(self):
+        """Tabs and actions limited to groups are only shown to those groups and staff."""
+        self.assertEqual(("search",), get_navigation(frozenset(("member",))).tab_ids)
+        reporter = get_navigation(frozenset(("reporter",)))
+        self.assertEqual(("reports", "search"), reporter.tab_ids)
+        self.assertEqual(["summary"], [action["action_id"] for action in reporter.actions["reports"]])
+        admin = get_navigation(frozenset(("admin",)))
+        self.assertEqual(["summary", "audit"], [action["action_id"] for action in admin.actions["reports"]])
+
+    def test_cached_and_read_only(self):
+        """Each set of groups is built once and the shared result can't be changed, nor is the setting changed."""
+        navigation = get_navigation(frozenset(("reporter",)))
+        self.assertIs(navigation, get_navigation(frozenset(("reporter",))))
+        with self.assertRaises(TypeError):
+            navigation.tabs[0]["actions"] = ()  # type: ignore[index]
+        self.assertEqual(2, len(SITE_DATA[1]["actions"]))
+
+
+class TestUserGroups(TestCase):
+    """Tests for the cached group names of users."""
+
+    fixtures = ["auth.json", "test_member_search.json"]
+
+    def setUp(self):
+        cache.clear()
+        self.developer = Group.objects.get(name="developer")
+
+    def test_cached(self):
+        """Group names are read from the database once and then from the cache."""
+        self.assertEqual(["member"], User.objects.get(username="alice").group_list)
+        alice = User.objects.get(username="alice")
+        with self.assertNumQueries(0):
+            self.assertFalse(alice.is_admin)
+            self.assertFalse(alice.is_developer)
+            self.assertEqual(["member"], alice.group_list)
+
+    def test_membership_changes(self):
+        """Adding users to groups from either side is seen straight away."""
+        alice = User.objects.get(username="alice")
+        self.assertFalse(alice.is_developer)
+        alice.groups.add(self.developer)
+        self.assertTrue(alice.is_developer)
+        self.assertTrue(User.objects.get(username="alice").is_developer)
+
+        self.assertFalse(User.objects.get(username="bob").is_developer)
+        self.developer.user_set.add(User.objects.get(username="bob"))
+        self.assertTrue(User.objects.get(username="bob").is_developer)
+
+    def test_change_during_refresh(self):
+        """A membership change between reading the groups and caching them doesn't leave a stale snapshot behind."""
+        alice = User.objects.get(username="alice")
+        write = cache.set
+
+        def change_then_write(*args, **kwargs):
+            alice.groups.add(self.developer)
+            write(*args, **kwargs)
+
+        with mock.patch.object(cache, "set", side_effect=change_then_write):
+            self.assertEqual(("member",), get_user_groups(alice.pk))
+        self.assertEqual(("developer", "member"), get_user_groups(alice.pk))
+
+    def test_group_rename(self):
+        """Renaming a group invalidates every snapshot."""
+        self.assertEqual(["member"], User.objects.get(username="alice").group_list)
+        with self.captureOnCommitCallbacks(execute=True):
+            group = Group.objects.get(name="member")
+            group.name = "members"
+            group.save()
+        self.assertEqual(["members"], User.objects.get(username="alice").group_list)
+
+
+class TestLazyContext(SimpleTestCase):
+    """Tests for assembling the template context once with lazily computed values."""
+
+    def test_lazy_value(self):
+        """Values are computed only when read, and only once per render."""
+        calls = []
+        value = LazyValue(lambda: calls.append(1) or ["a", "b"])
+        self.assertEqual("", Template("{% if False %}{{ items }}{% endif %}").render(Context({"items": value})))
+        self.assertEqual([], calls)
+        template = Template("{% for item in items %}{{ item }}{% endfor %}{{ items|length }}")
+        self.assertEqual("ab2", template.render(Context({"items": value})))
+        self.assertEqual([1], calls)
+
+    def test_context_built_once(self):
+        """render_template gathers the view's context data a single time."""
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        view = EmeraldView()
+        view._request, view._request_args, view._request_kwargs = request, (), {}
+        with mock.patch.object(EmeraldView, "get_context_data", return_value={"extra": 1}) as get_context_data:
+            response = view.render_template("null.html", {"more": 2})
+        self.assertEqual(200, response.status_code)
+        get_context_data.assert_called_once()
+        self.assertNotIn("user_groups", view.__dict__)  # The template never read the navigation
+
+    def test_render_fragment(self):
+        """Fragments get only their own context and the shared values they name."""
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        view = EmeraldView()
+        view._request, view._request_args, view._request_kwargs = request, (), {}
+        with (
+            mock.patch.object(EmeraldView, "get_context_data") as get_context_data,
+            mock.patch("emerald_heart.views.core.site_info") as site_info,
+        ):
+            response = view.render_fragment("partial/member-autocomplete.html", {"matches": []})
+            self.assertEqual(200, response.status_code)
+            get_context_data.assert_not_called()
+            site_info.assert_not_called()
+
+        token = view.get_fragment_value("csrf_token")
+        self.assertTrue(str(token))
+        self.assertIsInstance(view.get_fragment_value("SITE_TABS")(), tuple)
+        with self.assertRaises(ValueError):
+            view.get_fragment_value("unknown")
+
+
+class TestRenderCost(TestCase):
+    """Tests for the per-render work of full pages."""
+
+    fixtures = ["auth.json", "test_member_search.json"]
+    pages = ("user-profile", "member-search", "member-outgoing-request-list")
+
+    def setUp(self):
+        cache.clear()
+        SITE_INFO_CALLS.clear()
+        self.client.force_login(User.objects.get(username="alice"))
+        templates = [{**engine, "OPTIONS": {**engine["OPTIONS"]}} for engine in settings.TEMPLATES]
+        processors = templates[0]["OPTIONS"]["context_processors"]
+        templates[0]["OPTIONS"]["context_processors"] = [
+            "tests.test_navigation.counted_site_info" if path.endswith(".site_info") else path for path in processors
+        ]
+        self.enterContext(override_settings(TEMPLATES=templates, DEBUG=True))
+
+    def test_context_assembled_once(self):
+        """Each page gathers its context data and runs the context processors once per render."""
+        for name in self.pages:
+            with self.subTest(name):
+                url = reverse(name)
+                view_class = resolve(url).func.view_class
+                SITE_INFO_CALLS.clear()
+                with mock.patch.object(
+                    view_class, "get_context_data", autospec=True, side_effect=view_class.get_context_data
+                ) as get_context_data:
+                    response = self.client.get(url)
+                self.assertEqual(200, response.status_code)
+                self.assertIn("render;dur=", response["Server-Timing"])
+                get_context_data.assert_called_once()
+                self.assertEqual([url], SITE_INFO_CALLS)
+
+    def test_queries_per_render(self):
+        """Repeat renders read the navigation groups from the cache and never issue more queries than the first."""
+        for name in self.pages:
+            with self.subTest(name):
+                url = reverse(name)
+                with CaptureQueriesContext(connection) as first:
+                    self.client.get(url)
+                with CaptureQueriesContext(connection) as again:
+                    self.assertEqual(200, self.client.get(url).status_code)
+                self.assertLessEqual(len(again), len(first))
+                self.assertFalse([query for query in again if "auth_group" in query["sql"]])
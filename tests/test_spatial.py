@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import math
+from datetime import UTC, datetime, timedelta
+
+from django.contrib.gis.geos import Point
+from django.test import SimpleTestCase, override_settings
+
+from emerald_heart.hints import HistoryPoint
+from emerald_heart.utils.history import decode_points, downsample, encode_points
+from emerald_heart.utils.movement import has_moved, is_due, next_check
+from emerald_heart.utils.spatial import (
+    bounding_box,
+    chord_length,
+    degrees_to_mercator,
+    geohash_cell_size,
+    geohash_cover,
+    geohash_encode,
+    geohash_range,
+    haversine,
+    mercator_to_degrees,
+    to_ecef,
+)
+
+
+class TestGeohash(SimpleTestCase):
+    """Tests for the geohash helpers used to narrow radius searches."""
+
+    def test_encode_known_value(self):
+        """Encoding matches the reference value for a well known point."""
+        self.assertEqual("ezs42", geohash_encode(-5.6, 42.6, precision=5))
+
+    def test_encode_prefix_is_stable(self):
+        """A shorter geohash is always a prefix of a longer one for the same point."""
+        self.assertTrue(geohash_encode(-94.6, 39.1).startswith(geohash_encode(-94.6, 39.1, precision=4)))
+
+    def test_cell_size(self):
+        """One character cells are 45 degrees square."""
+        self.assertEqual((45.0, 45.0), geohash_cell_size(1))
+
+    def test_cover_contains_center_and_edges(self):
+        """The cover includes the cells of the center and of the points at the edge of the radius."""
+        cover = geohash_cover(-94.6, 39.1, 8_046.72)
+        self.assertTrue(cover)
+        min_lon, min_lat, max_lon, max_lat = bounding_box(-94.6, 39.1, 8_046.72)
+        for lon, lat in ((-94.6, 39.1), (min_lon, min_lat), (max_lon, max_lat), (min_lon, max_lat)):
+            self.assertTrue(any(geohash_encode(lon, lat).startswith(prefix) for prefix in cover))
+
+    def test_cover_across_antimeridian(self):
+        """Cells on both sides of the antimeridian are included."""
+        cover = geohash_cover(179.99, 0.0, 8_046.72)
+        self.assertTrue(any(geohash_encode(-179.99, 0.0).startswith(prefix) for prefix in cover))
+        self.assertTrue(any(geohash_encode(179.99, 0.0).startswith(prefix) for prefix in cover))
+
+    def test_cover_near_pole_is_unbounded(self):
+        """Areas touching a pole cannot be narrowed by cell."""
+        self.assertEqual((), geohash_cover(0.0, 89.95, 8_046.72))
+
+    def test_range(self):
+        """Every geohash starting with the prefix falls within the range."""
+        start, end = geohash_range("9yu")
+        self.assertTrue(start <= "9yuwrmfqh" < end)
+        self.assertFalse(start <= "9yv" < end)
+
+
+class TestProjection(SimpleTestCase):
+    """Tests for the coordinate conversions used by stored points."""
+
+    def test_chord_matches_haversine(self):
+        """The straight-line distance between ECEF positions is the chord of the great-circle distance."""
+        for start, end in (
+            ((-94.6, 39.1), (-94.61, 39.11)),
+            ((10.0, 60.0), (10.15, 60.0)),
+            ((179.9, 0.0), (-179.9, 1)),
+        ):
+            arc = haversine(*start, *end)
+            self.assertAlmostEqual(chord_length(arc), math.dist(to_ecef(*start), to_ecef(*end)), delta=1e-6)
+
+    def test_chord_of_whole_globe(self):
+        """Arcs of half the circumference or more reach the antipode."""
+        self.assertEqual(chord_length(1e9), chord_length(2e7))
+
+    def test_mercator_round_trip(self):
+        """Mercator meters convert to degrees and back."""
+        longitude, latitude = mercator_to_degrees(-10555678.437110912, 4833902.376406039)
+        self.assertAlmostEqual(-94.8232727, longitude, places=6)
+        self.assertAlmostEqual(39.7791618, latitude, places=6)
+        x, y = degrees_to_mercator(longitude, latitude)
+        self.assertAlmostEqual(-10555678.437110912, x, places=3)
+        self.assertAlmostEqual(4833902.376406039, y, places=3)
+
+
+@override_settings(
+    MEMBER_LOCATION_MIN_MOVEMENT=250.0, MEMBER_LOCATION_MIN_INTERVAL=600, MEMBER_LOCATION_MAX_INTERVAL=2400
+)
+class TestMovementPolicy(SimpleTestCase):
+    """Tests for deciding which location pings are written and when to ask again."""
+
+    def test_small_moves_are_ignored(self):
+        """Pings within the movement threshold of the stored location are not significant."""
+        stored = Point(-94.6, 39.1, srid=4326)
+        self.assertFalse(has_moved(stored, Point(-94.6001, 39.1001, srid=4326)))
+        self.assertTrue(has_moved(stored, Point(-94.61, 39.11, srid=4326)))
+        self.assertTrue(has_moved(None, stored))
+
+    def test_interval_backs_off_and_resets(self):
+        """The wait doubles while a member stays put, is capped, and resets when they move."""
+        now = datetime(2026, 1, 1, tzinfo=UTC)
+        check = next_check(None, False, now)
+        self.assertEqual(600, check["interval"])
+        intervals = []
+        for _ in range(4):
+            check = next_check(check, False, now)
+            intervals.append(check["interval"])
+        self.assertEqual([1200, 2400, 2400, 2400], intervals)
+        self.assertEqual(600, next_check(check, True, now)["interval"])
+
+    def test_is_due(self):
+        """A check is due once its interval has passed, or when there is no check at all."""
+        now = datetime(2026, 1, 1, tzinfo=UTC)
+        check = next_check(next_check(None, False, now), False, now)
+        self.assertTrue(is_due(None, now))
+        self.assertFalse(is_due(check, now + timedelta(seconds=1199)))
+        self.assertTrue(is_due(check, now + timedelta(seconds=1200)))
+
+
+class TestHistoryEncoding(SimpleTestCase):
+    """Tests for the delta encoding of location history."""
+
+    def test_round_trip(self):
+        """Points survive encoding to the microdegree, including jumps across the antimeridian."""
+        start = datetime(2026, 1, 1, tzinfo=UTC)
+        points = [
+            HistoryPoint(start + timedelta(seconds=30 * i), -94.6 + i / 10000, 39.1 - i / 5000) for i in range(256)
+        ]
+        points += [HistoryPoint(start + timedelta(hours=3), 179.999999, -89.9), HistoryPoint(start, -180.0, 90.0)]
+        decoded = decode_points(start, encode_points(start, points))
+        self.assertEqual([p.when for p in points], [p.when for p in decoded])
+        for point, result in zip(points, decoded, strict=True):
+            self.assertAlmostEqual(point.longitude, result.longitude, places=6)
+            self.assertAlmostEqual(point.latitude, result.latitude, places=6)
+
+    def test_encoding_is_compact(self):
+        """Regular pings take far less than the 12 bytes per point of the raw arrays."""
+        start = datetime(2026, 1, 1, tzinfo=UTC)
+        points = [HistoryPoint(start + timedelta(seconds=30 * i), -94.6 + i / 10000, 39.1) for i in range(256)]
+        self.assertLess(len(encode_points(start, points)), 256 * 2)
+
+    def test_downsample(self):
+        """One point is kept per interval."""
+        start = datetime(2026, 1, 1, tzinfo=UTC)
+        points = [HistoryPoint(start + timedelta(minutes=20 * i), 0.0, 0.0) for i in range(9)]
+        self.assertEqual([0, 3, 6], [points.index(p) for p in downsample(points, 3600)])